@@ -112,9 +112,12 @@ args = dict(
         'console_scripts': [
             'sockeye-train = sockeye.train:main',
             'sockeye-translate = sockeye.translate:main',
+            'sockeye-serve = sockeye.serve:main',
             'sockeye-average = sockeye.average:main',
             'sockeye-embeddings = sockeye.embeddings:main',
-            'sockeye-evaluate = sockeye.evaluate:main'
+            'sockeye-evaluate = sockeye.evaluate:main',
+            'sockeye-score = sockeye.score:main',
+            'sockeye-encode = sockeye.encode:main'
         ],
     },
 
@@ -110,6 +110,125 @@ def add_io_args(params):
                              help='Suppress console logging.')
 
 
+def add_serve_args(params):
+    serve_params = params.add_argument_group("Server parameters")
+
+    serve_params.add_argument('--host',
+                              default='127.0.0.1',
+                              help='Address to listen on. Default: %(default)s.')
+    serve_params.add_argument('--port',
+                              type=int_greater_or_equal(0),
+                              default=8080,
+                              help='Port to listen on. Default: %(default)s.')
+    serve_params.add_argument('--max-batch-delay',
+                              type=float,
+                              default=5.0,
+                              help='Maximum time in milliseconds a request waits for further requests to be '
+                                   'translated in the same batch. Batches hold at most --batch-size sentences. '
+                                   'Default: %(default)s.')
+    serve_params.add_argument('--stats-window',
+                              type=int_greater_or_equal(1),
+                              default=1000,
+                              help='Number of most recent sentences to compute latency percentiles over. '
+                                   'Default: %(default)s.')
+
+
+def add_scoring_args(params):
+    score_params = params.add_argument_group("Scoring parameters")
+
+    score_params.add_argument('--model', '-m',
+                              required=True,
+                              help='Model folder. Model determines config, best parameters and vocab files.')
+    score_params.add_argument('--checkpoint', '-c',
+                              type=int,
+                              default=None,
+                              help='Checkpoint to use. If not given, chooses the best checkpoint.')
+    score_params.add_argument('--source', '-s',
+                              required=True,
+                              help='Source side of the sentence pairs to score.')
+    score_params.add_argument('--target', '-t',
+                              required=True,
+                              help='Target side of the sentence pairs to score.')
+    score_params.add_argument(C.INFERENCE_ARG_OUTPUT_LONG, C.INFERENCE_ARG_OUTPUT_SHORT,
+                              default=None,
+                              help='Output file to write scores to, one per line. '
+                                   'If not given, will write to stdout.')
+    score_params.add_argument('--batch-size', '-b',
+                              type=int_greater_or_equal(1),
+                              default=64,
+                              help='Number of sentence pairs scored in parallel. Default: %(default)s.')
+    score_params.add_argument('--bucket-width',
+                              type=int_greater_or_equal(1),
+                              default=10,
+                              help='Width of length buckets. Default: %(default)s.')
+    score_params.add_argument('--max-seq-len',
+                              type=int_greater_or_equal(1),
+                              default=None,
+                              help='Maximum source and target length of scored sentence pairs. Longer pairs are '
+                                   'scored as nan. Default: value from model.')
+    score_params.add_argument('--length-normalize',
+                              action='store_true',
+                              help='Divide the negative log probability of each target sentence by its number of '
+                                   'words, including the end-of-sentence symbol. Default: %(default)s.')
+    score_params.add_argument('--output-type',
+                              default='score',
+                              choices=["score", "alignment"],
+                              help='Output type. score: negative log probability of each target sentence. '
+                                   'alignment: word alignments <src_index>-<trg_index> ... from the attention '
+                                   'probabilities of the decoder. Default: %(default)s.')
+    score_params.add_argument('--sure-align-threshold',
+                              default=0.9,
+                              type=float,
+                              help='Threshold to consider a soft alignment a sure alignment. Default: %(default)s')
+
+
+def add_encoding_args(params):
+    encode_params = params.add_argument_group("Encoding parameters")
+
+    encode_params.add_argument('--model', '-m',
+                               required=True,
+                               help='Model folder. Model determines config, best parameters and vocab files.')
+    encode_params.add_argument('--checkpoint', '-c',
+                               type=int,
+                               default=None,
+                               help='Checkpoint to use. If not given, chooses the best checkpoint.')
+    encode_params.add_argument('--input', '-i',
+                               required=True,
+                               help='Source sentences to encode.')
+    encode_params.add_argument(C.INFERENCE_ARG_OUTPUT_LONG, C.INFERENCE_ARG_OUTPUT_SHORT,
+                               required=True,
+                               help='Output file for the sentence embedding matrix (NumPy .npy format). Row i holds '
+                                    'the embedding of the input line whose 0-based index is entry i of the index '
+                                    'written to <output>.ids.')
+    encode_params.add_argument('--batch-size', '-b',
+                               type=int_greater_or_equal(1),
+                               default=256,
+                               help='Number of sentences encoded in parallel. Default: %(default)s.')
+    encode_params.add_argument('--bucket-width',
+                               type=int_greater_or_equal(1),
+                               default=10,
+                               help='Width of length buckets. Default: %(default)s.')
+    encode_params.add_argument('--max-seq-len',
+                               type=int_greater_or_equal(1),
+                               default=None,
+                               help='Maximum length of encoded sentences. Longer sentences are truncated. '
+                                    'Default: value from model.')
+    encode_params.add_argument('--sort-window',
+                               type=int_greater_or_equal(0),
+                               default=100000,
+                               help='Number of input lines read ahead and sorted by length before they are split into '
+                                    'batches. 0 keeps the input order. Default: %(default)s.')
+    encode_params.add_argument('--pooling',
+                               default=C.POOLING_MEAN,
+                               choices=C.POOLING_TYPES,
+                               help='Pooling of the encoder states of a sentence into its embedding. '
+                                    'Default: %(default)s.')
+    encode_params.add_argument('--output-dtype',
+                               default='float32',
+                               choices=['float32', 'float16'],
+                               help='Data type of the sentence embeddings. Default: %(default)s.')
+
+
 def add_device_args(params):
     device_params = params.add_argument_group("Device parameters")
 
@@ -422,18 +541,9 @@ def add_training_args(params):
                               help='Keep only the last n params files, use -1 to keep all files. Default: %(default)s')
 
 
-def add_inference_args(params):
-    decode_params = params.add_argument_group("Inference parameters")
-
-    decode_params.add_argument(C.INFERENCE_ARG_INPUT_LONG, C.INFERENCE_ARG_INPUT_SHORT,
-                               default=None,
-                               help='Input file to translate. One sentence per line. '
-                                    'If not given, will read from stdin.')
-
-    decode_params.add_argument(C.INFERENCE_ARG_OUTPUT_LONG, C.INFERENCE_ARG_OUTPUT_SHORT,
-                               default=None,
-                               help='Output file to write translations to. '
-                                    'If not given, will write to stdout.')
+def add_translator_args(params):
+    # models and search settings, shared by the translation CLI and server
+    decode_params = params.add_argument_group("Translator parameters")
 
     decode_params.add_argument('--models', '-m',
                                required=True,
@@ -451,11 +561,118 @@ def add_inference_args(params):
                                type=int_greater_or_equal(1),
                                default=5,
                                help='Size of the beam. Default: %(default)s.')
+    decode_params.add_argument('--batch-size',
+                               type=int_greater_or_equal(1),
+                               default=1,
+                               help='Number of sentences to decode in parallel. Default: %(default)s.')
+    decode_params.add_argument('--sample',
+                               type=int_greater_or_equal(0),
+                               default=None,
+                               help='Sample translations instead of searching for the best one, drawing each word '
+                                    'from the K most probable words, or from all words if 0. Use '
+                                    '--softmax-temperature to sharpen or flatten the distribution. '
+                                    'Default: %(default)s.')
+    decode_params.add_argument('--num-samples',
+                               type=int_greater_or_equal(1),
+                               default=1,
+                               help='Number of samples written per sentence with --sample. All samples of a sentence '
+                                    'are decoded from a single encoder pass. Default: %(default)s.')
+    decode_params.add_argument('--seed',
+                               type=int,
+                               default=None,
+                               help='Random seed for --sample. Default: %(default)s.')
+    decode_params.add_argument('--top-k-engine',
+                               default=C.TOP_K_NUMPY,
+                               choices=C.TOP_K_ENGINES,
+                               help='Implementation of k-best selection in beam search. %s copies scores to the host '
+                                    'at every step, %s keeps them on the device (recommended on GPUs). '
+                                    'Default: %%(default)s.' % (C.TOP_K_NUMPY, C.TOP_K_MXNET))
+    decode_params.add_argument('--restrict-lexicon',
+                               type=str,
+                               default=None,
+                               help="Restrict the target vocabulary of each batch of sentences to the top-k "
+                                    "translations of its source words in this translation table (format: "
+                                    "src, trg, logprob, tab-separated). Default: %(default)s.")
+    decode_params.add_argument('--restrict-lexicon-topk',
+                               type=int_greater_or_equal(1),
+                               default=50,
+                               help="Number of target translations kept per source word. Default: %(default)s.")
+    decode_params.add_argument('--restrict-lexicon-frequent',
+                               type=int_greater_or_equal(0),
+                               default=500,
+                               help="Number of most frequent target words always allowed. Default: %(default)s.")
+    decode_params.add_argument('--beam-prune-absolute',
+                               type=float,
+                               default=None,
+                               help='Prune open hypotheses whose score is worse than the best score of their '
+                                    'sentence by more than this value. Default: %(default)s.')
+    decode_params.add_argument('--beam-prune-relative',
+                               type=float,
+                               default=None,
+                               help='Prune open hypotheses whose probability is less than this fraction of the '
+                                    'probability of the best hypothesis of their sentence. Default: %(default)s.')
+    decode_params.add_argument('--beam-compact',
+                               action='store_true',
+                               help='Stop decoding sentences of a batch whose search has ended. The decoder is '
+                                    'run on fewer rows, which requires binding additional executors. '
+                                    'Default: %(default)s.')
+    decode_params.add_argument('--max-output-length-num-stds',
+                               type=float,
+                               default=C.DEFAULT_NUM_STD_MAX_OUTPUT_LENGTH,
+                               help='Maximum output length of a sentence is its length times the mean plus this '
+                                    'number of standard deviations of the target/source length ratio of the '
+                                    'training data. Default: %(default)s.')
+    decode_params.add_argument('--min-output-length-num-stds',
+                               type=float,
+                               default=None,
+                               help='If set, minimum output length of a sentence is its length times the mean minus '
+                                    'this number of standard deviations of the target/source length ratio of the '
+                                    'training data. Default: %(default)s.')
+    decode_params.add_argument('--bucket-width',
+                               type=int_greater_or_equal(1),
+                               default=10,
+                               help='Width of source length buckets. Default: %(default)s.')
+    decode_params.add_argument('--warmup',
+                               action='store_true',
+                               help='Bind executors of all buckets and translate a dummy batch in each bucket '
+                                    'before reading input. Default: %(default)s.')
+    decode_params.add_argument('--time-budget',
+                               type=float,
+                               default=None,
+                               help='Time budget in milliseconds for translating each batch. Searches that would '
+                                    'exceed it continue greedily, or return their best hypothesis so far. '
+                                    'Default: %(default)s.')
+    decode_params.add_argument('--cache-size',
+                               type=int_greater_or_equal(0),
+                               default=0,
+                               help='Number of translation results kept in memory. Repeated inputs are taken from '
+                                    'the cache. Duplicate inputs within a batch are always translated only once. '
+                                    'Default: %(default)s.')
+    decode_params.add_argument('--cache-path',
+                               type=str,
+                               default=None,
+                               help='Optional path of a persistent store of translation results, reused across runs '
+                                    'of the same models and settings. Default: %(default)s.')
+    decode_params.add_argument('--max-bucket-executors',
+                               type=int_greater_or_equal(1),
+                               default=None,
+                               help='Maximum number of buckets bound at the same time per encoder and decoder. Least '
+                                    'recently used buckets are unbound. Default: %(default)s (no limit).')
+    decode_params.add_argument('--max-executor-memory',
+                               type=int_greater_or_equal(1),
+                               default=None,
+                               help='Maximum memory in MB of bound bucket executors per encoder and decoder. Least '
+                                    'recently used buckets are unbound. Default: %(default)s (no limit).')
     decode_params.add_argument('--ensemble-mode',
                                type=str,
                                default='linear',
                                choices=['linear', 'log_linear'],
                                help='Ensemble mode: [linear, log-linear]. Default: %(default)s.')
+    decode_params.add_argument('--ensemble-fused',
+                               action='store_true',
+                               help='Decode an ensemble of several models in a single graph, combining their '
+                                    'predictions in the graph. Not supported with --restrict-lexicon. '
+                                    'Default: %(default)s.')
     decode_params.add_argument('--max-input-len', '-n',
                                type=int,
                                default=None,
@@ -466,12 +683,51 @@ def add_inference_args(params):
                                help='Controls peakiness of model predictions. Values < 1.0 produce '
                                     'peaked predictions, values > 1.0 produce smoothed distributions.')
 
+
+def add_inference_args(params):
+    add_translator_args(params)
+
+    decode_params = params.add_argument_group("Inference parameters")
+
+    decode_params.add_argument(C.INFERENCE_ARG_INPUT_LONG, C.INFERENCE_ARG_INPUT_SHORT,
+                               default=None,
+                               help='Input file to translate. One sentence per line. '
+                                    'If not given, will read from stdin.')
+
+    decode_params.add_argument(C.INFERENCE_ARG_OUTPUT_LONG, C.INFERENCE_ARG_OUTPUT_SHORT,
+                               default=None,
+                               help='Output file to write translations to. '
+                                    'If not given, will write to stdout.')
+
+    decode_params.add_argument('--sort-window',
+                               type=int_greater_or_equal(0),
+                               default=0,
+                               help='Number of input lines read ahead and sorted by length before they are split into '
+                                    'batches, such that batches hold sentences of similar length. Output keeps the '
+                                    'input order. 0 keeps the input order throughout. Default: %(default)s.')
+    decode_params.add_argument('--workers',
+                               type=int_greater_or_equal(1),
+                               default=1,
+                               help='Number of worker processes translating in parallel. Workers are distributed '
+                                    'over the given devices. GPU workers load their own copy of the models, CPU '
+                                    'workers share the parameters of a single copy. On CPUs, consider limiting the '
+                                    'threads per worker with OMP_NUM_THREADS. Default: %(default)s.')
+
     decode_params.add_argument('--output-type',
                                default='translation',
-                               choices=["translation", "translation_with_alignments", "align_plot", "align_text"],
-                               help='Output type. Choices: [translation, translation_with_alignments, '
-                                    'align_plot, align_text]. Default: %(default)s.')
+                               choices=["translation", "translation_stream", "translation_with_alignments",
+                                        "align_plot", "align_text"],
+                               help='Output type. Choices: [translation, translation_stream, '
+                                    'translation_with_alignments, align_plot, align_text]. translation_stream '
+                                    'writes the tokens of each translation as soon as they are stable, before its '
+                                    'search ends. Default: %(default)s.')
     decode_params.add_argument('--sure-align-threshold',
                                default=0.9,
                                type=float,
                                help='Threshold to consider a soft alignment a sure alignment. Default: %(default)s')
+    decode_params.add_argument('--flush-every',
+                               type=int_greater_or_equal(0),
+                               default=0,
+                               help='Flush the output stream after this many translations. Output is also flushed '
+                                    'whenever all translations done so far are written. 0 flushes only then. '
+                                    'Default: %(default)s.')
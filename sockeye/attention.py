@@ -117,17 +117,42 @@ class Attention(object):
 
     :param input_previous_word: Feed the previous target embedding into the attention mechanism.
     :param dynamic_source_num_hidden: Number of hidden units of dynamic source encoding update mechanism.
+    :param source_projection_num_hidden: Number of hidden units of the source projection (see project_source).
+                                         None if the attention mechanism does not project the source.
     """
 
     def __init__(self,
                  input_previous_word: bool,
                  dynamic_source_num_hidden: int = 1,
-                 prefix: str = C.ATTENTION_PREFIX) -> None:
+                 prefix: str = C.ATTENTION_PREFIX,
+                 source_projection_num_hidden: Optional[int] = None) -> None:
         self.dynamic_source_num_hidden = dynamic_source_num_hidden
+        self.source_projection_num_hidden = source_projection_num_hidden
         self._input_previous_word = input_previous_word
         self.prefix = prefix
 
-    def on(self, source: mx.sym.Symbol, source_length: mx.sym.Symbol, source_seq_len: int) -> Callable:
+    def project_source(self, source: mx.sym.Symbol, source_seq_len: int) -> Optional[mx.sym.Symbol]:
+        """
+        Returns the projection of the source states that is independent of the decoder state, or None if the
+        attention mechanism does not project the source. The projection is constant for a given source sentence,
+        so it can be computed once and passed to on() instead of being recomputed at every decoder step.
+
+        :param source: Shape: (batch_size, seq_len, encoder_num_hidden).
+        :param source_seq_len: Maximum length of source sequences.
+        :return: Projected source. Shape: (batch_size, seq_len, source_projection_num_hidden).
+        """
+        return None
+
+    @property
+    def has_dynamic_source(self) -> bool:
+        """
+        Whether the attention mechanism updates the dynamic source encoding (e.g. coverage). If not, the dynamic
+        source encoding of the attention state is passed on unchanged and need not be carried between decoder steps.
+        """
+        return False
+
+    def on(self, source: mx.sym.Symbol, source_length: mx.sym.Symbol, source_seq_len: int,
+           source_projected: Optional[mx.sym.Symbol] = None) -> Callable:
         """
         Returns callable to be used for recurrent attention in a sequence decoder.
         The callable is a recurrent function of the form:
@@ -136,6 +161,7 @@ class Attention(object):
         :param source: Shape: (batch_size, seq_len, encoder_num_hidden).
         :param source_length: Shape: (batch_size,).
         :param source_seq_len: Maximum length of source sequences.
+        :param source_projected: Optional precomputed output of project_source(source, source_seq_len).
         :return: Attention callable.
         """
 
@@ -197,11 +223,29 @@ class BilinearAttention(Attention):
     """
 
     def __init__(self, num_hidden: int) -> None:
-        super().__init__(False)
+        super().__init__(False, source_projection_num_hidden=num_hidden)
         self.num_hidden = num_hidden
         self.s2t_weight = mx.sym.Variable("%ss2t_weight" % self.prefix)
 
-    def on(self, source: mx.sym.Symbol, source_length: mx.sym.Symbol, source_seq_len: int) -> Callable:
+    def project_source(self, source: mx.sym.Symbol, source_seq_len: int) -> mx.sym.Symbol:
+        """
+        Returns the source states multiplied with the bilinear weight matrix.
+
+        :param source: Shape: (batch_size, seq_len, encoder_num_hidden).
+        :param source_seq_len: Maximum length of source sequences.
+        :return: Projected source. Shape: (batch_size, seq_len, num_hidden).
+        """
+        # (batch_size * seq_len, self.num_hidden)
+        source_hidden = mx.sym.FullyConnected(data=mx.sym.reshape(data=source, shape=(-3, -1),
+                                                                  name="%sflat_source" % self.prefix),
+                                              weight=self.s2t_weight, num_hidden=self.num_hidden,
+                                              no_bias=True, name="%ssource_hidden_fc" % self.prefix)
+        # (batch_size, seq_len, self.num_hidden)
+        return mx.sym.reshape(source_hidden, shape=(-1, source_seq_len, self.num_hidden),
+                              name="%ssource_hidden" % self.prefix)
+
+    def on(self, source: mx.sym.Symbol, source_length: mx.sym.Symbol, source_seq_len: int,
+           source_projected: Optional[mx.sym.Symbol] = None) -> Callable:
         """
         Returns callable to be used for recurrent attention in a sequence decoder.
         The callable is a recurrent function of the form:
@@ -210,17 +254,12 @@ class BilinearAttention(Attention):
         :param source: Shape: (batch_size, seq_len, encoder_num_hidden).
         :param source_length: Shape: (batch_size,).
         :param source_seq_len: Maximum length of source sequences.
+        :param source_projected: Optional precomputed output of project_source(source, source_seq_len).
         :return: Attention callable.
         """
 
-        # (batch_size * seq_len, self.num_hidden)
-        source_hidden = mx.sym.FullyConnected(data=mx.sym.reshape(data=source, shape=(-3, -1),
-                                                                  name="%sflat_source" % self.prefix),
-                                              weight=self.s2t_weight, num_hidden=self.num_hidden,
-                                              no_bias=True, name="%ssource_hidden_fc" % self.prefix)
         # (batch_size, seq_len, self.num_hidden)
-        source_hidden = mx.sym.reshape(source_hidden, shape=(-1, source_seq_len, self.num_hidden),
-                                       name="%ssource_hidden" % self.prefix)
+        source_hidden = self.project_source(source, source_seq_len) if source_projected is None else source_projected
 
         def attend(att_input: AttentionInput, att_state: AttentionState) -> AttentionState:
             """
@@ -269,14 +308,35 @@ class DotAttention(Attention):
                  rnn_num_hidden: int,
                  num_hidden: int,
                  scale: Optional[float] = None) -> None:
-        super().__init__(input_previous_word)
-        self.project = rnn_num_hidden != num_hidden
+        project = rnn_num_hidden != num_hidden
+        super().__init__(input_previous_word, source_projection_num_hidden=num_hidden if project else None)
+        self.project = project
         self.num_hidden = num_hidden
         self.scale = scale
         self.t2h_weight = mx.sym.Variable("%st2h_weight" % self.prefix) if self.project else None
         self.s2h_weight = mx.sym.Variable("%ss2h_weight" % self.prefix) if self.project else None
 
-    def on(self, source: mx.sym.Symbol, source_length: mx.sym.Symbol, source_seq_len: int) -> Callable:
+    def project_source(self, source: mx.sym.Symbol, source_seq_len: int) -> Optional[mx.sym.Symbol]:
+        """
+        Returns the source states projected to num_hidden, or None if no projection is required.
+
+        :param source: Shape: (batch_size, seq_len, encoder_num_hidden).
+        :param source_seq_len: Maximum length of source sequences.
+        :return: Projected source. Shape: (batch_size, seq_len, num_hidden).
+        """
+        if not self.project:
+            return None
+        # (batch_size * seq_len, self.num_hidden)
+        source_hidden = mx.sym.FullyConnected(
+            data=mx.sym.reshape(data=source, shape=(-3, -1), name="%sflat_source" % self.prefix),
+            weight=self.s2h_weight, num_hidden=self.num_hidden,
+            no_bias=True, name="%ssource_hidden_fc" % self.prefix)
+        # (batch_size, seq_len, self.num_hidden)
+        return mx.sym.reshape(source_hidden, shape=(-1, source_seq_len, self.num_hidden),
+                              name="%ssource_hidden" % self.prefix)
+
+    def on(self, source: mx.sym.Symbol, source_length: mx.sym.Symbol, source_seq_len: int,
+           source_projected: Optional[mx.sym.Symbol] = None) -> Callable:
         """
         Returns callable to be used for recurrent attention in a sequence decoder.
         The callable is a recurrent function of the form:
@@ -285,18 +345,14 @@ class DotAttention(Attention):
         :param source: Shape: (batch_size, seq_len, encoder_num_hidden).
         :param source_length: Shape: (batch_size,).
         :param source_seq_len: Maximum length of source sequences.
+        :param source_projected: Optional precomputed output of project_source(source, source_seq_len).
         :return: Attention callable.
         """
 
         if self.project:
-            # (batch_size * seq_len, self.num_hidden)
-            source_hidden = mx.sym.FullyConnected(
-                data=mx.sym.reshape(data=source, shape=(-3, -1), name="%sflat_source" % self.prefix),
-                weight=self.s2h_weight, num_hidden=self.num_hidden,
-                no_bias=True, name="%ssource_hidden_fc" % self.prefix)
             # (batch_size, seq_len, self.num_hidden)
-            source_hidden = mx.sym.reshape(source_hidden, shape=(-1, source_seq_len, self.num_hidden),
-                                           name="%ssource_hidden" % self.prefix)
+            source_hidden = self.project_source(source, source_seq_len) \
+                if source_projected is None else source_projected
 
         def attend(att_input: AttentionInput, att_state: AttentionState) -> AttentionState:
             """
@@ -342,7 +398,8 @@ class EncoderLastStateAttention(Attention):
     Equivalent to no attention.
     """
 
-    def on(self, source: mx.sym.Symbol, source_length: mx.sym.Symbol, source_seq_len: int) -> Callable:
+    def on(self, source: mx.sym.Symbol, source_length: mx.sym.Symbol, source_seq_len: int,
+           source_projected: Optional[mx.sym.Symbol] = None) -> Callable:
         """
         Returns callable to be used for recurrent attention in a sequence decoder.
         The callable is a recurrent function of the form:
@@ -351,6 +408,7 @@ class EncoderLastStateAttention(Attention):
         :param source: Shape: (batch_size, seq_len, encoder_num_hidden).
         :param source_length: Shape: (batch_size,).
         :param source_seq_len: Maximum length of source sequences.
+        :param source_projected: Optional precomputed output of project_source(source, source_seq_len).
         :return: Attention callable.
         """
         source = mx.sym.swapaxes(source, dim1=0, dim2=1)
@@ -386,7 +444,8 @@ class LocationAttention(Attention):
         self.location_weight = mx.sym.Variable("%sloc_weight" % self.prefix)
         self.location_bias = mx.sym.Variable("%sloc_bias" % self.prefix)
 
-    def on(self, source: mx.sym.Symbol, source_length: mx.sym.Symbol, source_seq_len: int) -> Callable:
+    def on(self, source: mx.sym.Symbol, source_length: mx.sym.Symbol, source_seq_len: int,
+           source_projected: Optional[mx.sym.Symbol] = None) -> Callable:
         """
         Returns callable to be used for recurrent attention in a sequence decoder.
         The callable is a recurrent function of the form:
@@ -395,6 +454,7 @@ class LocationAttention(Attention):
         :param source: Shape: (batch_size, seq_len, encoder_num_hidden).
         :param source_length: Shape: (batch_size,).
         :param source_seq_len: Maximum length of source sequences.
+        :param source_projected: Optional precomputed output of project_source(source, source_seq_len).
         :return: Attention callable.
         """
 
@@ -461,7 +521,8 @@ class MlpAttention(Attention):
                  config_coverage: Optional[coverage.CoverageConfig] = None) -> None:
         dynamic_source_num_hidden = 1 if config_coverage is None else config_coverage.num_hidden
         super().__init__(input_previous_word=input_previous_word,
-                         dynamic_source_num_hidden=dynamic_source_num_hidden)
+                         dynamic_source_num_hidden=dynamic_source_num_hidden,
+                         source_projection_num_hidden=attention_num_hidden)
         self.attention_num_hidden = attention_num_hidden
         # input (encoder) to hidden
         self.att_e2h_weight = mx.sym.Variable("%se2h_weight" % self.prefix)
@@ -478,20 +539,18 @@ class MlpAttention(Attention):
         self._ln = layers.LayerNormalization(num_hidden=attention_num_hidden,
                                              prefix="%s_norm" % self.prefix) if layer_normalization else None
 
-    def on(self, source: mx.sym.Symbol, source_length: mx.sym.Symbol, source_seq_len: int) -> Callable:
+    @property
+    def has_dynamic_source(self) -> bool:
+        return self.coverage is not None
+
+    def project_source(self, source: mx.sym.Symbol, source_seq_len: int) -> mx.sym.Symbol:
         """
-        Returns callable to be used for recurrent attention in a sequence decoder.
-        The callable is a recurrent function of the form:
-        AttentionState = attend(AttentionInput, AttentionState).
+        Returns the source states projected to the attention hidden layer.
 
         :param source: Shape: (batch_size, seq_len, encoder_num_hidden).
-        :param source_length: Shape: (batch_size,).
         :param source_seq_len: Maximum length of source sequences.
-        :return: Attention callable.
+        :return: Projected source. Shape: (batch_size, seq_len, attention_num_hidden).
         """
-
-        coverage_func = self.coverage.on(source, source_length, source_seq_len) if self.coverage else None
-
         # (batch_size * seq_len, attention_num_hidden)
         source_hidden = mx.sym.FullyConnected(data=mx.sym.reshape(data=source,
                                                                   shape=(-3, -1),
@@ -502,9 +561,28 @@ class MlpAttention(Attention):
                                               name="%ssource_hidden_fc" % self.prefix)
 
         # (batch_size, seq_len, attention_num_hidden)
-        source_hidden = mx.sym.reshape(source_hidden,
-                                       shape=(-1, source_seq_len, self.attention_num_hidden),
-                                       name="%ssource_hidden" % self.prefix)
+        return mx.sym.reshape(source_hidden,
+                              shape=(-1, source_seq_len, self.attention_num_hidden),
+                              name="%ssource_hidden" % self.prefix)
+
+    def on(self, source: mx.sym.Symbol, source_length: mx.sym.Symbol, source_seq_len: int,
+           source_projected: Optional[mx.sym.Symbol] = None) -> Callable:
+        """
+        Returns callable to be used for recurrent attention in a sequence decoder.
+        The callable is a recurrent function of the form:
+        AttentionState = attend(AttentionInput, AttentionState).
+
+        :param source: Shape: (batch_size, seq_len, encoder_num_hidden).
+        :param source_length: Shape: (batch_size,).
+        :param source_seq_len: Maximum length of source sequences.
+        :param source_projected: Optional precomputed output of project_source(source, source_seq_len).
+        :return: Attention callable.
+        """
+
+        coverage_func = self.coverage.on(source, source_length, source_seq_len) if self.coverage else None
+
+        # (batch_size, seq_len, attention_num_hidden)
+        source_hidden = self.project_source(source, source_seq_len) if source_projected is None else source_projected
 
         def attend(att_input: AttentionInput, att_state: AttentionState) -> AttentionState:
             """
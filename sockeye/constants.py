@@ -78,6 +78,7 @@ TARGET_LABEL_NAME = "target_label"
 LEXICON_NAME = "lexicon"
 
 SOURCE_ENCODED_NAME = "encoded_source"
+SOURCE_PROJECTED_NAME = "projected_source"
 TARGET_PREVIOUS_NAME = "prev_target_word_id"
 HIDDEN_PREVIOUS_NAME = "prev_hidden"
 SOURCE_DYNAMIC_PREVIOUS_NAME = "prev_dynamic_source"
@@ -90,6 +91,30 @@ MEASURE_SPEED_EVERY = 50  # measure speed and metrics every X batches
 
 DEFAULT_BEAM_SIZE = 5
 
+# k-best selection in beam search
+TOP_K_NUMPY = "numpy"
+TOP_K_MXNET = "mxnet"
+TOP_K_ENGINES = [TOP_K_NUMPY, TOP_K_MXNET]
+
+# search strategies applied to sentences whose translation would miss its deadline
+DEGRADATION_NONE = "none"
+DEGRADATION_GREEDY = "greedy"
+DEGRADATION_TRUNCATED = "truncated"
+
+# pooling of encoder states into sentence embeddings
+POOLING_MEAN = "mean"
+POOLING_MAX = "max"
+POOLING_LAST = "last"
+POOLING_TYPES = [POOLING_MEAN, POOLING_MAX, POOLING_LAST]
+ENCODING_IDS_SUFFIX = "ids"
+
+# output length bounds: target/source length ratio of models that do not store length statistics
+TARGET_MAX_LENGTH_FACTOR = 2
+DEFAULT_NUM_STD_MAX_OUTPUT_LENGTH = 2
+
+# seconds between checks that translation worker processes (--workers) are still alive
+WORKER_POLL_INTERVAL = 1.0
+
 VERSION_NAME = "version"
 CONFIG_NAME = "config"
 LOG_NAME = "log"
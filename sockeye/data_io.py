@@ -102,7 +102,8 @@ def get_bucket(seq_len: int, buckets: List[int]) -> Optional[int]:
 def read_parallel_corpus(data_source: str,
                          data_target: str,
                          vocab_source: Dict[str, int],
-                         vocab_target: Dict[str, int]) -> Tuple[List[List[int]], List[List[int]]]:
+                         vocab_target: Dict[str, int],
+                         allow_empty: bool = False) -> Tuple[List[List[int]], List[List[int]]]:
     """
     Loads source and target data, making sure they have the same length.
 
@@ -110,15 +111,29 @@ def read_parallel_corpus(data_source: str,
     :param data_target: Path to target training data.
     :param vocab_source: Source vocabulary.
     :param vocab_target: Target vocabulary.
+    :param allow_empty: Whether empty lines are read as empty sentences instead of raising an error.
     :return: Tuple of (source sentences, target sentences).
     """
-    source_sentences = read_sentences(data_source, vocab_source, add_bos=False)
-    target_sentences = read_sentences(data_target, vocab_target, add_bos=True)
+    source_sentences = read_sentences(data_source, vocab_source, add_bos=False, allow_empty=allow_empty)
+    target_sentences = read_sentences(data_target, vocab_target, add_bos=True, allow_empty=allow_empty)
     check_condition(len(source_sentences) == len(target_sentences),
                     "Number of source sentences does not match number of target sentences")
     return source_sentences, target_sentences
 
 
+def length_statistics(source_sentences: List[List[int]],
+                      target_sentences: List[List[int]]) -> Tuple[float, float]:
+    """
+    Returns mean and standard deviation of the target/source length ratio of a parallel corpus.
+
+    :param source_sentences: Source sentences.
+    :param target_sentences: Target sentences.
+    :return: Mean and standard deviation of length ratios.
+    """
+    length_ratios = np.array([len(t) / float(len(s)) for t, s in zip(target_sentences, source_sentences)])
+    return float(length_ratios.mean()), float(length_ratios.std())
+
+
 def get_training_data_iters(source: str, target: str,
                             validation_source: str, validation_target: str,
                             vocab_source: Dict[str, int], vocab_target: Dict[str, int],
@@ -127,9 +142,11 @@ def get_training_data_iters(source: str, target: str,
                             max_seq_len_source: int,
                             max_seq_len_target: int,
                             bucketing: bool,
-                            bucket_width: int) -> Tuple['ParallelBucketSentenceIter', 'ParallelBucketSentenceIter']:
+                            bucket_width: int) -> Tuple['ParallelBucketSentenceIter', 'ParallelBucketSentenceIter',
+                                                        float, float]:
     """
-    Returns data iterators for training and validation data.
+    Returns data iterators for training and validation data, and the mean and standard deviation of the
+    target/source length ratio of the training data.
 
     :param source: Path to source training data.
     :param target: Path to target training data.
@@ -143,16 +160,15 @@ def get_training_data_iters(source: str, target: str,
     :param max_seq_len_target: Maximum target sequence length.
     :param bucketing: Whether to use bucketing.
     :param bucket_width: Size of buckets.
-    :return: Tuple of (training data iterator, validation data iterator).
+    :return: Tuple of (training data iterator, validation data iterator, length ratio mean, length ratio std).
     """
     logger.info("Creating train data iterator")
     train_source_sentences, train_target_sentences = read_parallel_corpus(source,
                                                                           target,
                                                                           vocab_source,
                                                                           vocab_target)
-    length_ratio = sum(len(t) / float(len(s)) for t, s in zip(train_target_sentences, train_source_sentences)) / len(
-        train_target_sentences)
-    logger.info("Average training target/source length ratio: %.2f", length_ratio)
+    length_ratio, length_ratio_std = length_statistics(train_source_sentences, train_target_sentences)
+    logger.info("Average training target/source length ratio: %.2f (+-%.2f)", length_ratio, length_ratio_std)
 
     # define buckets
     buckets = define_parallel_buckets(max_seq_len_source,
@@ -183,7 +199,7 @@ def get_training_data_iters(source: str, target: str,
                                           C.PAD_ID,
                                           vocab_target[C.UNK_SYMBOL],
                                           fill_up=fill_up)
-    return train_iter, val_iter
+    return train_iter, val_iter, length_ratio, length_ratio_std
 
 
 class DataConfig(config.Config):
@@ -265,7 +281,8 @@ def tokens2ids(tokens: Iterable[str], vocab: Dict[str, int]) -> List[int]:
     return [vocab.get(w, vocab[C.UNK_SYMBOL]) for w in tokens]
 
 
-def read_sentences(path: str, vocab: Dict[str, int], add_bos=False, limit=None) -> List[List[int]]:
+def read_sentences(path: str, vocab: Dict[str, int], add_bos=False, limit=None,
+                   allow_empty: bool = False) -> List[List[int]]:
     """
     Reads sentences from path and creates word id sentences.
 
@@ -273,6 +290,7 @@ def read_sentences(path: str, vocab: Dict[str, int], add_bos=False, limit=None)
     :param vocab: Vocabulary mapping.
     :param add_bos: Whether to add Beginning-Of-Sentence (BOS) symbol.
     :param limit: Read limit.
+    :param allow_empty: Whether empty lines are read as empty sentences instead of raising an error.
     :return: List of integer sequences.
     """
     assert C.UNK_SYMBOL in vocab
@@ -283,7 +301,7 @@ def read_sentences(path: str, vocab: Dict[str, int], add_bos=False, limit=None)
     sentences = []
     for sentence_tokens in read_content(path, limit):
         sentence = tokens2ids(sentence_tokens, vocab)
-        check_condition(sentence, "Empty sentence in file %s" % path)
+        check_condition(allow_empty or sentence, "Empty sentence in file %s" % path)
         if add_bos:
             sentence.insert(0, vocab[C.BOS_SYMBOL])
         sentences.append(sentence)
@@ -325,8 +343,10 @@ def get_parallel_bucket(buckets: List[Tuple[int, int]],
 # TODO: consider using HDF5 format for language data
 class ParallelBucketSentenceIter(mx.io.DataIter):
     """
-    A Bucket sentence iterator for parallel data. Randomly shuffles the data after every call to reset().
-    Data is stored in NDArrays for each epoch for fast indexing during iteration.
+    A Bucket sentence iterator for parallel data. Randomly shuffles the data after every call to reset(), unless
+    shuffle is False. Data is stored in NDArrays for each epoch for fast indexing during iteration.
+    The index of each batch holds the positions of its sentence pairs in the input lists, or -1 for rows that were
+    added to fill up a bucket. Sentence pairs that fit no bucket or have an empty source sentence are discarded.
 
     :param source_sentences: List of source sentences (integer-coded).
     :param target_sentences: List of target sentences (integer-coded).
@@ -335,10 +355,13 @@ class ParallelBucketSentenceIter(mx.io.DataIter):
            Incomplete batches are discarded if fill_up == None, or filled up according to the fill_up strategy.
     :param fill_up: If not None, fill up bucket data to a multiple of batch_size to avoid discarding incomplete batches.
            for each bucket. If set to 'replicate', sample examples from the bucket and use them to fill up.
+           If set to 'pad', fill up with copies of the first example of the bucket, which are counted as padding
+           of their batch.
     :param eos_id: Word id for end-of-sentence.
     :param pad_id: Word id for padding symbols.
     :param unk_id: Word id for unknown symbols.
     :param dtype: Data type of generated NDArrays.
+    :param shuffle: Whether to shuffle batches and examples within buckets on reset().
     """
 
     def __init__(self,
@@ -354,7 +377,8 @@ class ParallelBucketSentenceIter(mx.io.DataIter):
                  source_data_length_name=C.SOURCE_LENGTH_NAME,
                  target_data_name=C.TARGET_NAME,
                  label_name=C.TARGET_LABEL_NAME,
-                 dtype='float32'):
+                 dtype='float32',
+                 shuffle: bool = True):
         super(ParallelBucketSentenceIter, self).__init__()
 
         self.buckets = list(buckets)
@@ -370,12 +394,15 @@ class ParallelBucketSentenceIter(mx.io.DataIter):
         self.target_data_name = target_data_name
         self.label_name = label_name
         self.fill_up = fill_up
+        self.shuffle = shuffle
 
         # TODO: consider avoiding explicitly creating length and label arrays to save host memory
         self.data_source = [[] for _ in self.buckets]
         self.data_length = [[] for _ in self.buckets]
         self.data_target = [[] for _ in self.buckets]
         self.data_label = [[] for _ in self.buckets]
+        # position of each example in the input sentences, -1 for fill-up examples
+        self.data_index = [[] for _ in self.buckets]
 
         # assign sentence pairs to buckets
         self._assign_to_buckets(source_sentences, target_sentences)
@@ -409,6 +436,7 @@ class ParallelBucketSentenceIter(mx.io.DataIter):
         self.nd_length = []
         self.nd_target = []
         self.nd_label = []
+        self.batch_index = []
 
         self.reset()
 
@@ -418,14 +446,15 @@ class ParallelBucketSentenceIter(mx.io.DataIter):
         tokens_target = 0
         num_of_unks_source = 0
         num_of_unks_target = 0
-        for source, target in zip(source_sentences, target_sentences):
+        for sentence_index, (source, target) in enumerate(zip(source_sentences, target_sentences)):
             tokens_source += len(source)
             tokens_target += len(target)
             num_of_unks_source += source.count(self.unk_id)
             num_of_unks_target += target.count(self.unk_id)
 
             buck_idx, buck = get_parallel_bucket(self.buckets, len(source), len(target))
-            if buck is None:
+            # an empty source sentence cannot be encoded
+            if buck is None or not source:
                 ndiscard += 1
                 continue
 
@@ -439,6 +468,7 @@ class ParallelBucketSentenceIter(mx.io.DataIter):
             self.data_length[buck_idx].append(len(source))
             self.data_target[buck_idx].append(buff_target)
             self.data_label[buck_idx].append(buff_label)
+            self.data_index[buck_idx].append(sentence_index)
 
         logger.info("Source words: %d", tokens_source)
         logger.info("Target words: %d", tokens_target)
@@ -463,27 +493,36 @@ class ParallelBucketSentenceIter(mx.io.DataIter):
             self.data_length[i] = np.asarray(self.data_length[i], dtype=self.dtype)
             self.data_target[i] = np.asarray(self.data_target[i], dtype=self.dtype)
             self.data_label[i] = np.asarray(self.data_label[i], dtype=self.dtype)
+            self.data_index[i] = np.asarray(self.data_index[i], dtype='int64')
 
             n = len(self.data_source[i])
             if n % self.batch_size != 0:
                 buck_shape = self.buckets[i]
                 rest = self.batch_size - n % self.batch_size
                 if self.fill_up == 'pad':
-                    raise NotImplementedError
+                    logger.info("Padding bucket %s with %d copies of its first example to size it to multiple of "
+                                "batch size %d", buck_shape, rest, self.batch_size)
+                    random_indices = np.zeros((rest,), dtype='int64')
+                    # copies used for padding are not real data
+                    fill_up_index = np.full((rest,), -1, dtype='int64')
                 elif self.fill_up == 'replicate':
                     logger.info(
                         "Replicating %d random examples from bucket %s to size it to multiple of batch size %d", rest,
                         buck_shape, self.batch_size)
                     random_indices = np.random.randint(self.data_source[i].shape[0], size=rest)
-
-                    self.data_source[i] = np.concatenate((self.data_source[i], self.data_source[i][random_indices, :]),
-                                                         axis=0)
-                    self.data_length[i] = np.concatenate((self.data_length[i], self.data_length[i][random_indices]),
-                                                         axis=0)
-                    self.data_target[i] = np.concatenate((self.data_target[i], self.data_target[i][random_indices, :]),
-                                                         axis=0)
-                    self.data_label[i] = np.concatenate((self.data_label[i], self.data_label[i][random_indices, :]),
-                                                        axis=0)
+                    fill_up_index = self.data_index[i][random_indices]
+                else:
+                    continue
+
+                self.data_source[i] = np.concatenate((self.data_source[i], self.data_source[i][random_indices, :]),
+                                                     axis=0)
+                self.data_length[i] = np.concatenate((self.data_length[i], self.data_length[i][random_indices]),
+                                                     axis=0)
+                self.data_target[i] = np.concatenate((self.data_target[i], self.data_target[i][random_indices, :]),
+                                                     axis=0)
+                self.data_label[i] = np.concatenate((self.data_label[i], self.data_label[i][random_indices, :]),
+                                                    axis=0)
+                self.data_index[i] = np.concatenate((self.data_index[i], fill_up_index), axis=0)
 
     def reset(self):
         """
@@ -491,16 +530,21 @@ class ParallelBucketSentenceIter(mx.io.DataIter):
         """
         self.curr_idx = 0
         # shuffle indices
-        random.shuffle(self.idx)
+        if self.shuffle:
+            random.shuffle(self.idx)
 
         self.nd_source = []
         self.nd_length = []
         self.nd_target = []
         self.nd_label = []
+        self.batch_index = []
         self.indices = []
         for i in range(len(self.data_source)):
             # shuffle indices within each bucket
-            self.indices.append(np.random.permutation(len(self.data_source[i])))
+            if self.shuffle:
+                self.indices.append(np.random.permutation(len(self.data_source[i])))
+            else:
+                self.indices.append(np.arange(len(self.data_source[i])))
             self._append_ndarrays(i, self.indices[-1])
 
     def _append_ndarrays(self, bucket: int, shuffled_indices: np.array):
@@ -515,6 +559,7 @@ class ParallelBucketSentenceIter(mx.io.DataIter):
         self.nd_length.append(mx.nd.array(self.data_length[bucket].take(shuffled_indices, axis=0), dtype=self.dtype))
         self.nd_target.append(mx.nd.array(self.data_target[bucket].take(shuffled_indices, axis=0), dtype=self.dtype))
         self.nd_label.append(mx.nd.array(self.data_label[bucket].take(shuffled_indices, axis=0), dtype=self.dtype))
+        self.batch_index.append(self.data_index[bucket].take(shuffled_indices, axis=0))
 
     def iter_next(self) -> bool:
         """
@@ -537,15 +582,15 @@ class ParallelBucketSentenceIter(mx.io.DataIter):
         target = self.nd_target[i][j:j + self.batch_size]
         data = [source, length, target]
         label = [self.nd_label[i][j:j + self.batch_size]]
+        index = self.batch_index[i][j:j + self.batch_size]
 
         provide_data = [mx.io.DataDesc(name=n, shape=x.shape, layout=C.BATCH_MAJOR) for n, x in
                         zip(self.data_names, data)]
         provide_label = [mx.io.DataDesc(name=n, shape=x.shape, layout=C.BATCH_MAJOR) for n, x in
                          zip(self.label_names, label)]
 
-        # TODO: num pad examples is not set here if fillup strategy would be padding
         return mx.io.DataBatch(data, label,
-                               pad=0, index=None, bucket_key=self.buckets[i],
+                               pad=int((index < 0).sum()), index=index, bucket_key=self.buckets[i],
                                provide_data=provide_data, provide_label=provide_label)
 
     def save_state(self, fname: str):
@@ -582,5 +627,6 @@ class ParallelBucketSentenceIter(mx.io.DataIter):
         self.nd_length = []
         self.nd_target = []
         self.nd_label = []
+        self.batch_index = []
         for i in range(len(self.data_source)):
             self._append_ndarrays(i, self.indices[i])
@@ -317,25 +317,22 @@ class RecurrentDecoder(Decoder):
 
         return DecoderState(hidden, layer_states), attention_state
 
-    def decode(self,
-               source_encoded: mx.sym.Symbol,
-               source_seq_len: int,
-               source_length: mx.sym.Symbol,
-               target: mx.sym.Symbol,
-               target_seq_len: int,
-               source_lexicon: Optional[mx.sym.Symbol] = None) -> mx.sym.Symbol:
+    def _unroll(self,
+                source_encoded: mx.sym.Symbol,
+                source_seq_len: int,
+                source_length: mx.sym.Symbol,
+                target: mx.sym.Symbol,
+                target_seq_len: int) -> Tuple[List[mx.sym.Symbol], List[mx.sym.Symbol]]:
         """
-        Returns decoder logits with batch size and target sequence length collapsed into a single dimension.
+        Unrolls the decoder over the given target sequence.
 
         :param source_encoded: Concatenated encoder states. Shape: (source_seq_len, batch_size, encoder_num_hidden).
         :param source_seq_len: Maximum source sequence length.
         :param source_length: Lengths of source sequences. Shape: (batch_size,).
         :param target: Target sequence. Shape: (batch_size, target_seq_len).
         :param target_seq_len: Maximum target sequence length.
-        :param source_lexicon: Lexical biases for current sentence.
-               Shape: (batch_size, target_vocab_size, source_seq_len)
-        :return: Logits of next-word predictions for target sequence.
-                 Shape: (batch_size * target_seq_len, target_vocab_size)
+        :return: Hidden states of each time step. Shape: target_seq_len * (batch_size, 1, rnn_num_hidden).
+                 Attention probabilities of each time step. Shape: target_seq_len * (batch_size, source_seq_len).
         """
         # process encoder states
         source_encoded_batch_major = mx.sym.swapaxes(source_encoded, dim1=0, dim2=1, name='source_encoded_batch_major')
@@ -357,11 +354,11 @@ class RecurrentDecoder(Decoder):
 
         # hidden_all: target_seq_len * (batch_size, 1, rnn_num_hidden)
         hidden_all = []
+        # attention_probs: target_seq_len * (batch_size, source_seq_len)
+        attention_probs = []
 
         # TODO: possible alternative: feed back the context vector instead of the hidden (see lamtram)
 
-        lexical_biases = []
-
         self.rnn.reset()
         # TODO remove this once mxnet.rnn.SequentialRNNCell.reset() invokes recursive calls on layer cells
         for cell in self.rnn._cells:
@@ -377,10 +374,60 @@ class RecurrentDecoder(Decoder):
 
             # hidden_expanded: (batch_size, 1, rnn_num_hidden)
             hidden_all.append(mx.sym.expand_dims(data=state.hidden, axis=1))
+            attention_probs.append(attention_state.probs)
+
+        return hidden_all, attention_probs
+
+    def decode_attention(self,
+                         source_encoded: mx.sym.Symbol,
+                         source_seq_len: int,
+                         source_length: mx.sym.Symbol,
+                         target: mx.sym.Symbol,
+                         target_seq_len: int) -> mx.sym.Symbol:
+        """
+        Returns the attention probabilities of the decoder for a given target sequence (forced decoding).
+        The output layer is not computed.
+
+        :param source_encoded: Concatenated encoder states. Shape: (source_seq_len, batch_size, encoder_num_hidden).
+        :param source_seq_len: Maximum source sequence length.
+        :param source_length: Lengths of source sequences. Shape: (batch_size,).
+        :param target: Target sequence. Shape: (batch_size, target_seq_len).
+        :param target_seq_len: Maximum target sequence length.
+        :return: Attention probabilities of each target position. Shape: (batch_size, target_seq_len, source_seq_len).
+        """
+        _, attention_probs = self._unroll(source_encoded, source_seq_len, source_length, target, target_seq_len)
+        return mx.sym.concat(*[mx.sym.expand_dims(data=probs, axis=1) for probs in attention_probs], dim=1,
+                             name="%sattention_probs_concat" % self.prefix)
 
-            if source_lexicon is not None:
-                assert self.lexicon is not None, "source_lexicon should not be None if no lexicon available"
-                lexical_biases.append(self.lexicon.calculate_lex_bias(source_lexicon, attention_state.probs))
+    def decode(self,
+               source_encoded: mx.sym.Symbol,
+               source_seq_len: int,
+               source_length: mx.sym.Symbol,
+               target: mx.sym.Symbol,
+               target_seq_len: int,
+               source_lexicon: Optional[mx.sym.Symbol] = None) -> mx.sym.Symbol:
+        """
+        Returns decoder logits with batch size and target sequence length collapsed into a single dimension.
+
+        :param source_encoded: Concatenated encoder states. Shape: (source_seq_len, batch_size, encoder_num_hidden).
+        :param source_seq_len: Maximum source sequence length.
+        :param source_length: Lengths of source sequences. Shape: (batch_size,).
+        :param target: Target sequence. Shape: (batch_size, target_seq_len).
+        :param target_seq_len: Maximum target sequence length.
+        :param source_lexicon: Lexical biases for current sentence.
+               Shape: (batch_size, target_vocab_size, source_seq_len)
+        :return: Logits of next-word predictions for target sequence.
+                 Shape: (batch_size * target_seq_len, target_vocab_size)
+        """
+        # hidden_all: target_seq_len * (batch_size, 1, rnn_num_hidden)
+        # attention_probs: target_seq_len * (batch_size, source_seq_len)
+        hidden_all, attention_probs = self._unroll(source_encoded, source_seq_len, source_length,
+                                                   target, target_seq_len)
+
+        lexical_biases = []
+        if source_lexicon is not None:
+            assert self.lexicon is not None, "source_lexicon should not be None if no lexicon available"
+            lexical_biases = [self.lexicon.calculate_lex_bias(source_lexicon, probs) for probs in attention_probs]
 
         # concatenate along time axis
         # hidden_concat: (batch_size, target_seq_len, rnn_num_hidden)
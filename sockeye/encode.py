@@ -0,0 +1,122 @@
+# Copyright 2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You may not
+# use this file except in compliance with the License. A copy of the License
+# is located at
+#
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is distributed on
+# an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+"""
+Encoding CLI: computes sentence embeddings with the encoder of a model.
+"""
+import argparse
+import os
+import sys
+import time
+from contextlib import ExitStack
+from typing import Dict, Iterable, Tuple
+
+import numpy as np
+
+import sockeye.arguments as arguments
+import sockeye.constants as C
+import sockeye.data_io
+import sockeye.encoding
+import sockeye.model
+import sockeye.translate
+import sockeye.vocab
+from sockeye.log import setup_main_logger, log_sockeye_version
+
+logger = setup_main_logger(__name__, file_logging=False)
+
+
+def main():
+    params = argparse.ArgumentParser(description='Encode CLI')
+    arguments.add_encoding_args(params)
+    arguments.add_device_args(params)
+    args = params.parse_args()
+
+    global logger
+    logger = setup_main_logger(__name__, file_logging=True, path="%s.%s" % (args.output, C.LOG_NAME))
+
+    log_sockeye_version(logger)
+    logger.info("Command: %s", " ".join(sys.argv))
+    logger.info("Arguments: %s", args)
+
+    config = sockeye.model.SockeyeModel.load_config(os.path.join(args.model, C.CONFIG_NAME))
+    max_seq_len = config.max_seq_len if args.max_seq_len is None else args.max_seq_len
+    vocab_source = sockeye.vocab.vocab_from_json_or_pickle(os.path.join(args.model, C.VOCAB_SRC_NAME))
+
+    with sockeye.data_io.smart_open(args.input) as source_data:
+        num_sentences = sum(1 for _ in source_data)
+    logger.info("Encoding %d sentences from '%s'", num_sentences, args.input)
+
+    with ExitStack() as exit_stack:
+        context = sockeye.translate._setup_context(args, exit_stack)  # pylint: disable=protected-access
+        encoding_model = sockeye.encoding.EncodingModel(args.model, context,
+                                                        batch_size=args.batch_size,
+                                                        max_seq_len=max_seq_len,
+                                                        bucket_width=args.bucket_width,
+                                                        pooling=args.pooling,
+                                                        dtype=args.output_dtype,
+                                                        checkpoint=args.checkpoint)
+
+        embeddings = np.lib.format.open_memmap(args.output, mode='w+', dtype=args.output_dtype,
+                                               shape=(num_sentences, encoding_model.get_num_hidden()))
+        ids = np.lib.format.open_memmap("%s.%s" % (args.output, C.ENCODING_IDS_SUFFIX), mode='w+', dtype='int64',
+                                        shape=(num_sentences,))
+
+        tic = time.time()
+        source_data = exit_stack.enter_context(sockeye.data_io.smart_open(args.input))
+        num_encoded, num_truncated = encode_lines(encoding_model, vocab_source, source_data, embeddings, ids,
+                                                  args.sort_window)
+        embeddings.flush()
+        ids.flush()
+        total_time = time.time() - tic
+
+    if num_truncated > 0:
+        logger.warning("%d sentences exceed the maximum sequence length of %d and were truncated.",
+                       num_truncated, max_seq_len)
+    if num_encoded > 0:
+        logger.info("Encoded %d sentences in %.4fs (%.2f sentences/sec)",
+                    num_encoded, total_time, num_encoded / total_time)
+
+
+def encode_lines(encoding_model: sockeye.encoding.EncodingModel,
+                 vocab_source: Dict[str, int],
+                 source_data: Iterable[str],
+                 embeddings: np.ndarray,
+                 ids: np.ndarray,
+                 sort_window: int = 0) -> Tuple[int, int]:
+    """
+    Encodes source_data in batches of encoding_model.batch_size lines. Row i of embeddings receives the embedding of
+    the line with 0-based index ids[i]. With a positive sort_window, rows follow the order in which lines are
+    encoded, i.e. lines are sorted by length within each window.
+
+    :param encoding_model: Encoding model.
+    :param vocab_source: Source vocabulary.
+    :param source_data: Source sentences.
+    :param embeddings: Output array of sentence embeddings. Shape: (number of lines, num_hidden).
+    :param ids: Output array of line indices. Shape: (number of lines,).
+    :param sort_window: Number of lines sorted by length before they are split into batches, 0 to keep the input
+                        order.
+    :return: Number of encoded lines, number of truncated lines.
+    """
+    num_encoded, num_truncated = 0, 0
+    for chunk in sockeye.translate.get_chunks(source_data, encoding_model.batch_size, sort_window):
+        sentences = [sockeye.data_io.tokens2ids(sockeye.data_io.get_tokens(line), vocab_source) for _, line in chunk]
+        num_truncated += sum(1 for sentence in sentences if len(sentence) > encoding_model.max_seq_len)
+        embeddings[num_encoded:num_encoded + len(chunk)] = encoding_model.encode_batch(sentences)
+        # get_chunks numbers lines from 1
+        ids[num_encoded:num_encoded + len(chunk)] = [sentence_id - 1 for sentence_id, _ in chunk]
+        num_encoded += len(chunk)
+    return num_encoded, num_truncated
+
+
+if __name__ == '__main__':
+    main()
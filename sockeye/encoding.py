@@ -0,0 +1,157 @@
+# Copyright 2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You may not
+# use this file except in compliance with the License. A copy of the License
+# is located at
+#
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is distributed on
+# an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+"""
+Code for computing sentence embeddings with the encoder of a model
+"""
+import logging
+import os
+from typing import List, Optional
+
+import mxnet as mx
+import numpy as np
+
+from . import constants as C
+from . import data_io
+from . import model
+from . import utils
+
+logger = logging.getLogger(__name__)
+
+
+def pool(data: mx.sym.Symbol, data_length: mx.sym.Symbol, pooling: str) -> mx.sym.Symbol:
+    """
+    Pools encoder states over the time axis, ignoring positions beyond the length of each sequence.
+
+    :param data: Encoder states. Shape: (seq_len, batch_size, num_hidden).
+    :param data_length: Sequence lengths. Shape: (batch_size,).
+    :param pooling: Pooling type: mean, max or last.
+    :return: Pooled states. Shape: (batch_size, num_hidden).
+    """
+    if pooling == C.POOLING_MEAN:
+        data = mx.sym.SequenceMask(data=data, sequence_length=data_length, use_sequence_length=True, value=0.)
+        return mx.sym.broadcast_div(mx.sym.sum(data=data, axis=0), mx.sym.expand_dims(data_length, axis=1))
+    elif pooling == C.POOLING_MAX:
+        data = mx.sym.SequenceMask(data=data, sequence_length=data_length, use_sequence_length=True, value=-1e8)
+        return mx.sym.max(data=data, axis=0)
+    elif pooling == C.POOLING_LAST:
+        return mx.sym.SequenceLast(data=data, sequence_length=data_length, use_sequence_length=True)
+    raise ValueError("Unknown pooling type: %s" % pooling)
+
+
+class EncodingModel(model.SockeyeModel):
+    """
+    EncodingModel computes sentence embeddings by pooling the encoder states of a model. Only the encoder is run,
+    in batches of fixed size for each length bucket. Pooling and conversion to the output data type are part of the
+    graph, so only the embeddings are copied to the host.
+
+    :param model_folder: Folder to load model from.
+    :param context: MXNet context to bind the module to.
+    :param batch_size: Number of sentences encoded in parallel.
+    :param max_seq_len: Maximum sentence length. Longer sentences are truncated.
+    :param bucket_width: Width of length buckets.
+    :param pooling: Pooling type: mean, max or last.
+    :param dtype: Data type of the embeddings.
+    :param checkpoint: Checkpoint to load. If None, finds best parameters in model_folder.
+    """
+
+    def __init__(self,
+                 model_folder: str,
+                 context: mx.context.Context,
+                 batch_size: int,
+                 max_seq_len: int,
+                 bucket_width: int,
+                 pooling: str = C.POOLING_MEAN,
+                 dtype: str = 'float32',
+                 checkpoint: Optional[int] = None) -> None:
+        super().__init__(model.SockeyeModel.load_config(os.path.join(model_folder, C.CONFIG_NAME)))
+        self.model_version = utils.load_version(os.path.join(model_folder, C.VERSION_NAME))
+        logger.info("Model version: %s", self.model_version)
+        utils.check_version(self.model_version)
+        utils.check_condition(max_seq_len <= self.config.max_seq_len,
+                              "Maximum sequence length %d exceeds the maximum sequence length of the model (%d)"
+                              % (max_seq_len, self.config.max_seq_len))
+
+        self.context = context
+        self.batch_size = batch_size
+        self.max_seq_len = max_seq_len
+        self.buckets = data_io.define_buckets(max_seq_len, step=bucket_width)
+        self.pooling = pooling
+        self.dtype = dtype
+
+        self._build_model_components(self.config.max_seq_len, fused_encoder=False)
+        self.module = self._build_module()
+        self.module.bind(data_shapes=self._provide_data(self.buckets[-1]), for_training=False, grad_req="null")
+        self.load_params_from_file(os.path.join(model_folder,
+                                                C.PARAMS_NAME % checkpoint if checkpoint else C.PARAMS_BEST_NAME))
+        self.module.init_params(arg_params=self.params, allow_missing=False)
+
+    def get_num_hidden(self) -> int:
+        """
+        Returns the size of the sentence embeddings.
+        """
+        assert self.encoder is not None, "Model components have not been built"
+        return self.encoder.get_num_hidden()
+
+    def _provide_data(self, bucket_key: int) -> List[mx.io.DataDesc]:
+        return [mx.io.DataDesc(name=C.SOURCE_NAME, shape=(self.batch_size, bucket_key), layout=C.BATCH_MAJOR),
+                mx.io.DataDesc(name=C.SOURCE_LENGTH_NAME, shape=(self.batch_size,), layout=C.BATCH_MAJOR)]
+
+    def _build_module(self) -> mx.mod.BucketingModule:
+        """
+        Creates the bucketing module that outputs pooled encoder states.
+        """
+        source = mx.sym.Variable(C.SOURCE_NAME)
+        source_length = mx.sym.Variable(C.SOURCE_LENGTH_NAME)
+
+        def sym_gen(source_seq_len: int):
+            assert self.encoder is not None, "Model components have not been built"
+            (source_encoded,
+             source_encoded_length,
+             source_encoded_seq_len) = self.encoder.encode(source, source_length, seq_len=source_seq_len)
+            # source_encoded: (source_encoded_seq_len, batch_size, num_hidden)
+            embeddings = pool(source_encoded, source_encoded_length, self.pooling)
+            embeddings = mx.sym.Cast(data=embeddings, dtype=self.dtype)
+            return mx.sym.Group([embeddings]), [C.SOURCE_NAME, C.SOURCE_LENGTH_NAME], []
+
+        return mx.mod.BucketingModule(sym_gen=sym_gen,
+                                      logger=logger,
+                                      default_bucket_key=self.buckets[-1],
+                                      context=self.context)
+
+    def encode_batch(self, sentences: List[List[int]]) -> np.ndarray:
+        """
+        Returns embeddings of up to batch_size integer-coded sentences. Sentences are truncated to max_seq_len, and
+        empty sentences are encoded as a single padding symbol.
+
+        :param sentences: Integer-coded sentences.
+        :return: Sentence embeddings. Shape: (len(sentences), num_hidden).
+        """
+        assert 0 < len(sentences) <= self.batch_size
+        lengths = [min(max(len(sentence), 1), self.max_seq_len) for sentence in sentences]
+        bucket_key = data_io.get_bucket(max(lengths), self.buckets)
+        # lengths are capped at max_seq_len, which is the largest bucket
+        assert bucket_key is not None
+
+        source = np.full((self.batch_size, bucket_key), C.PAD_ID, dtype='float32')
+        # rows beyond the given sentences repeat the length of the first sentence and are discarded
+        source_length = np.full((self.batch_size,), lengths[0], dtype='float32')
+        for i, (sentence, length) in enumerate(zip(sentences, lengths)):
+            tokens = sentence[:length]
+            source[i, :len(tokens)] = tokens
+            source_length[i] = length
+
+        batch = mx.io.DataBatch(data=[mx.nd.array(source), mx.nd.array(source_length)], label=None,
+                                bucket_key=bucket_key, provide_data=self._provide_data(bucket_key))
+        self.module.forward(batch, is_train=False)
+        return self.module.get_outputs()[0].asnumpy()[:len(sentences)]
@@ -14,9 +14,12 @@
 """
 Code for inference/translation
 """
+import functools
 import logging
 import os
-from typing import Dict, List, NamedTuple, Optional, Tuple
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
 
 import mxnet as mx
 import numpy as np
@@ -25,6 +28,7 @@ from . import attention
 from . import constants as C
 from . import data_io
 from . import decoder
+from . import lexicon
 from . import model
 from . import utils
 from . import vocab
@@ -32,6 +36,76 @@ from . import vocab
 logger = logging.getLogger(__name__)
 
 
+class BucketExecutorCache:
+    """
+    Tracks the bound buckets of a BucketingModule in least recently used order. Once more than max_size buckets
+    are bound, or their executors use more than max_memory MB, least recently used buckets are removed from the
+    module, such that their executors can be freed. The default bucket is never evicted, as the executors of all
+    other buckets share its memory. The current bucket is never evicted either.
+
+    :param module: Bound BucketingModule.
+    :param max_size: Maximum number of bound buckets. None for no limit.
+    :param max_memory: Maximum memory of the executors of all bound buckets in MB (as reported by MXNet).
+                       None for no limit.
+    """
+
+    def __init__(self,
+                 module: mx.mod.BucketingModule,
+                 max_size: Optional[int] = None,
+                 max_memory: Optional[int] = None):
+        utils.check_condition(max_size is None or max_size >= 1, "Executor cache size must be at least 1")
+        self.module = module
+        self.max_size = max_size
+        self.max_memory = max_memory
+        # bucket key -> executor memory in MB, least recently used first
+        self.memory = OrderedDict()  # type: OrderedDict
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # pylint: disable=protected-access
+        for bucket_key in self.module._buckets:
+            self.memory[bucket_key] = self._get_memory(bucket_key)
+
+    def _get_memory(self, bucket_key) -> int:
+        # pylint: disable=protected-access
+        return self.module._buckets[bucket_key]._exec_group._total_exec_bytes
+
+    def switch_bucket(self, bucket_key, data_shapes: List[mx.io.DataDesc]):
+        """
+        Switches the module to bucket_key, binding it if necessary, and evicts least recently used buckets if the
+        cache exceeds its limits.
+
+        :param bucket_key: Bucket key.
+        :param data_shapes: Data shapes of the bucket.
+        """
+        if bucket_key in self.memory:
+            self.hits += 1
+            self.memory.move_to_end(bucket_key)
+        else:
+            self.misses += 1
+        self.module.switch_bucket(bucket_key, data_shapes)
+        if bucket_key not in self.memory:
+            self.memory[bucket_key] = self._get_memory(bucket_key)
+            self._evict(bucket_key)
+
+    def _evict(self, current_bucket_key):
+        # pylint: disable=protected-access
+        default_bucket_key = self.module._default_bucket_key
+        while (self.max_size is not None and len(self.memory) > self.max_size) or \
+                (self.max_memory is not None and sum(self.memory.values()) > self.max_memory):
+            victim = next((key for key in self.memory if key != default_bucket_key and key != current_bucket_key),
+                          None)
+            if victim is None:
+                break
+            del self.memory[victim]
+            del self.module._buckets[victim]
+            self.evictions += 1
+
+    def __repr__(self):
+        return "BucketExecutorCache(size=%d, memory=%dMB, hits=%d, misses=%d, evictions=%d)" % (
+            len(self.memory), sum(self.memory.values()), self.hits, self.misses, self.evictions)
+
+
 class InferenceModel(model.SockeyeModel):
     """
     InferenceModel is a SockeyeModel that supports three operations used for inference/decoding:
@@ -45,8 +119,15 @@ class InferenceModel(model.SockeyeModel):
     :param fused: Whether to use FusedRNNCell (CuDNN). Only works with GPU context.
     :param max_input_len: Maximum input length.
     :param beam_size: Beam size.
+    :param batch_size: Number of sentences decoded in parallel.
     :param checkpoint: Checkpoint to load. If None, finds best parameters in model_folder.
     :param softmax_temperature: Optional parameter to control steepness of softmax distribution.
+    :param restrict_vocab: If True, the output layer is computed outside of the decoder graph such that it can be
+                           restricted to a subset of the target vocabulary (see restrict_output_vocab).
+    :param max_executors: Maximum number of bound buckets of each of the encoder and decoder module.
+                          Least recently used buckets are evicted. None for no limit.
+    :param max_executor_memory: Maximum memory of the bound executors of each of the encoder and decoder module
+                                in MB. None for no limit.
     """
 
     def __init__(self,
@@ -55,8 +136,12 @@ class InferenceModel(model.SockeyeModel):
                  fused: bool,
                  max_input_len: Optional[int],
                  beam_size: int,
+                 batch_size: int = 1,
                  checkpoint: Optional[int] = None,
-                 softmax_temperature: Optional[float] = None):
+                 softmax_temperature: Optional[float] = None,
+                 restrict_vocab: bool = False,
+                 max_executors: Optional[int] = None,
+                 max_executor_memory: Optional[int] = None):
         # load config & determine parameter file
         super().__init__(model.SockeyeModel.load_config(os.path.join(model_folder, C.CONFIG_NAME)))
         fname_params = os.path.join(model_folder, C.PARAMS_NAME % checkpoint if checkpoint else C.PARAMS_BEST_NAME)
@@ -77,22 +162,37 @@ class InferenceModel(model.SockeyeModel):
                               'The beam size must be smaller than the target vocabulary size.')
 
         self.beam_size = beam_size
+        self.batch_size = batch_size
         self.softmax_temperature = softmax_temperature
-        self.encoder_batch_size = 1
+        self.restrict_vocab = restrict_vocab
         self.context = context
 
         self._build_model_components(self.max_input_len, fused)
+        # whether the attention projection of the source is computed by the encoder module
+        self.project_source = self.attention.source_projection_num_hidden is not None
+        # whether the dynamic source encoding is carried between decoder steps (only if updated, e.g. coverage)
+        self.dynamic_source = self.attention.has_dynamic_source
         self.encoder_module, self.decoder_module = self._build_modules()
 
         self.decoder_data_shapes_cache = dict()  # bucket_key -> shape cache
         max_encoder_data_shapes = self._get_encoder_data_shapes(self.max_input_len)
-        max_decoder_data_shapes = self._get_decoder_data_shapes(self.max_input_len)
+        max_decoder_data_shapes = self._get_decoder_data_shapes((self.max_input_len,
+                                                                 self.batch_size * self.beam_size))
         self.encoder_module.bind(data_shapes=max_encoder_data_shapes, for_training=False, grad_req="null")
         self.decoder_module.bind(data_shapes=max_decoder_data_shapes, for_training=False, grad_req="null")
 
+        self.params_fname = fname_params
         self.load_params_from_file(fname_params)
         self.encoder_module.init_params(arg_params=self.params, allow_missing=False)
         self.decoder_module.init_params(arg_params=self.params, allow_missing=False)
+        self.encoder_cache = BucketExecutorCache(self.encoder_module, max_executors, max_executor_memory)
+        self.decoder_cache = BucketExecutorCache(self.decoder_module, max_executors, max_executor_memory)
+
+        if self.restrict_vocab:
+            # full output layer parameters. Shapes: (target_vocab_size, decoder_num_hidden), (target_vocab_size,)
+            self.output_layer_w_full = self.params[self.decoder.cls_w.name].as_in_context(self.context)
+            self.output_layer_b_full = self.params[self.decoder.cls_b.name].as_in_context(self.context)
+            self.output_layer_w, self.output_layer_b = self.output_layer_w_full, self.output_layer_b_full
 
     def _build_modules(self):
 
@@ -117,9 +217,12 @@ class InferenceModel(model.SockeyeModel):
             data_names = [C.SOURCE_NAME, C.SOURCE_LENGTH_NAME]
             label_names = []
 
-            symbol_group = [source_encoded_batch_major,
-                            attention_state.dynamic_source,
-                            decoder_hidden_init] + decoder_init_states
+            symbol_group = [source_encoded_batch_major, decoder_hidden_init] + decoder_init_states
+            if self.dynamic_source:
+                symbol_group.append(attention_state.dynamic_source)
+            if self.project_source:
+                # sentence-constant attention projection, computed once instead of at every decoder step
+                symbol_group.append(self.attention.project_source(source_encoded_batch_major, source_encoded_seq_len))
             return mx.sym.Group(symbol_group), data_names, label_names
 
         encoder_module = mx.mod.BucketingModule(sym_gen=encoder_sym_gen,
@@ -128,23 +231,30 @@ class InferenceModel(model.SockeyeModel):
 
         # Decoder symbol & module
         source_encoded = mx.sym.Variable(C.SOURCE_ENCODED_NAME)
+        source_projected = mx.sym.Variable(C.SOURCE_PROJECTED_NAME) if self.project_source else None
         dynamic_source_prev = mx.sym.Variable(C.SOURCE_DYNAMIC_PREVIOUS_NAME)
         word_id_prev = mx.sym.Variable(C.TARGET_PREVIOUS_NAME)
         hidden_prev = mx.sym.Variable(C.HIDDEN_PREVIOUS_NAME)
-        layer_states, self.layer_shapes, layer_names = self.decoder.create_layer_input_variables(self.beam_size)
+        layer_states, self.layer_shapes, layer_names = self.decoder.create_layer_input_variables(
+            self.batch_size * self.beam_size)
         state = decoder.DecoderState(hidden_prev, layer_states)
         attention_state = attention.AttentionState(context=None, probs=None, dynamic_source=dynamic_source_prev)
 
-        def decoder_sym_gen(source_seq_len: int):
+        def decoder_sym_gen(bucket_key: Tuple[int, int]):
+            source_seq_len, _ = bucket_key
             data_names = [C.SOURCE_ENCODED_NAME,
-                          C.SOURCE_DYNAMIC_PREVIOUS_NAME,
                           C.SOURCE_LENGTH_NAME,
                           C.TARGET_PREVIOUS_NAME,
                           C.HIDDEN_PREVIOUS_NAME] + layer_names
+            if self.dynamic_source:
+                data_names.append(C.SOURCE_DYNAMIC_PREVIOUS_NAME)
+            if self.project_source:
+                data_names.append(C.SOURCE_PROJECTED_NAME)
             label_names = []
 
             source_encoded_seq_len = self.encoder.get_encoded_seq_len(source_seq_len)
-            attention_func = self.attention.on(source_encoded, source_encoded_length, source_encoded_seq_len)
+            attention_func = self.attention.on(source_encoded, source_encoded_length, source_encoded_seq_len,
+                                               source_projected=source_projected)
 
             softmax_out, next_state, next_attention_state = \
                 self.decoder.predict(word_id_prev,
@@ -153,164 +263,460 @@ class InferenceModel(model.SockeyeModel):
                                      attention_state,
                                      softmax_temperature=self.softmax_temperature)
 
-            symbol_group = [softmax_out,
-                            next_attention_state.probs,
-                            next_attention_state.dynamic_source,
-                            next_state.hidden] + next_state.layer_states
+            symbol_group = [next_attention_state.probs, next_state.hidden] + next_state.layer_states
+            if self.dynamic_source:
+                symbol_group.append(next_attention_state.dynamic_source)
+            if not self.restrict_vocab:
+                symbol_group = [softmax_out] + symbol_group
             return mx.sym.Group(symbol_group), data_names, label_names
 
+        # kept to compose the decoder step symbols of several models into one graph (see EnsembleInferenceModel)
+        self.decoder_sym_gen = decoder_sym_gen
+
+        # decoder bucket keys are (source length, number of rows), as finished sentences may be removed from
+        # the batch during beam search.
         decoder_module = mx.mod.BucketingModule(sym_gen=decoder_sym_gen,
-                                                default_bucket_key=self.max_input_len,
+                                                default_bucket_key=(self.max_input_len,
+                                                                    self.batch_size * self.beam_size),
                                                 context=self.context)
 
         return encoder_module, decoder_module
 
-    @staticmethod
-    def _get_encoder_data_shapes(max_input_length: int) -> List[mx.io.DataDesc]:
+    def _get_encoder_data_shapes(self, max_input_length: int) -> List[mx.io.DataDesc]:
         """
         Returns data shapes of the encoder module.
-        Encoder batch size is always 1.
 
         Shapes:
-        source: (1, max_input_len)
-        length: (1,)
+        source: (batch_size, max_input_len)
+        length: (batch_size,)
 
         :param max_input_length: Maximum input length.
         :return: List of data descriptions.
         """
-        return [mx.io.DataDesc(name=C.SOURCE_NAME, shape=(1, max_input_length), layout=C.BATCH_MAJOR),
-                mx.io.DataDesc(name=C.SOURCE_LENGTH_NAME, shape=(1,), layout=C.BATCH_MAJOR)]
+        return [mx.io.DataDesc(name=C.SOURCE_NAME, shape=(self.batch_size, max_input_length), layout=C.BATCH_MAJOR),
+                mx.io.DataDesc(name=C.SOURCE_LENGTH_NAME, shape=(self.batch_size,), layout=C.BATCH_MAJOR)]
 
-    def _get_decoder_data_shapes(self, input_length) -> List[mx.io.DataDesc]:
+    def _get_decoder_data_shapes(self, bucket_key: Tuple[int, int]) -> List[mx.io.DataDesc]:
         """
-        Returns data shapes of the decoder module, given a bucket_key (source input length)
+        Returns data shapes of the decoder module, given a bucket_key (source input length, number of rows).
+        The number of rows is batch_size * beam_size unless finished sentences were removed from the batch.
         Caches results for bucket_keys if called iteratively.
 
         Shapes:
-        source_encoded: (beam_size, input_length, encoder_num_hidden)
-        source_length: (beam_size,)
-        prev_target_id: (beam_size,)
-        prev_hidden: (beam_size, decoder_num_hidden)
+        source_encoded: (num_rows, input_length, encoder_num_hidden)
+        source_length: (num_rows,)
+        prev_target_id: (num_rows,)
+        prev_hidden: (num_rows, decoder_num_hidden)
 
-        :param input_length: Input length.
+        :param bucket_key: Input length and number of rows.
         :return: List of data descriptions.
         """
-        if input_length in self.decoder_data_shapes_cache:
-            return self.decoder_data_shapes_cache[input_length]
-
-        shapes = self._get_decoder_variable_shapes(input_length) + self.layer_shapes
-        self.decoder_data_shapes_cache[input_length] = shapes
+        if bucket_key in self.decoder_data_shapes_cache:
+            return self.decoder_data_shapes_cache[bucket_key]
+
+        input_length, num_rows = bucket_key
+        shapes = self._get_decoder_variable_shapes(input_length, num_rows)
+        shapes += [mx.io.DataDesc(name=desc.name, shape=(num_rows,) + desc.shape[1:], layout=desc.layout)
+                   for desc in self.layer_shapes]
+        if self.dynamic_source:
+            shapes.append(mx.io.DataDesc(C.SOURCE_DYNAMIC_PREVIOUS_NAME,
+                                         (num_rows,
+                                          self.encoder.get_encoded_seq_len(input_length),
+                                          self.attention.dynamic_source_num_hidden),
+                                         layout=C.BATCH_MAJOR))
+        if self.project_source:
+            shapes.append(mx.io.DataDesc(C.SOURCE_PROJECTED_NAME,
+                                         (num_rows,
+                                          self.encoder.get_encoded_seq_len(input_length),
+                                          self.attention.source_projection_num_hidden),
+                                         layout=C.BATCH_MAJOR))
+        self.decoder_data_shapes_cache[bucket_key] = shapes
         return shapes
 
-    def _get_decoder_variable_shapes(self, input_length):
+    def _get_decoder_variable_shapes(self, input_length: int, batch_beam_size: int):
         """
-        Returns only the data shapes of input variables. Auxiliary method to adjust the computation graph to the
-        presence or absence of coverage vectors.
+        Returns only the data shapes of the input variables that do not depend on the decoder configuration.
 
         :param input_length: The maximal source sentence length
+        :param batch_beam_size: Number of rows.
         :return: A list of input shapes
         """
         encoded_input_length = self.encoder.get_encoded_seq_len(input_length)
         shapes = [mx.io.DataDesc(C.SOURCE_ENCODED_NAME,
-                                 (self.beam_size, encoded_input_length, self.encoder.get_num_hidden()),
-                                 layout=C.BATCH_MAJOR),
-                  mx.io.DataDesc(C.SOURCE_DYNAMIC_PREVIOUS_NAME,
-                                 (self.beam_size, encoded_input_length, self.attention.dynamic_source_num_hidden),
+                                 (batch_beam_size, encoded_input_length, self.encoder.get_num_hidden()),
                                  layout=C.BATCH_MAJOR),
                   mx.io.DataDesc(C.SOURCE_LENGTH_NAME,
-                                 (self.beam_size,),
+                                 (batch_beam_size,),
                                  layout="N"),
                   mx.io.DataDesc(C.TARGET_PREVIOUS_NAME,
-                                 (self.beam_size,),
+                                 (batch_beam_size,),
                                  layout="N"),
                   mx.io.DataDesc(C.HIDDEN_PREVIOUS_NAME,
-                                 (self.beam_size, self.decoder.get_num_hidden()),
+                                 (batch_beam_size, self.decoder.get_num_hidden()),
                                  layout="NC")]
         return shapes
 
     def run_encoder(self,
                     source: mx.nd.NDArray,
                     source_length: mx.nd.NDArray,
-                    bucket_key: int) -> Tuple[mx.nd.NDArray, mx.nd.NDArray,
+                    bucket_key: int) -> Tuple[mx.nd.NDArray, Optional[mx.nd.NDArray],
                                               mx.nd.NDArray, mx.nd.NDArray,
-                                              List[mx.nd.NDArray]]:
+                                              List[mx.nd.NDArray], Optional[mx.nd.NDArray]]:
         """
         Runs forward pass of the encoder.
         Encodes source given source length and bucket key.
-        Returns encoder representation of the source, source_length, initial hidden state of decoder RNN,
-        and initial decoder states tiled to beam size.
+        Returns encoder representation of the source, initial dynamic source encoding (if carried between decoder
+        steps), source_length, initial hidden state of decoder RNN, initial decoder states, and the attention
+        projection of the source (if any), repeated beam size times for each sentence in the batch.
 
-        :param source: Integer-coded input tokens.
-        :param source_length: Length of input sentence.
+        :param source: Integer-coded input tokens. Shape: (batch_size, bucket_key).
+        :param source_length: Lengths of input sentences. Shape: (batch_size,).
         :param bucket_key: Bucket key.
-        :return: Encoded source, source length, initial decoder hidden state, initial decoder hidden states.
+        :return: Encoded source, dynamic source or None, source length, initial decoder hidden state,
+                 initial decoder hidden states, projected source or None.
         """
         batch = mx.io.DataBatch(data=[source, source_length], label=None,
                                 bucket_key=bucket_key,
                                 provide_data=[
-                                    mx.io.DataDesc(name=C.SOURCE_NAME, shape=(self.encoder_batch_size, bucket_key),
+                                    mx.io.DataDesc(name=C.SOURCE_NAME, shape=(self.batch_size, bucket_key),
                                                    layout=C.BATCH_MAJOR),
-                                    mx.io.DataDesc(name=C.SOURCE_LENGTH_NAME, shape=(self.encoder_batch_size,),
+                                    mx.io.DataDesc(name=C.SOURCE_LENGTH_NAME, shape=(self.batch_size,),
                                                    layout=C.BATCH_MAJOR)])
 
+        self.encoder_cache.switch_bucket(bucket_key, batch.provide_data)
         self.encoder_module.forward(data_batch=batch, is_train=False)
-        encoded_source, source_dynamic_init, decoder_hidden_init, *decoder_states = self.encoder_module.get_outputs()
-        # replicate encoder/init module results beam size times
-        encoded_source = mx.nd.tile(encoded_source, reps=(self.beam_size, 1, 1))
-        source_dynamic_init = mx.nd.tile(source_dynamic_init, reps=(self.beam_size, 1, 1))
-        decoder_hidden_init = mx.nd.tile(decoder_hidden_init, reps=(self.beam_size, 1))
-        decoder_states = [mx.nd.tile(state, reps=(self.beam_size, 1)) for state in decoder_states]
-        source_length = mx.nd.tile(source_length, reps=(self.beam_size,))
-        return encoded_source, source_dynamic_init, source_length, decoder_hidden_init, decoder_states
+        encoded_source, decoder_hidden_init, *decoder_states = self.encoder_module.get_outputs()
+        source_projected, source_dynamic_init = None, None
+        if self.project_source:
+            source_projected = mx.nd.repeat(decoder_states.pop(), repeats=self.beam_size, axis=0)
+        if self.dynamic_source:
+            source_dynamic_init = mx.nd.repeat(decoder_states.pop(), repeats=self.beam_size, axis=0)
+        # replicate encoder/init module results beam size times for each sentence,
+        # such that the hypotheses of a sentence occupy consecutive rows.
+        encoded_source = mx.nd.repeat(encoded_source, repeats=self.beam_size, axis=0)
+        decoder_hidden_init = mx.nd.repeat(decoder_hidden_init, repeats=self.beam_size, axis=0)
+        decoder_states = [mx.nd.repeat(state, repeats=self.beam_size, axis=0) for state in decoder_states]
+        source_length = mx.nd.repeat(source_length.as_in_context(self.context), repeats=self.beam_size, axis=0)
+        return encoded_source, source_dynamic_init, source_length, decoder_hidden_init, decoder_states, source_projected
 
     def run_decoder(self,
                     encoded_source: mx.nd.NDArray,
-                    dynamic_source: mx.nd.NDArray,
+                    dynamic_source: Optional[mx.nd.NDArray],
                     source_length: mx.nd.NDArray,
                     previous_word_id: mx.nd.NDArray,
                     previous_hidden: mx.nd.NDArray,
                     decoder_states: List[mx.nd.NDArray],
-                    bucket_key: int) -> Tuple[mx.nd.NDArray, mx.nd.NDArray,
-                                              mx.nd.NDArray, mx.nd.NDArray,
-                                              List[mx.nd.NDArray]]:
+                    bucket_key: int,
+                    source_projected: Optional[mx.nd.NDArray] = None) -> Tuple[mx.nd.NDArray, mx.nd.NDArray,
+                                                                               Optional[mx.nd.NDArray],
+                                                                               mx.nd.NDArray, List[mx.nd.NDArray]]:
         """
         Runs forward pass of the single-step decoder.
+        See bind_decoder_state() and forward_decoder() for decoding without copying inputs at every step.
 
         :param encoded_source: Encoded source sentence.
-        :param dynamic_source: Dynamic encoding of source sentence.
+        :param dynamic_source: Dynamic encoding of source sentence, or None if not carried between decoder steps.
         :param source_length: Source length.
         :param previous_word_id: Previous predicted word id.
         :param previous_hidden: Previous hidden decoder state.
         :param decoder_states: Decoder states.
-        :param bucket_key: Bucket key.
-        :return: Probability distribution over next word, attention scores, dynamic source encoding,
+        :param bucket_key: Bucket key (source length).
+        :param source_projected: Attention projection of the source, as returned by run_encoder.
+        :return: Probability distribution over next word, attention scores, dynamic source encoding or None,
                  next hidden state, next decoder states.
         """
 
         data = [encoded_source,
-                dynamic_source,
                 source_length,
                 previous_word_id.as_in_context(self.context),
                 previous_hidden] + decoder_states
+        if self.dynamic_source:
+            data.append(dynamic_source)
+        if self.project_source:
+            data.append(source_projected)
 
+        decoder_bucket_key = (bucket_key, encoded_source.shape[0])
         decoder_batch = mx.io.DataBatch(
             data=data,
-            label=None, bucket_key=bucket_key, provide_data=self._get_decoder_data_shapes(bucket_key))
+            label=None, bucket_key=decoder_bucket_key, provide_data=self._get_decoder_data_shapes(decoder_bucket_key))
         # run forward pass
+        self.decoder_cache.switch_bucket(decoder_bucket_key, decoder_batch.provide_data)
         self.decoder_module.forward(data_batch=decoder_batch, is_train=False)
-        # collect outputs
-        softmax_out, attention_probs, dynamic_source, next_hidden, *next_layer_states = \
-            self.decoder_module.get_outputs()
+        return self._collect_decoder_outputs(self.decoder_module.get_outputs())
 
+    def bind_decoder_state(self,
+                           state: 'ModelState',
+                           executor: Optional[mx.executor.Executor] = None,
+                           prefix: str = ''):
+        """
+        Copies the arrays of state into the input arrays of the decoder executor for its bucket key and number of
+        rows, and points state to these arrays. The executor can then be run with forward_decoder() on the arrays in
+        place, and ModelState.sort_state() writes the next inputs into them.
+        Input arrays of all decoder executors share memory, so a state must be bound again after decoding with a
+        different bucket key or number of rows (see ModelState.compact()).
+
+        :param state: Model state. Its arrays must not be input arrays of a decoder executor.
+        :param executor: Executor to bind to instead of the decoder executor of this model, e.g. of a fused ensemble.
+        :param prefix: Prefix of the names of this model's inputs in executor.
+        """
+        if executor is None:
+            executor = self._get_decoder_executor(state.bucket_key, state.source_encoded.shape[0])
+        inputs = executor.arg_dict
+
+        def copy_to_input(array: mx.nd.NDArray, name: str) -> mx.nd.NDArray:
+            array.copyto(inputs[prefix + name])
+            return inputs[prefix + name]
+
+        state.source_encoded = copy_to_input(state.source_encoded, C.SOURCE_ENCODED_NAME)
+        state.source_length = copy_to_input(state.source_length, C.SOURCE_LENGTH_NAME)
+        state.prev_target_word_id = copy_to_input(state.prev_target_word_id, C.TARGET_PREVIOUS_NAME)
+        state.decoder_hidden = copy_to_input(state.decoder_hidden, C.HIDDEN_PREVIOUS_NAME)
+        state.decoder_states = [copy_to_input(layer_state, desc.name)
+                                for layer_state, desc in zip(state.decoder_states, self.layer_shapes)]
+        if self.dynamic_source:
+            state.source_dynamic = copy_to_input(state.source_dynamic, C.SOURCE_DYNAMIC_PREVIOUS_NAME)
+        if self.project_source:
+            state.source_projected = copy_to_input(state.source_projected, C.SOURCE_PROJECTED_NAME)
+        state.executor = executor
+        state.inputs = (state.prev_target_word_id, state.source_dynamic, state.decoder_hidden, state.decoder_states)
+
+    def _get_decoder_executor(self, bucket_key: int, num_rows: int) -> mx.executor.Executor:
+        """
+        Returns the decoder executor for the given source bucket key and number of rows, binding it if necessary.
+
+        :param bucket_key: Bucket key (source length).
+        :param num_rows: Number of rows.
+        :return: Decoder executor.
+        """
+        decoder_bucket_key = (bucket_key, num_rows)
+        self.decoder_cache.switch_bucket(decoder_bucket_key, self._get_decoder_data_shapes(decoder_bucket_key))
+        # pylint: disable=protected-access
+        return self.decoder_module._curr_module._exec_group.execs[0]
+
+    def bind_bucket(self, bucket_key: int, num_rows: Iterable[int]) -> int:
+        """
+        Binds the encoder executor for bucket_key and the decoder executors for bucket_key and each number of rows,
+        unless already bound. Executors bound here may be evicted again if they exceed the executor cache limits.
+
+        :param bucket_key: Bucket key (source length).
+        :param num_rows: Numbers of decoder rows.
+        :return: Memory allocated by the executors that were bound, in MB (as reported by MXNet).
+        """
+        # pylint: disable=protected-access
+        bound_encoders, bound_decoders = set(self.encoder_cache.memory), set(self.decoder_cache.memory)
+        self.encoder_cache.switch_bucket(bucket_key, self._get_encoder_data_shapes(bucket_key))
+        memory = sum(m for key, m in self.encoder_cache.memory.items() if key not in bound_encoders)
+        for rows in num_rows:
+            self._get_decoder_executor(bucket_key, rows)
+            if (bucket_key, rows) not in bound_decoders:
+                memory += self.decoder_cache.memory.get((bucket_key, rows), 0)
+        return memory
+
+    def get_decoder_data_shapes(self, bucket_key: Tuple[int, int], prefix: str = '') -> List[mx.io.DataDesc]:
+        """
+        Returns data shapes of the decoder module, given a bucket key (source length, number of rows), with names
+        prefixed by prefix.
+
+        :param bucket_key: Input length and number of rows.
+        :param prefix: Prefix of data names.
+        :return: List of data descriptions.
+        """
+        return [mx.io.DataDesc(name=prefix + desc.name, shape=desc.shape, layout=desc.layout)
+                for desc in self._get_decoder_data_shapes(bucket_key)]
+
+    def forward_decoder(self, state: 'ModelState') -> Tuple[mx.nd.NDArray, mx.nd.NDArray, Optional[mx.nd.NDArray],
+                                                            mx.nd.NDArray, List[mx.nd.NDArray]]:
+        """
+        Runs forward pass of the single-step decoder on the input arrays state is bound to
+        (see bind_decoder_state()), without any copies or shape checks.
+
+        :param state: Bound model state.
+        :return: Probability distribution over next word, attention scores, dynamic source encoding or None,
+                 next hidden state, next decoder states.
+        """
+        state.executor.forward(is_train=False)
+        return self._collect_decoder_outputs(state.executor.outputs)
+
+    def _collect_decoder_outputs(self, outputs: List[mx.nd.NDArray]) -> Tuple[mx.nd.NDArray, mx.nd.NDArray,
+                                                                              Optional[mx.nd.NDArray],
+                                                                              mx.nd.NDArray, List[mx.nd.NDArray]]:
+        """
+        Returns probability distribution over next word, attention scores, dynamic source encoding or None,
+        next hidden state, and next decoder states from the outputs of the decoder.
+        """
+        if self.restrict_vocab:
+            attention_probs, next_hidden, *next_layer_states = outputs
+            softmax_out = self._compute_output_layer(next_hidden)
+        else:
+            softmax_out, attention_probs, next_hidden, *next_layer_states = outputs
+        dynamic_source = next_layer_states.pop() if self.dynamic_source else None
         return softmax_out, attention_probs, dynamic_source, next_hidden, next_layer_states
 
+    def restrict_output_vocab(self, target_ids: Optional[mx.nd.NDArray]):
+        """
+        Restricts the output layer to the given target ids. Word indices of subsequent decoder outputs
+        refer to positions in target_ids. Requires restrict_vocab=True.
+
+        :param target_ids: Sorted target ids. Shape: (num_target_ids,). If None, the full vocabulary is used.
+        """
+        utils.check_condition(self.restrict_vocab, "Model was not loaded with restrict_vocab=True")
+        if target_ids is None:
+            self.output_layer_w, self.output_layer_b = self.output_layer_w_full, self.output_layer_b_full
+        else:
+            self.output_layer_w = mx.nd.take(self.output_layer_w_full, target_ids)
+            self.output_layer_b = mx.nd.take(self.output_layer_b_full, target_ids)
+
+    def _compute_output_layer(self, hidden: mx.nd.NDArray) -> mx.nd.NDArray:
+        """
+        Computes the softmax output over the (possibly restricted) target vocabulary.
+
+        :param hidden: Decoder hidden state. Shape: (batch_size * beam_size, decoder_num_hidden).
+        :return: Softmax output. Shape: (batch_size * beam_size, num_target_ids).
+        """
+        logits = mx.nd.FullyConnected(data=hidden, weight=self.output_layer_w, bias=self.output_layer_b,
+                                      num_hidden=self.output_layer_w.shape[0])
+        if self.softmax_temperature is not None:
+            logits /= self.softmax_temperature
+        return mx.nd.softmax(logits)
+
+
+class EnsembleInferenceModel:
+    """
+    Decodes with an ensemble of InferenceModels in a single graph: the single-step decoder symbols of all models are
+    composed into one bucketed module, whose arguments are prefixed by the index of their model, and the combination
+    of the models' predictions into negative log probabilities is computed in the graph. A decoder step of the
+    ensemble then is a single forward call. The models' encoders are still run separately.
+
+    :param models: Models of the ensemble. They must not restrict the output vocabulary.
+    :param ensemble_mode: Ensemble mode: linear or log_linear combination.
+    :param max_executors: Maximum number of bound buckets. None for no limit.
+    :param max_executor_memory: Maximum memory of bound executors in MB. None for no limit.
+    """
+
+    def __init__(self,
+                 models: List[InferenceModel],
+                 ensemble_mode: str,
+                 max_executors: Optional[int] = None,
+                 max_executor_memory: Optional[int] = None):
+        utils.check_condition(ensemble_mode in ['linear', 'log_linear'], "unknown interpolation type")
+        utils.check_condition(not any(m.restrict_vocab for m in models),
+                              "Fused ensembles do not support vocabulary restriction")
+        utils.check_condition(all(m.max_input_len == models[0].max_input_len and
+                                  m.batch_size == models[0].batch_size and
+                                  m.beam_size == models[0].beam_size for m in models),
+                              "Models of a fused ensemble must use the same maximum input length, batch and beam size")
+        self.models = models
+        self.ensemble_mode = ensemble_mode
+        self.prefixes = ["m%d_" % i for i in range(len(models))]
+        self.decoder_module = mx.mod.BucketingModule(sym_gen=self._sym_gen,
+                                                     default_bucket_key=(models[0].max_input_len,
+                                                                         models[0].batch_size * models[0].beam_size),
+                                                     context=models[0].context)
+        # pylint: disable=protected-access
+        default_bucket_key = self.decoder_module._default_bucket_key
+        self.decoder_module.bind(data_shapes=self._get_data_shapes(default_bucket_key),
+                                 for_training=False, grad_req="null")
+        self.decoder_module.init_params(arg_params={prefix + name: param
+                                                    for m, prefix in zip(self.models, self.prefixes)
+                                                    for name, param in m.params.items()},
+                                        allow_missing=False)
+        self.decoder_cache = BucketExecutorCache(self.decoder_module, max_executors, max_executor_memory)
+
+    def _sym_gen(self, bucket_key: Tuple[int, int]):
+        data_names = []  # type: List[str]
+        probs, attention_probs, next_states = [], [], []
+        for m, prefix in zip(self.models, self.prefixes):
+            # operator names (and thereby output names) must be unique in the graph
+            with mx.name.Prefix(prefix):
+                symbol, model_data_names, _ = m.decoder_sym_gen(bucket_key)
+            # rename arguments, keeping attributes such as shapes of parameters
+            attrs = symbol.attr_dict()
+            symbol = symbol(**{name: mx.sym.Variable(prefix + name, attr=attrs.get(name))
+                               for name in symbol.list_arguments() if not name.startswith(prefix)})
+            data_names += [prefix + name for name in model_data_names]
+            # outputs: softmax, attention probs, hidden, layer states, [dynamic source]
+            outputs = [symbol[i] for i in range(len(symbol.list_outputs()))]
+            probs.append(outputs[0])
+            attention_probs.append(outputs[1])
+            next_states += outputs[2:]
+
+        if self.ensemble_mode == 'linear':
+            neg_logprobs = -mx.sym.log(self._average(probs))
+        else:
+            # averaged and re-normalized log probabilities
+            neg_logprobs = -mx.sym.log(mx.sym.softmax(self._average([mx.sym.log(p) for p in probs])))
+        return mx.sym.Group([neg_logprobs, self._average(attention_probs)] + next_states), data_names, []
+
+    @staticmethod
+    def _average(symbols: List[mx.sym.Symbol]) -> mx.sym.Symbol:
+        return mx.sym.ElementWiseSum(*symbols) / len(symbols)
+
+    def _get_data_shapes(self, bucket_key: Tuple[int, int]) -> List[mx.io.DataDesc]:
+        return [desc for m, prefix in zip(self.models, self.prefixes)
+                for desc in m.get_decoder_data_shapes(bucket_key, prefix)]
+
+    def _get_executor(self, bucket_key: int, num_rows: int) -> mx.executor.Executor:
+        decoder_bucket_key = (bucket_key, num_rows)
+        self.decoder_cache.switch_bucket(decoder_bucket_key, self._get_data_shapes(decoder_bucket_key))
+        # pylint: disable=protected-access
+        return self.decoder_module._curr_module._exec_group.execs[0]
+
+    def bind_bucket(self, bucket_key: int, num_rows: Iterable[int]) -> int:
+        """
+        Binds the executors for bucket_key and each number of rows, unless already bound.
+
+        :param bucket_key: Bucket key (source length).
+        :param num_rows: Numbers of decoder rows.
+        :return: Memory allocated by the executors that were bound, in MB (as reported by MXNet).
+        """
+        bound = set(self.decoder_cache.memory)
+        memory = 0
+        for rows in num_rows:
+            self._get_executor(bucket_key, rows)
+            if (bucket_key, rows) not in bound:
+                memory += self.decoder_cache.memory.get((bucket_key, rows), 0)
+        return memory
+
+    def bind_decoder_states(self, states: List['ModelState']):
+        """
+        Binds the states of all models to the inputs of the executor for their bucket key and number of rows
+        (see InferenceModel.bind_decoder_state()).
+
+        :param states: Model states, one per model.
+        """
+        executor = self._get_executor(states[0].bucket_key, states[0].source_encoded.shape[0])
+        for m, prefix, state in zip(self.models, self.prefixes, states):
+            m.bind_decoder_state(state, executor, prefix)
+
+    def forward_decoder(self, states: List['ModelState']) -> Tuple[mx.nd.NDArray, mx.nd.NDArray]:
+        """
+        Runs a decoder step of the ensemble on the inputs the states are bound to and updates the states with the
+        next hidden states, decoder states and dynamic source encodings of each model.
+
+        :param states: Bound model states, one per model.
+        :return: Combined negative log probabilities of the next word, averaged attention scores.
+        """
+        executor = states[0].executor
+        executor.forward(is_train=False)
+        neg_logprobs, attention_probs, *outputs = executor.outputs
+        for m, state in zip(self.models, states):
+            num_outputs = 1 + len(m.layer_shapes) + (1 if m.dynamic_source else 0)
+            model_outputs, outputs = outputs[:num_outputs], outputs[num_outputs:]
+            state.decoder_hidden, *state.decoder_states = model_outputs
+            state.source_dynamic = state.decoder_states.pop() if m.dynamic_source else None
+        return neg_logprobs, attention_probs
+
 
 def load_models(context: mx.context.Context,
                 max_input_len: int,
                 beam_size: int,
                 model_folders: List[str],
                 checkpoints: Optional[List[int]] = None,
-                softmax_temperature: Optional[float] = None) \
+                softmax_temperature: Optional[float] = None,
+                batch_size: int = 1,
+                restrict_vocab: bool = False,
+                max_executors: Optional[int] = None,
+                max_executor_memory: Optional[int] = None) \
         -> Tuple[List[InferenceModel], Dict[str, int], Dict[str, int]]:
     """
     Loads a list of models for inference.
@@ -321,6 +727,10 @@ def load_models(context: mx.context.Context,
     :param model_folders: List of model folders to load models from.
     :param checkpoints: List of checkpoints to use for each model in model_folders. Use None to load best checkpoint.
     :param softmax_temperature: Optional parameter to control steepness of softmax distribution.
+    :param batch_size: Number of sentences decoded in parallel.
+    :param restrict_vocab: Whether models support restricting the output layer to a subset of the target vocabulary.
+    :param max_executors: Maximum number of bound buckets per module. None for no limit.
+    :param max_executor_memory: Maximum memory of bound executors per module in MB. None for no limit.
     :return: List of models, source vocabulary, target vocabulary.
     """
     models, source_vocabs, target_vocabs = [], [], []
@@ -334,8 +744,12 @@ def load_models(context: mx.context.Context,
                                fused=False,
                                max_input_len=max_input_len,
                                beam_size=beam_size,
+                               batch_size=batch_size,
                                softmax_temperature=softmax_temperature,
-                               checkpoint=checkpoint)
+                               checkpoint=checkpoint,
+                               restrict_vocab=restrict_vocab,
+                               max_executors=max_executors,
+                               max_executor_memory=max_executor_memory)
         models.append(model)
 
     # check vocabulary consistency
@@ -364,8 +778,10 @@ TranslatorOutput = NamedTuple('TranslatorOutput', [
     ('id', int),
     ('translation', str),
     ('tokens', List[str]),
-    ('attention_matrix', np.ndarray),
+    ('attention_matrix', Optional[np.ndarray]),
     ('score', float),
+    ('degradation', str),
+    ('time', float),
 ])
 """
 Output structure from Translator.
@@ -374,23 +790,32 @@ Output structure from Translator.
 :param translation: Translation string without sentence boundary tokens.
 :param tokens: List of translated tokens.
 :param attention_matrix: Attention matrix. Shape: (target_length, source_length).
+                         None if the Translator does not store attention.
 :param score: Negative log probability of generated translation.
+:param degradation: Search degradation applied to meet a deadline: C.DEGRADATION_NONE, C.DEGRADATION_GREEDY (the
+                    search continued with only the best open hypothesis), or C.DEGRADATION_TRUNCATED (the search
+                    was stopped and the best hypothesis so far, possibly unfinished, was returned).
+:param time: Time in seconds spent translating the batch of this sentence.
 """
+TranslatorOutput.__new__.__defaults__ = (C.DEGRADATION_NONE, 0.0)  # type: ignore
 
 
 class ModelState:
     """
     A ModelState encapsulates information about the decoder state of an InferenceModel.
+    Once bound to a decoder executor (see InferenceModel.bind_decoder_state()), sort_state() writes the reordered
+    states into the executor's input arrays instead of allocating new arrays.
     """
 
     def __init__(self,
                  bucket_key: int,
                  prev_target_word_id: mx.nd.NDArray,
                  source_encoded: mx.nd.NDArray,
-                 source_dynamic: mx.nd.NDArray,
+                 source_dynamic: Optional[mx.nd.NDArray],
                  source_length: mx.nd.NDArray,
                  decoder_hidden: mx.nd.NDArray,
-                 decoder_states: List[mx.nd.NDArray]):
+                 decoder_states: List[mx.nd.NDArray],
+                 source_projected: Optional[mx.nd.NDArray] = None):
         self.bucket_key = bucket_key
         self.prev_target_word_id = prev_target_word_id
         self.source_encoded = source_encoded
@@ -398,15 +823,143 @@ class ModelState:
         self.source_length = source_length
         self.decoder_states = decoder_states
         self.decoder_hidden = decoder_hidden
+        self.source_projected = source_projected
+        # decoder executor and its input arrays for previous word ids, dynamic source, hidden and decoder states
+        self.executor = None  # type: Optional[mx.executor.Executor]
+        self.inputs = None  # type: Optional[Tuple[mx.nd.NDArray, Optional[mx.nd.NDArray], mx.nd.NDArray, List]]
 
     def sort_state(self, best_hyp_indices: mx.nd.NDArray, best_word_indices: mx.nd.NDArray):
         """
         Sorts states according to k-best order from last step in beam search.
         """
-        self.prev_target_word_id = best_word_indices
-        self.source_dynamic = mx.nd.take(self.source_dynamic, best_hyp_indices)
-        self.decoder_hidden = mx.nd.take(self.decoder_hidden, best_hyp_indices)
-        self.decoder_states = [mx.nd.take(ds, best_hyp_indices) for ds in self.decoder_states]
+        if self.inputs is None:
+            self.prev_target_word_id = best_word_indices
+            if self.source_dynamic is not None:
+                self.source_dynamic = mx.nd.take(self.source_dynamic, best_hyp_indices)
+            self.decoder_hidden = mx.nd.take(self.decoder_hidden, best_hyp_indices)
+            self.decoder_states = [mx.nd.take(ds, best_hyp_indices) for ds in self.decoder_states]
+            return
+        # the current states are decoder outputs, which never share memory with the decoder inputs
+        word_input, dynamic_input, hidden_input, state_inputs = self.inputs
+        word_input[:] = best_word_indices
+        self.prev_target_word_id = word_input
+        if self.source_dynamic is not None:
+            self.source_dynamic = mx.nd.take(self.source_dynamic, best_hyp_indices, out=dynamic_input)
+        self.decoder_hidden = mx.nd.take(self.decoder_hidden, best_hyp_indices, out=hidden_input)
+        self.decoder_states = [mx.nd.take(ds, best_hyp_indices, out=state_input)
+                               for ds, state_input in zip(self.decoder_states, state_inputs)]
+
+    def advance(self, best_word_indices: mx.nd.NDArray):
+        """
+        Sets the next inputs for greedy search, where every row keeps its single hypothesis and no reordering is
+        needed: states are copied into the bound input arrays as they are.
+        """
+        if self.inputs is None:
+            self.prev_target_word_id = best_word_indices
+            return
+        word_input, dynamic_input, hidden_input, state_inputs = self.inputs
+        word_input[:] = best_word_indices
+        self.prev_target_word_id = word_input
+        if self.source_dynamic is not None:
+            self.source_dynamic = self.source_dynamic.copyto(dynamic_input)
+        self.decoder_hidden = self.decoder_hidden.copyto(hidden_input)
+        self.decoder_states = [ds.copyto(state_input)
+                               for ds, state_input in zip(self.decoder_states, state_inputs)]
+
+    def compact(self, rows: mx.nd.NDArray):
+        """
+        Keeps only the given rows of all states, e.g. to stop decoding sentences whose search has ended.
+        The state is unbound from its decoder executor.
+
+        :param rows: Indices of rows to keep.
+        """
+        self.prev_target_word_id = mx.nd.take(self.prev_target_word_id, rows)
+        self.source_encoded = mx.nd.take(self.source_encoded, rows)
+        if self.source_dynamic is not None:
+            self.source_dynamic = mx.nd.take(self.source_dynamic, rows)
+        self.source_length = mx.nd.take(self.source_length, rows)
+        self.decoder_hidden = mx.nd.take(self.decoder_hidden, rows)
+        self.decoder_states = [mx.nd.take(ds, rows) for ds in self.decoder_states]
+        if self.source_projected is not None:
+            self.source_projected = mx.nd.take(self.source_projected, rows)
+        self.executor, self.inputs = None, None
+
+    def select_rows(self, rows: mx.nd.NDArray) -> 'ModelState':
+        """
+        Returns a new, unbound ModelState with copies of the given rows of all states. Rows may be repeated, e.g. to
+        replicate the state of a single hypothesis over a beam.
+
+        :param rows: Indices of rows to copy.
+        :return: Model state.
+        """
+        state = ModelState(self.bucket_key, self.prev_target_word_id, self.source_encoded, self.source_dynamic,
+                           self.source_length, self.decoder_hidden, self.decoder_states, self.source_projected)
+        state.compact(rows)
+        return state
+
+
+PrefixState = NamedTuple('PrefixState', [
+    ('model_states', List[ModelState]),
+    ('neg_logprob', float),
+    ('attention_matrix', Optional[np.ndarray]),
+])
+"""
+State of a Translator after forcing a target prefix through the decoder, see Translator.translate_with_prefix().
+
+:param model_states: Unbound single-row state of each model, ready to predict the word after the prefix.
+:param neg_logprob: Negative log probability of the prefix (not length-normalized).
+:param attention_matrix: Attention scores of the prefix words. Shape: (prefix_length, encoded_source_length).
+                         None if the Translator does not store attention.
+"""
+
+
+class PrefixCache:
+    """
+    Caches states of a Translator after encoding a source sentence and forcing target prefixes, for a single
+    interactive session (see Translator.translate_with_prefix()). States are keyed by source tokens and prefix
+    tokens. If a prefix is extended by k tokens, the state of the shorter prefix is found and only k forced decoder
+    steps are needed. The least recently used states are evicted once more than max_size states are cached.
+    A cache must only be used with the Translator that filled it.
+
+    :param max_size: Maximum number of cached states.
+    """
+
+    def __init__(self, max_size: int = 32) -> None:
+        utils.check_condition(max_size > 0, "Prefix cache size must be positive")
+        self.max_size = max_size
+        self.states = OrderedDict()  # type: OrderedDict
+
+    def lookup(self, source: Tuple[str, ...], prefix: Tuple[str, ...]) -> Tuple[int, Optional[PrefixState]]:
+        """
+        Returns the state of the longest cached prefix of the given prefix for source, and the length of that prefix.
+
+        :param source: Source tokens.
+        :param prefix: Target prefix tokens.
+        :return: Length of the longest cached prefix, and its state or None if nothing is cached for source.
+        """
+        for length in range(len(prefix), -1, -1):
+            key = (source, prefix[:length])
+            state = self.states.get(key)
+            if state is not None:
+                self.states.move_to_end(key)
+                return length, state
+        return 0, None
+
+    def put(self, source: Tuple[str, ...], prefix: Tuple[str, ...], state: PrefixState):
+        """
+        Caches the state after forcing prefix for source, evicting the least recently used states if necessary.
+
+        :param source: Source tokens.
+        :param prefix: Target prefix tokens.
+        :param state: Prefix state.
+        """
+        self.states[(source, prefix)] = state
+        self.states.move_to_end((source, prefix))
+        while len(self.states) > self.max_size:
+            self.states.popitem(last=False)
+
+    def __len__(self):
+        return len(self.states)
 
 
 class Translator:
@@ -420,6 +973,26 @@ class Translator:
     :param models: List of models.
     :param vocab_source: Source vocabulary.
     :param vocab_target: Target vocabulary.
+    :param top_k_engine: Implementation of k-best selection: numpy (on the host) or mxnet (on the context).
+    :param restrict_lexicon: Optional top-k lexicon to restrict the target vocabulary of each batch of sentences.
+    :param store_attention: Whether to keep attention scores during search and return attention matrices.
+    :param beam_prune_absolute: Optional threshold to prune open hypotheses whose score is worse than the best
+                                score of their sentence by more than this value.
+    :param beam_prune_relative: Optional threshold to prune open hypotheses whose probability is less than this
+                                fraction of the probability of the best hypothesis of their sentence.
+    :param beam_compact: Whether to stop decoding the rows of sentences whose search has ended.
+    :param max_output_length_num_stds: Number of standard deviations of the target/source length ratio added to its
+                                       mean to bound the output length of each sentence.
+    :param min_output_length_num_stds: Optional number of standard deviations of the target/source length ratio
+                                       subtracted from its mean to give a minimum output length of each sentence.
+    :param bucket_width: Width of the source length buckets.
+    :param ensemble_fused: Whether to decode an ensemble of several models in a single graph
+                           (see EnsembleInferenceModel).
+    :param time_budget: Optional time in seconds to translate each call of translate_batch() in, if no explicit
+                        deadline is given. See _beam_search() for how the search degrades to meet it.
+    :param sample: If given, translations are sampled instead of searched: each word is drawn from the sample best
+                   words predicted by the models, or from all words if 0. Each sentence gets beam_size samples,
+                   see sample_batch().
     """
 
     def __init__(self,
@@ -427,7 +1000,19 @@ class Translator:
                  ensemble_mode: str,
                  models: List[InferenceModel],
                  vocab_source: Dict[str, int],
-                 vocab_target: Dict[str, int]):
+                 vocab_target: Dict[str, int],
+                 top_k_engine: str = C.TOP_K_NUMPY,
+                 restrict_lexicon: Optional[lexicon.TopKLexicon] = None,
+                 store_attention: bool = True,
+                 beam_prune_absolute: Optional[float] = None,
+                 beam_prune_relative: Optional[float] = None,
+                 beam_compact: bool = False,
+                 max_output_length_num_stds: float = C.DEFAULT_NUM_STD_MAX_OUTPUT_LENGTH,
+                 min_output_length_num_stds: Optional[float] = None,
+                 bucket_width: int = 10,
+                 ensemble_fused: bool = False,
+                 time_budget: Optional[float] = None,
+                 sample: Optional[int] = None):
         self.context = context
         self.vocab_source = vocab_source
         self.vocab_target = vocab_target
@@ -435,12 +1020,53 @@ class Translator:
         self.start_id = self.vocab_target[C.BOS_SYMBOL]
         self.stop_ids = {self.vocab_target[C.EOS_SYMBOL], C.PAD_ID}
         self.models = models
+        self.ensemble_mode = ensemble_mode
         self.interpolation_func = self._get_interpolation_func(ensemble_mode)
+        self.ensemble = None  # type: Optional[EnsembleInferenceModel]
+        if ensemble_fused and len(self.models) > 1:
+            self.ensemble = EnsembleInferenceModel(self.models, ensemble_mode,
+                                                   self.models[0].encoder_cache.max_size,
+                                                   self.models[0].encoder_cache.max_memory)
         self.beam_size = self.models[0].beam_size
-        self.buckets = data_io.define_buckets(self.models[0].max_input_len)
-        self.pad_dist = mx.nd.full((self.beam_size, len(self.vocab_target)), val=np.inf, ctx=self.context)
-        logger.info("Translator (%d model(s) beam_size=%d ensemble_mode=%s)",
-                    len(self.models), self.beam_size, "None" if len(self.models) == 1 else ensemble_mode)
+        self.batch_size = self.models[0].batch_size
+        utils.check_condition(all(m.batch_size == self.batch_size for m in self.models),
+                              "Models must use the same batch size")
+        self.buckets = data_io.define_buckets(self.models[0].max_input_len, step=bucket_width)
+        self.pad_dist = mx.nd.full((self.batch_size * self.beam_size, len(self.vocab_target)),
+                                   val=np.inf, ctx=self.context)
+        # preallocated device copies of the per-step beam search bookkeeping: lengths, accumulated scores, finished
+        # flags, best hypothesis indices and best word indices.
+        self.step_buffers = [mx.nd.zeros((self.batch_size * self.beam_size, 1), ctx=self.context),
+                             mx.nd.zeros((self.batch_size * self.beam_size, 1), ctx=self.context),
+                             mx.nd.zeros((self.batch_size * self.beam_size,), ctx=self.context, dtype='int32'),
+                             mx.nd.zeros((self.batch_size * self.beam_size,), ctx=self.context),
+                             mx.nd.zeros((self.batch_size * self.beam_size,), ctx=self.context, dtype='int32')]
+        utils.check_condition(top_k_engine in C.TOP_K_ENGINES, "Unknown top-k engine: %s" % top_k_engine)
+        self.top_k_engine = top_k_engine
+        self.restrict_lexicon = restrict_lexicon
+        self.store_attention = store_attention
+        utils.check_condition(beam_prune_absolute is None or beam_prune_absolute >= 0,
+                              "Absolute beam pruning threshold must be non-negative")
+        utils.check_condition(beam_prune_relative is None or 0 < beam_prune_relative <= 1,
+                              "Relative beam pruning threshold must be in (0, 1]")
+        self.beam_prune_absolute = beam_prune_absolute
+        self.beam_prune_relative = beam_prune_relative
+        self.beam_compact = beam_compact
+        self.max_output_length_num_stds = max_output_length_num_stds
+        self.min_output_length_num_stds = min_output_length_num_stds
+        utils.check_condition(time_budget is None or time_budget > 0, "Time budget must be positive")
+        self.time_budget = time_budget
+        utils.check_condition(sample is None or sample >= 0, "Number of words to sample from must be non-negative")
+        self.sample = sample
+        utils.check_condition(self.restrict_lexicon is None or all(m.restrict_vocab for m in self.models),
+                              "Vocabulary restriction requires models loaded with restrict_vocab=True")
+        # row offset of the first hypothesis of each sentence. Shape: (batch_size, 1)
+        self.hyp_offsets = mx.nd.array(np.arange(self.batch_size) * self.beam_size,
+                                       ctx=self.context).reshape((self.batch_size, 1))
+        logger.info("Translator (%d model(s) beam_size=%d batch_size=%d ensemble_mode=%s%s top_k_engine=%s sample=%s)",
+                    len(self.models), self.beam_size, self.batch_size,
+                    "None" if len(self.models) == 1 else ensemble_mode,
+                    " (fused)" if self.ensemble is not None else "", self.top_k_engine, self.sample)
 
     @staticmethod
     def _get_interpolation_func(ensemble_mode):
@@ -463,6 +1089,28 @@ class Translator:
         log_probs = utils.average_arrays([mx.nd.log(p) for p in predictions])
         return -mx.nd.log(mx.nd.softmax(log_probs))
 
+    def warmup(self):
+        """
+        Binds the encoder and decoder executors of all buckets and translates a dummy batch in each bucket,
+        so that the first translations of each length do not pay for symbol generation and binding.
+        With beam compaction, decoder executors for every number of remaining sentences are bound as well.
+        """
+        num_rows = [n * self.beam_size for n in range(1, self.batch_size + 1)] if self.beam_compact \
+            else [self.batch_size * self.beam_size]
+        for bucket_key in self.buckets:
+            tic = time.time()
+            if self.ensemble is None:
+                memory = sum(m.bind_bucket(bucket_key, num_rows) for m in self.models)
+            else:
+                # decoder steps only use the executors of the fused ensemble
+                memory = sum(m.bind_bucket(bucket_key, []) for m in self.models) + \
+                         self.ensemble.bind_bucket(bucket_key, num_rows)
+            bind_time = time.time() - tic
+            tic = time.time()
+            self.translate_nd(*self._get_inference_input([[C.UNK_SYMBOL] * bucket_key] * self.batch_size))
+            logger.info("Warm-up bucket %d: bind %.3fs (%d MB), dummy batch %.3fs",
+                        bucket_key, bind_time, memory, time.time() - tic)
+
     @staticmethod
     def make_input(sentence_id: int, sentence: str) -> TranslatorInput:
         """
@@ -475,98 +1123,342 @@ class Translator:
         tokens = list(data_io.get_tokens(sentence))
         return TranslatorInput(id=sentence_id, sentence=sentence.rstrip(), tokens=tokens)
 
-    def translate(self, trans_input: TranslatorInput) -> TranslatorOutput:
+    def translate(self, trans_input: TranslatorInput, deadline: Optional[float] = None) -> TranslatorOutput:
         """
         Translates a TranslatorInput and returns a TranslatorOutput
 
         :param trans_input: TranslatorInput as returned by make_input().
+        :param deadline: Optional time (as returned by time.time()) the translation should be done by.
         :return: translation result.
         """
-        if not trans_input.tokens:
-            return TranslatorOutput(id=trans_input.id,
-                                    translation="",
-                                    tokens=[""],
-                                    attention_matrix=np.asarray([[0]]),
-                                    score=-np.inf)
+        return self.translate_batch([trans_input], deadline)[0]
 
-        return self._make_result(trans_input, *self.translate_nd(*self._get_inference_input(trans_input.tokens)))
+    def translate_batch(self,
+                        trans_inputs: List[TranslatorInput],
+                        deadline: Optional[float] = None,
+                        stream: Optional[Callable[[TranslatorInput, List[str]], None]] = None) \
+            -> List[TranslatorOutput]:
+        """
+        Translates a list of TranslatorInputs and returns a list of TranslatorOutputs in the same order.
+        Inputs are decoded in batches of up to batch_size sentences that share a single encoder call
+        and a single decoder call per time step.
+        If a deadline is given, or the Translator has a time budget, the search of sentences that would miss it
+        degrades, see _beam_search().
+        If the Translator samples, the first sample of each input is returned, see sample_batch().
+
+        Given a stream callback, the tokens of each translation are passed to it while the search is still running,
+        as soon as they are stable: once all remaining hypotheses of the sentence agree on them, no later step can
+        change them. The callback is called with an input and its next stable tokens, in order, from the calling
+        thread. For each input, the tokens passed to it add up to the tokens of its translation.
+
+        :param trans_inputs: List of TranslatorInputs as returned by make_input().
+        :param deadline: Optional time (as returned by time.time()) all translations should be done by.
+                         Defaults to the time budget from now.
+        :param stream: Optional callback for the stable tokens of each translation. Not supported if the
+                       Translator samples.
+        :return: List of translation results.
+        """
+        return [trans_outputs[0] for trans_outputs in self.sample_batch(trans_inputs, deadline, stream)]
 
-    def _get_inference_input(self, tokens: List[str]) -> Tuple[mx.nd.NDArray, mx.nd.NDArray, Optional[int]]:
+    def sample_batch(self,
+                     trans_inputs: List[TranslatorInput],
+                     deadline: Optional[float] = None,
+                     stream: Optional[Callable[[TranslatorInput, List[str]], None]] = None) \
+            -> List[List[TranslatorOutput]]:
+        """
+        Translates a list of TranslatorInputs like translate_batch(), but returns all translations of each input:
+        beam_size samples if the Translator samples, or the single best translation otherwise.
+        The samples of a sentence are decoded in parallel from a single encoding of the sentence.
+
+        :param trans_inputs: List of TranslatorInputs as returned by make_input().
+        :param deadline: Optional time (as returned by time.time()) all translations should be done by.
+                         Defaults to the time budget from now.
+        :param stream: Optional callback for the stable tokens of each translation, see translate_batch().
+        :return: For each input, list of translation results.
+        """
+        utils.check_condition(stream is None or self.sample is None, "Sampled translations cannot be streamed")
+        if deadline is None and self.time_budget is not None:
+            deadline = time.time() + self.time_budget
+        num_samples = self.beam_size if self.sample is not None else 1
+        trans_outputs = [None] * len(trans_inputs)  # type: List[Optional[List[TranslatorOutput]]]
+        # empty inputs are not passed to the model
+        non_empty = [i for i, trans_input in enumerate(trans_inputs) if trans_input.tokens]
+        for i, trans_input in enumerate(trans_inputs):
+            if not trans_input.tokens:
+                trans_outputs[i] = [TranslatorOutput(id=trans_input.id,
+                                                     translation="",
+                                                     tokens=[""],
+                                                     attention_matrix=np.asarray([[0]]) if self.store_attention
+                                                     else None,
+                                                     score=-np.inf)] * num_samples
+
+        for batch_start in range(0, len(non_empty), self.batch_size):
+            batch_indices = non_empty[batch_start:batch_start + self.batch_size]
+            batch_inputs = [trans_inputs[i] for i in batch_indices]
+            tic = time.time()
+            batch_stream = None  # type: Optional[Callable[[int, List[int]], None]]
+            if stream is not None:
+                batch_stream = functools.partial(self._stream_tokens, stream, batch_inputs)
+            results = self.translate_nd(*self._get_inference_input([inp.tokens for inp in batch_inputs]),
+                                        deadline=deadline, stream=batch_stream)
+            batch_time = time.time() - tic
+            for j, (i, trans_input) in enumerate(zip(batch_indices, batch_inputs)):
+                trans_outputs[i] = [self._make_result(trans_input, *result, translation_time=batch_time)
+                                    for result in results[j * num_samples:(j + 1) * num_samples]]
+        return trans_outputs
+
+    def _stream_tokens(self,
+                       stream: Callable[[TranslatorInput, List[str]], None],
+                       trans_inputs: List[TranslatorInput],
+                       sentence: int,
+                       word_ids: List[int]):
         """
-        Returns NDArray of source ids (shape=(1, bucket_key)),
-        NDArray of sentence length (shape=(1,)), and corresponding bucket_key.
+        Passes stable word ids of a sentence of a batch to stream as tokens of its input.
+        """
+        stream(trans_inputs[sentence], [self.vocab_target_inv[word_id] for word_id in word_ids])
 
-        :param tokens: List of input tokens.
-        :return NDArray of source ids, NDArray of sentence length, and bucket key.
+    def translate_with_prefix(self,
+                              trans_input: TranslatorInput,
+                              prefix: List[str],
+                              cache: Optional[PrefixCache] = None,
+                              deadline: Optional[float] = None) -> TranslatorOutput:
+        """
+        Translates a TranslatorInput into a translation that starts with the given target prefix tokens, e.g. for
+        interactive translation, where a user-supplied prefix grows one token at a time. The prefix is forced through
+        the decoder, and beam search continues from the decoder state after the prefix.
+        Given a cache, the encoded source and the decoder states after the prefix are cached for the source and
+        prefix. A later call with the same source and a prefix that extends a cached prefix by k tokens only runs k
+        forced decoder steps before the search.
+        The score of the output is the length-normalized negative log probability of the prefix and its
+        continuation.
+
+        :param trans_input: TranslatorInput as returned by make_input(). Must not be empty.
+        :param prefix: Target prefix tokens.
+        :param cache: Optional cache of prefix states of the session.
+        :param deadline: Optional time (as returned by time.time()) the translation should be done by.
+                         Defaults to the time budget from now.
+        :return: Translation result.
+        """
+        utils.check_condition(self.sample is None, "Prefix-constrained decoding does not support sampling")
+        utils.check_condition(self.restrict_lexicon is None,
+                              "Prefix-constrained decoding does not support vocabulary restriction")
+        utils.check_condition(len(trans_input.tokens) > 0, "Prefix-constrained decoding requires a non-empty input")
+        if deadline is None and self.time_budget is not None:
+            deadline = time.time() + self.time_budget
+        tic = time.time()
+        cache = cache if cache is not None else PrefixCache(max_size=1)
+        source_key, prefix_key = tuple(trans_input.tokens), tuple(prefix)
+        prefix_ids = data_io.tokens2ids(prefix, self.vocab_target)
+        source, source_length, bucket_key, _ = self._get_inference_input([trans_input.tokens])
+
+        cached_length, state = cache.lookup(source_key, prefix_key)
+        if state is None:
+            first_row = mx.nd.zeros((1,), ctx=self.context)
+            state = PrefixState(model_states=[ms.select_rows(first_row)
+                                              for ms in self._encode(source, source_length, bucket_key)],
+                                neg_logprob=0.0,
+                                attention_matrix=np.zeros((0, self.models[0].encoder.get_encoded_seq_len(bucket_key)),
+                                                          dtype='float32') if self.store_attention else None)
+            cache.put(source_key, (), state)
+        if cached_length < len(prefix):
+            state = self._force_prefix(state, prefix_ids[cached_length:])
+            cache.put(source_key, prefix_key, state)
+
+        max_output_lengths, min_output_lengths = self._get_output_length_bounds(source_length.asnumpy())
+        prefix_lengths = np.full((self.batch_size,), len(prefix), dtype='int32')
+        # the continuation has at least one word
+        max_output_lengths = np.maximum(max_output_lengths, prefix_lengths + 1)
+        prefix_scores = np.full((self.batch_size,), state.neg_logprob / max(1, len(prefix)), dtype='float32')
+        # all rows of the batch continue from the state after the prefix
+        rows = mx.nd.zeros((self.batch_size * self.beam_size,), ctx=self.context)
+        model_states = [ms.select_rows(rows) for ms in state.model_states]
+        target_ids, attention_matrix, score, degradation = self._get_best_from_beam(
+            *self._beam_search(source, source_length, bucket_key, max_output_lengths, min_output_lengths,
+                               num_sentences=1, deadline=deadline, model_states=model_states,
+                               prefix_lengths=prefix_lengths, prefix_scores=prefix_scores))[0]
+        if attention_matrix is not None:
+            attention_matrix = np.concatenate((state.attention_matrix, attention_matrix), axis=0)
+
+        target_ids = prefix_ids + target_ids
+        trans_output = self._make_result(trans_input, target_ids, attention_matrix, score, degradation,
+                                         translation_time=time.time() - tic)
+        # keep the prefix tokens as given, even if they are not in the target vocabulary
+        tokens = list(prefix) + trans_output.tokens[len(prefix):]
+        translation = C.TOKEN_SEPARATOR.join(token for target_id, token in zip(target_ids, tokens)
+                                             if target_id not in self.stop_ids)
+        return trans_output._replace(translation=translation, tokens=tokens)
+
+    def _force_prefix(self, state: PrefixState, word_ids: List[int]) -> PrefixState:
+        """
+        Returns the state after forcing the given words through the decoder, starting from state.
+        Each word takes a single decoder step of a single row.
+
+        :param state: State to start from. It is not modified.
+        :param word_ids: Target word ids to force.
+        :return: State after the words.
+        """
+        first_row = mx.nd.zeros((1,), ctx=self.context)
+        model_states = [ms.select_rows(first_row) for ms in state.model_states]
+        word_neg_logprobs = []  # type: List[mx.nd.NDArray]
+        attention_scores_history = []  # type: List[mx.nd.NDArray]
+        for word_id in word_ids:
+            # scores: (1, target_vocab_size)
+            scores, attention_scores, model_states = self._decode_step(model_states)
+            word = mx.nd.full((1,), val=word_id, ctx=self.context)
+            word_neg_logprobs.append(mx.nd.pick(scores, word, axis=1))
+            if self.store_attention:
+                # attention_scores is an output buffer of the decoder and gets overwritten in the next step
+                attention_scores_history.append(attention_scores.copy())
+            for ms in model_states:
+                ms.advance(word)
+
+        neg_logprob = state.neg_logprob + float(mx.nd.add_n(*word_neg_logprobs).asscalar())
+        attention_matrix = None
+        if self.store_attention:
+            attention_matrix = np.concatenate([state.attention_matrix] +
+                                              [a.asnumpy() for a in attention_scores_history], axis=0)
+        return PrefixState(model_states=[ms.select_rows(first_row) for ms in model_states],
+                           neg_logprob=neg_logprob,
+                           attention_matrix=attention_matrix)
+
+    def _get_inference_input(self,
+                             tokens_list: List[List[str]]) -> Tuple[mx.nd.NDArray, mx.nd.NDArray, int, int]:
         """
-        bucket_key = data_io.get_bucket(len(tokens), self.buckets)
+        Returns NDArray of source ids (shape=(batch_size, bucket_key)),
+        NDArray of sentence lengths (shape=(batch_size,)), the corresponding bucket_key, and the number of
+        actual sentences in the batch.
+        If fewer than batch_size sentences are given, the remaining rows are filled with copies of the first
+        sentence. Their results are discarded.
+
+        :param tokens_list: List of token lists, one per sentence. At most batch_size.
+        :return NDArray of source ids, NDArray of sentence lengths, bucket key, and number of sentences.
+        """
+        utils.check_condition(0 < len(tokens_list) <= self.batch_size,
+                              "Number of sentences must be between 1 and batch size (%d)" % self.batch_size)
+        bucket_key = data_io.get_bucket(max(len(tokens) for tokens in tokens_list), self.buckets)
         if bucket_key is None:
-            logger.warning("Input (%d) exceeds max bucket size (%d). Stripping", len(tokens), self.buckets[-1])
+            logger.warning("Input (%d) exceeds max bucket size (%d). Stripping",
+                           max(len(tokens) for tokens in tokens_list), self.buckets[-1])
             bucket_key = self.buckets[-1]
-            tokens = tokens[:bucket_key]
+            tokens_list = [tokens[:bucket_key] for tokens in tokens_list]
 
-        source = mx.nd.zeros((1, bucket_key))
-        ids = data_io.tokens2ids(tokens, self.vocab_source)
-        for i, wid in enumerate(ids):
-            source[0, i] = wid
-        length = mx.nd.array([len(ids)])
-        return source, length, bucket_key
+        source = np.zeros((self.batch_size, bucket_key), dtype='float32')
+        length = np.zeros((self.batch_size,), dtype='float32')
+        for j in range(self.batch_size):
+            tokens = tokens_list[j] if j < len(tokens_list) else tokens_list[0]
+            ids = data_io.tokens2ids(tokens, self.vocab_source)
+            source[j, :len(ids)] = ids
+            length[j] = len(ids)
+        return mx.nd.array(source), mx.nd.array(length), bucket_key, len(tokens_list)
 
     def _make_result(self,
                      trans_input: TranslatorInput,
                      target_ids: List[int],
-                     attention_matrix: np.ndarray,
-                     neg_logprob: float) -> TranslatorOutput:
+                     attention_matrix: Optional[np.ndarray],
+                     neg_logprob: float,
+                     degradation: str = C.DEGRADATION_NONE,
+                     translation_time: float = 0.0) -> TranslatorOutput:
         """
         Returns a translator result from generated target-side word ids, attention matrix, and score.
         Strips stop ids from translation string.
 
         :param trans_input: Translator input.
         :param target_ids: List of translated ids.
-        :param attention_matrix: Attention matrix.
+        :param attention_matrix: Attention matrix or None.
+        :param neg_logprob: Length-normalized negative log probability.
+        :param degradation: Search degradation applied to the sentence.
+        :param translation_time: Time spent translating the batch of the sentence.
         :return: TranslatorOutput.
         """
         target_tokens = [self.vocab_target_inv[target_id] for target_id in target_ids]
         target_string = C.TOKEN_SEPARATOR.join(
             target_token for target_id, target_token in zip(target_ids, target_tokens) if
             target_id not in self.stop_ids)
-        attention_matrix = attention_matrix[:, :len(trans_input.tokens)]
+        if attention_matrix is not None:
+            attention_matrix = attention_matrix[:, :len(trans_input.tokens)]
 
         return TranslatorOutput(id=trans_input.id,
                                 translation=target_string,
                                 tokens=target_tokens,
                                 attention_matrix=attention_matrix,
-                                score=neg_logprob)
+                                score=neg_logprob,
+                                degradation=degradation,
+                                time=translation_time)
 
     def translate_nd(self,
                      source: mx.nd.NDArray,
                      source_length: mx.nd.NDArray,
-                     bucket_key: int) -> Tuple[np.ndarray, np.ndarray, float]:
+                     bucket_key: int,
+                     num_sentences: int = 1,
+                     deadline: Optional[float] = None,
+                     stream: Optional[Callable[[int, List[int]], None]] = None) \
+            -> List[Tuple[List[int], Optional[np.ndarray], float, str]]:
         """
-        Translates source of source_length, given a bucket_key.
+        Translates a batch of sources of source_length, given a bucket_key.
+        With a beam size of 1, or if the Translator samples, the batch is translated by greedy search
+        (see _greedy_search()).
 
-        :param source: Source ids. Shape: (1, bucket_key).
-        :param source_length: Source length. Shape: (1,).
+        :param source: Source ids. Shape: (batch_size, bucket_key).
+        :param source_length: Source lengths. Shape: (batch_size,).
         :param bucket_key: Bucket key.
-
-        :return: Sequence of translated ids, attention matrix, length-normalized negative log probability.
+        :param num_sentences: Number of actual sentences in the batch. Remaining rows are ignored.
+        :param deadline: Optional time (as returned by time.time()) the search should be done by.
+        :param stream: Optional callback for stable word ids, called with the index of a sentence in the batch and
+                       its next stable word ids, without stop ids. Not supported if the Translator samples.
+
+        :return: For each sentence (for each sample of each sentence, if the Translator samples): sequence of
+                 translated ids, attention matrix (None if attention is not stored), length-normalized negative log
+                 probability, and search degradation.
         """
-        # allow output sentence to be at most 2 times the current bucket_key
-        # TODO: max_output_length adaptive to source_length
-        max_output_length = bucket_key * 2
+        max_output_lengths, min_output_lengths = self._get_output_length_bounds(source_length.asnumpy())
+
+        target_ids = None
+        if self.restrict_lexicon is not None:
+            # shortlist of target words for all sentences in the batch
+            target_ids_np = self.restrict_lexicon.get_trg_ids(source.asnumpy())
+            utils.check_condition(self.beam_size < len(target_ids_np),
+                                  "The beam size must be smaller than the restricted target vocabulary size.")
+            target_ids = mx.nd.array(target_ids_np, dtype='int32', ctx=self.context)
+            for m in self.models:
+                m.restrict_output_vocab(target_ids)
+
+        if self.beam_size == 1 or self.sample is not None:
+            return self._greedy_search(source, source_length, bucket_key, max_output_lengths, min_output_lengths,
+                                       target_ids, num_sentences, deadline, stream)
+        return self._get_best_from_beam(*self._beam_search(source, source_length, bucket_key, max_output_lengths,
+                                                           min_output_lengths, target_ids, num_sentences, deadline,
+                                                           stream=stream))
+
+    def _get_output_length_bounds(self, source_length: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """
+        Returns maximum and minimum output lengths for each sentence, derived from the target/source length ratio
+        statistics of the training data: the output of a sentence of length n is at most
+        ceil((mean + max_output_length_num_stds * std) * n) and at least floor((mean - min_output_length_num_stds
+        * std) * n) words long, including the end-of-sentence symbol. For ensembles, the widest bounds are used.
 
-        return self._get_best_from_beam(*self._beam_search(source, source_length, bucket_key, max_output_length))
+        :param source_length: Source lengths. Shape: (batch_size,).
+        :return: Maximum output lengths, minimum output lengths or None if not constrained. Shapes: (batch_size,).
+        """
+        max_factor = max(m.config.length_ratio_mean + self.max_output_length_num_stds * m.config.length_ratio_std
+                         for m in self.models)
+        max_output_lengths = np.maximum(1, np.ceil(max_factor * source_length)).astype('int32')
+        if self.min_output_length_num_stds is None:
+            return max_output_lengths, None
+        min_factor = min(m.config.length_ratio_mean - self.min_output_length_num_stds * m.config.length_ratio_std
+                         for m in self.models)
+        min_output_lengths = np.floor(max(0.0, min_factor) * source_length).astype('int32')
+        return max_output_lengths, np.minimum(min_output_lengths, max_output_lengths)
 
     def _encode(self, source: mx.nd.NDArray, source_length: mx.nd.NDArray, bucket_key: int) -> List[ModelState]:
         """
         Returns a ModelState for each model representing the state of the model after encoding the source.
 
-        :param source: Source ids. Shape: (1, bucket_key).
-        :param source_length: Source length. Shape: (1,).
+        :param source: Source ids. Shape: (batch_size, bucket_key).
+        :param source_length: Source lengths. Shape: (batch_size,).
         :param bucket_key: Bucket key.
         :return: List of ModelStates.
         """
-        prev_target_word_id = mx.nd.full((self.beam_size,), val=self.start_id, ctx=self.context)
+        prev_target_word_id = mx.nd.full((self.batch_size * self.beam_size,), val=self.start_id, ctx=self.context)
         model_states = [ModelState(bucket_key,
                                    prev_target_word_id,
                                    *m.run_encoder(source, source_length, bucket_key))
@@ -580,16 +1472,16 @@ class Translator:
         :param: List of model states.
         :return: (probs, attention scores, list of model states)
         """
+        if self.ensemble is not None:
+            if states[0].executor is None:
+                self.ensemble.bind_decoder_states(states)
+            neg_logprobs, attention_scores = self.ensemble.forward_decoder(states)
+            return neg_logprobs, attention_scores, states
         model_probs, model_attention_scores = [], []
         for m, s in zip(self.models, states):
-            probs, attention_scores, s.source_dynamic, s.decoder_hidden, s.decoder_states = m.run_decoder(
-                s.source_encoded,
-                s.source_dynamic,
-                s.source_length,
-                s.prev_target_word_id,
-                s.decoder_hidden,
-                s.decoder_states,
-                s.bucket_key)
+            if s.executor is None:
+                m.bind_decoder_state(s)
+            probs, attention_scores, s.source_dynamic, s.decoder_hidden, s.decoder_states = m.forward_decoder(s)
             model_probs.append(probs)
             model_attention_scores.append(attention_scores)
         probs, attention_scores = self._combine_predictions(model_probs, model_attention_scores)
@@ -601,8 +1493,8 @@ class Translator:
         """
         Returns combined predictions of models as negative log probabilities and averaged attention prob scores.
 
-        :param probs: List of Shape(beam_size, target_vocab_size).
-        :param attention_probs: List of Shape(beam_size, bucket_key).
+        :param probs: List of Shape(batch_size * beam_size, target_vocab_size).
+        :param attention_probs: List of Shape(batch_size * beam_size, bucket_key).
         :return: Combined probabilities, averaged attention scores.
         """
         # average attention prob scores. TODO: is there a smarter way to do this?
@@ -615,115 +1507,650 @@ class Translator:
             neg_logprobs = self.interpolation_func(probs)
         return neg_logprobs, attention_prob_score
 
+    def _top_k(self, scores: np.ndarray, t: int, beam_size: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Returns the beam_size best (smallest) scores for each sentence in the batch, together with
+        the (global) row indices of the hypotheses they extend and their word ids.
+
+        :param scores: Scores. Shape: (num_sentences * beam_size, target_vocab_size).
+        :param t: Time step. At t == 0 only the first hypothesis of each sentence is considered.
+        :param beam_size: Number of rows of each sentence.
+        :return: Best hypothesis indices, best word indices, accumulated scores.
+                 Shapes: (num_sentences * beam_size,).
+        """
+        num_sentences = scores.shape[0] // beam_size
+        vocab_size = scores.shape[1]
+        folded = scores.reshape((num_sentences, beam_size, vocab_size))
+        if t == 0:  # only one hypothesis per sentence at t==0
+            folded = folded[:, :1, :]
+        folded = folded.reshape((num_sentences, -1))
+        rows = np.arange(num_sentences)[:, None]
+        # indices of the beam_size smallest elements in each row, sorted ascending
+        args = np.argpartition(folded, beam_size - 1, axis=1)[:, :beam_size]
+        args = args[rows, np.argsort(folded[rows, args], axis=1)]
+        values = folded[rows, args]
+        best_hyp_indices, best_word_indices = np.unravel_index(args, (folded.shape[1] // vocab_size, vocab_size))
+        best_hyp_indices += rows * beam_size
+        return best_hyp_indices.reshape((-1,)), best_word_indices.reshape((-1,)), values.reshape((-1,))
+
+    def _top_k_mx(self, scores: mx.nd.NDArray, t: int, beam_size: int) \
+            -> Tuple[mx.nd.NDArray, mx.nd.NDArray, mx.nd.NDArray]:
+        """
+        Same as _top_k but computed with mx.nd.topk on the context of scores, avoiding a copy of scores to the host.
+
+        :param scores: Scores. Shape: (num_sentences * beam_size, target_vocab_size).
+        :param t: Time step. At t == 0 only the first hypothesis of each sentence is considered.
+        :param beam_size: Number of rows of each sentence.
+        :return: Best hypothesis indices, best word indices (int32), accumulated scores.
+                 Shapes: (num_sentences * beam_size,).
+        """
+        num_sentences = scores.shape[0] // beam_size
+        vocab_size = scores.shape[1]
+        folded = scores.reshape((num_sentences, beam_size * vocab_size))
+        if t == 0:  # only one hypothesis per sentence at t==0
+            folded = mx.nd.slice_axis(folded, axis=1, begin=0, end=vocab_size)
+        values, indices = mx.nd.topk(folded, axis=1, k=beam_size, ret_typ='both', is_ascend=True)
+        best_hyp_indices, best_word_indices = utils.unravel_index_mx(indices, vocab_size)
+        hyp_offsets = self.hyp_offsets[0:num_sentences] if beam_size == self.beam_size \
+            else mx.nd.array(np.arange(num_sentences)[:, None] * beam_size, ctx=self.context)
+        best_hyp_indices = mx.nd.broadcast_add(best_hyp_indices, hyp_offsets)
+        return best_hyp_indices.reshape((-1,)), best_word_indices.reshape((-1,)), values.reshape((-1,))
+
+    def _prune(self, scores: np.ndarray, finished: np.ndarray, beam_size: int) -> np.ndarray:
+        """
+        Returns a mask of open hypotheses whose score is worse than the best score of their sentence by more than
+        the absolute pruning threshold, or whose probability is smaller than the relative pruning threshold times
+        the probability of the best hypothesis of their sentence.
+
+        :param scores: Accumulated scores of all rows. Shape: (num_sentences * beam_size,).
+        :param finished: Mask of finished rows. Shape: (num_sentences * beam_size,).
+        :param beam_size: Number of rows of each sentence.
+        :return: Mask of pruned rows. Shape: (num_sentences * beam_size,).
+        """
+        best = np.repeat(scores.reshape((-1, beam_size)).min(axis=1), beam_size)
+        pruned = np.zeros(scores.shape, dtype=bool)
+        if self.beam_prune_absolute is not None:
+            pruned |= scores > best + self.beam_prune_absolute
+        if self.beam_prune_relative is not None:
+            pruned |= scores > best - np.log(self.beam_prune_relative)
+        return pruned & ~finished
+
+    def _get_finished_sentences(self,
+                                scores: np.ndarray,
+                                lengths: np.ndarray,
+                                finished: np.ndarray,
+                                max_output_lengths: np.ndarray,
+                                beam_size: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Determines the sentences whose best translation is known.
+        The score of an open hypothesis is an average of non-negative word scores. Extending it to at most
+        max_output_length words can lower its score to no less than score * length / max_output_length, where
+        max_output_length is the maximum output length of its sentence.
+        A sentence is done once none of its open hypotheses can reach the score of its best finished hypothesis.
+
+        :param scores: Accumulated scores of all rows. Shape: (num_sentences * beam_size,).
+        :param lengths: Hypothesis lengths. Shape: (num_sentences * beam_size,).
+        :param finished: Mask of finished rows. Shape: (num_sentences * beam_size,).
+        :param max_output_lengths: Maximum output lengths of the sentences of all rows.
+                                   Shape: (num_sentences * beam_size,).
+        :param beam_size: Number of rows of each sentence.
+        :return: Mask of done sentences and, for each sentence, the beam position of its best finished hypothesis.
+                 Shapes: (num_sentences,).
+        """
+        bound = np.where(finished, np.inf, scores * lengths / max_output_lengths).reshape((-1, beam_size))
+        finished_scores = np.where(finished, scores, np.inf).reshape((-1, beam_size))
+        return finished_scores.min(axis=1) <= bound.min(axis=1), finished_scores.argmin(axis=1)
+
+    def _penalize_eos(self, scores: mx.nd.NDArray, too_short: np.ndarray, eos_position: int):
+        """
+        Sets the scores of the end-of-sentence symbol to infinity for rows that are shorter than their minimum
+        output length.
+
+        :param scores: Scores. Shape: (num_rows, target_vocab_size).
+        :param too_short: Mask of rows that must not end yet. Shape: (num_rows,).
+        :param eos_position: Position of the end-of-sentence symbol in the decoder output.
+        """
+        if too_short.any():
+            penalty = mx.nd.array(np.where(too_short, np.inf, 0.0)[:, None], ctx=self.context)
+            scores[:, eos_position] = mx.nd.slice_axis(scores, axis=1, begin=eos_position,
+                                                       end=eos_position + 1) + penalty
+
     def _beam_search(self,
                      source: mx.nd.NDArray,
                      source_length: mx.nd.NDArray,
                      bucket_key: int,
-                     max_output_length: int) -> Tuple[mx.nd.NDArray, mx.nd.NDArray, mx.nd.NDArray, mx.nd.NDArray]:
+                     max_output_lengths: np.ndarray,
+                     min_output_lengths: Optional[np.ndarray] = None,
+                     target_ids: Optional[mx.nd.NDArray] = None,
+                     num_sentences: int = 1,
+                     deadline: Optional[float] = None,
+                     model_states: Optional[List[ModelState]] = None,
+                     prefix_lengths: Optional[np.ndarray] = None,
+                     prefix_scores: Optional[np.ndarray] = None,
+                     stream: Optional[Callable[[int, List[int]], None]] = None) \
+            -> Tuple[List[np.ndarray], List[np.ndarray], List[mx.nd.NDArray], List[Tuple[int, int, int, float]],
+                     List[str]]:
         """
-        Translates a single sentence using beam search.
-
-        :param source: Source ids. Shape: (1, bucket_key).
-        :param source_length: Source length. Shape: (1,).
+        Translates a batch of sentences using beam search.
+        Instead of reordering the full history of all hypotheses at every step, only backpointers, word ids and
+        attention scores of each step are stored. Hypotheses are reconstructed in _get_best_from_beam.
+        Attention scores are only stored if self.store_attention is True.
+
+        The search for a sentence ends as soon as its best finished hypothesis provably cannot be beaten by any of
+        its open hypotheses (see _get_finished_sentences). Open hypotheses may additionally be pruned by
+        score thresholds. If self.beam_compact is True, the rows of sentences that are done are removed from the
+        model states, so that later steps only decode the remaining sentences.
+
+        Given a deadline, the time of the remaining steps is projected from the average time of the steps so far.
+        If the open sentences would miss the deadline at their maximum output length, the search continues greedily:
+        the model states are compacted to the best open hypothesis of each open sentence, and the best finished
+        hypothesis of its beam is kept on the host as its result unless a better one is found. If even the next step
+        would miss the deadline, the search stops and the best hypothesis of each open sentence, finished or not, is
+        its result.
+
+        Given model states, the search continues from them instead of encoding the source, e.g. after forcing a
+        target prefix (see translate_with_prefix()). The prefix counts towards the output length bounds and the
+        length-normalized scores of hypotheses, but is not part of the returned word ids and attention scores.
+
+        Given a stream callback, the words of a sentence are streamed after each step once they are stable: the
+        backpointers of all hypotheses of the sentence that are not pruned lead to a single hypothesis of the step
+        of the word (see _get_stable_words()). Once a sentence is done, the remaining words of its result are
+        streamed.
+
+        :param source: Source ids. Shape: (batch_size, bucket_key).
+        :param source_length: Source lengths. Shape: (batch_size,).
         :param bucket_key: Bucket key.
-        :param max_output_length: Cap the output at this maximum length.
-        :return List of lists of word ids, list of attentions, array of accumulated length-normalized
-                negative log-probs.
+        :param max_output_lengths: Maximum output length of each sentence. Shape: (batch_size,).
+        :param min_output_lengths: Optional minimum output length of each sentence. The end-of-sentence symbol is not
+                                   predicted before. Shape: (batch_size,).
+        :param target_ids: Optional restricted target vocabulary. Decoder outputs are over these ids.
+                           Shape: (num_target_ids,).
+        :param num_sentences: Number of actual sentences in the batch. Remaining rows are not searched.
+        :param deadline: Optional time (as returned by time.time()) the search should be done by.
+        :param model_states: Optional model states to continue from. All beam_size rows of a sentence must hold the
+                             same state.
+        :param prefix_lengths: Optional number of target words decoded into model_states for each sentence.
+                               Shape: (batch_size,).
+        :param prefix_scores: Length-normalized negative log-prob of these words, if prefix_lengths is given.
+                              Shape: (batch_size,).
+        :param stream: Optional callback for stable word ids, see translate_nd(). Words of the prefix are not
+                       streamed.
+        :return: For each step: backpointers into the rows of the previous step, word ids and attention scores of
+                 the rows of this step; for each sentence: step and row of its best hypothesis, hypothesis length
+                 (without prefix), and accumulated length-normalized negative log-prob, and the search degradation
+                 applied.
         """
         # Length of encoded sequence (may differ from initial input length)
         encoded_source_length = self.models[0].encoder.get_encoded_seq_len(bucket_key)
         utils.check_condition(all(encoded_source_length == m.encoder.get_encoded_seq_len(bucket_key) for m in self.models),
                               "Models must agree on encoded sequence length")
-
-        lengths = mx.nd.zeros((self.beam_size, 1), ctx=self.context)
-        finished = mx.nd.zeros((self.beam_size,), dtype='int32', ctx=self.context)
-        # sequences: (beam_size, output_length)
-        sequences = mx.nd.array(np.full((self.beam_size, max_output_length), C.PAD_ID), dtype='int32', ctx=self.context)
-        # attentions: (beam_size, output_length, encoded_source_length)
-        attentions = mx.nd.zeros((self.beam_size, max_output_length, encoded_source_length), ctx=self.context)
-
-        # best_hyp_indices: row indices of smallest scores (ascending).
-        best_hyp_indices = mx.nd.zeros((self.beam_size,), ctx=self.context)
-        # best_word_indices: column indices of smallest scores (ascending).
-        best_word_indices = mx.nd.zeros((self.beam_size,), ctx=self.context, dtype='int32')
+        batch_beam_size = self.batch_size * self.beam_size
+        if prefix_lengths is None:
+            prefix_lengths = np.zeros((self.batch_size,), dtype='int32')
+            prefix_scores = np.zeros((self.batch_size,), dtype='float32')
+        # number of steps to decode after the prefix
+        max_steps = max_output_lengths - prefix_lengths
+        min_steps = min_output_lengths - prefix_lengths if min_output_lengths is not None else None
+
+        # bookkeeping of the current rows is kept on the host. Shapes: (num_rows,)
+        lengths = np.repeat(prefix_lengths, self.beam_size).astype('float32')
+        finished = np.zeros((batch_beam_size,), dtype=bool)
         # scores_accumulated: chosen smallest scores in scores (ascending).
-        scores_accumulated = mx.nd.zeros((self.beam_size, 1), ctx=self.context)
-
-        # reset all padding distribution cells to np.inf
-        self.pad_dist[:] = np.inf
+        scores_accumulated = np.repeat(prefix_scores, self.beam_size).astype('float32')
+        # sentence index of each group of beam_size rows
+        active = np.arange(self.batch_size)
+        # rows of the previous step kept after compaction, to map backpointers of this step to stored rows
+        kept_rows = None  # type: Optional[np.ndarray]
+
+        # per-step history of the beam. Shapes: (num_rows,) and (num_rows, encoded_source_length).
+        best_hyp_indices_history = []  # type: List[np.ndarray]
+        best_word_indices_history = []  # type: List[np.ndarray]
+        attention_scores_history = []  # type: List[mx.nd.NDArray]
+        # for each sentence: (step, row, length, score) of its best hypothesis
+        results = [None] * num_sentences  # type: List[Optional[Tuple[int, int, int, float]]]
+        # padding rows of the batch are not searched
+        sentence_done = active >= num_sentences
+        degradations = [C.DEGRADATION_NONE] * num_sentences
+        greedy = False
+        # number of rows of each sentence: 1 once the search is greedy
+        beam_size = self.beam_size
+        # for each sentence: score of the best finished hypothesis that was dropped from the beam by the greedy search
+        fallback_scores = np.full((self.batch_size,), np.inf, dtype='float32')
+        # for each sentence: number of steps whose words have been streamed
+        streamed_steps = np.zeros((num_sentences,), dtype='int32')
+
+        if target_ids is None:
+            pad_dist = self.pad_dist
+            # reset all padding distribution cells to np.inf
+            pad_dist[:] = np.inf
+        else:
+            pad_dist = mx.nd.full((batch_beam_size, target_ids.shape[0]), val=np.inf, ctx=self.context)
+            target_ids_np = target_ids.asnumpy()
+        # position of the end-of-sentence symbol in the decoder output
+        eos_id = self.vocab_target[C.EOS_SYMBOL]
+        eos_position = eos_id if target_ids is None else int(np.searchsorted(target_ids_np, eos_id))
+        lengths_nd, scores_accumulated_nd, finished_nd, best_hyp_indices_nd, best_word_indices_nd = self.step_buffers
 
         # (0) encode source sentence
-        model_states = self._encode(source, source_length, bucket_key)
+        if model_states is None:
+            model_states = self._encode(source, source_length, bucket_key)
+        if self.beam_compact and num_sentences < self.batch_size:
+            active, sentence_done = active[:num_sentences], sentence_done[:num_sentences]
+            keep = np.arange(num_sentences * self.beam_size)
+            lengths, finished, scores_accumulated = lengths[keep], finished[keep], scores_accumulated[keep]
+            keep_nd = mx.nd.array(keep, ctx=self.context)
+            for ms in model_states:
+                ms.compact(keep_nd)
+            pad_dist, lengths_nd, scores_accumulated_nd, finished_nd, best_hyp_indices_nd, best_word_indices_nd = \
+                [array[0:len(keep)] for array in [pad_dist] + self.step_buffers]
 
-        for t in range(0, max_output_length):
+        search_start = time.time()
+        for t in range(0, int(max_steps[:num_sentences].max())):
 
             # (1) obtain next predictions and advance models' state
-            # scores: (beam_size, target_vocab_size)
-            # attention_scores: (beam_size, bucket_key)
+            # scores: (num_rows, target_vocab_size)
+            # attention_scores: (num_rows, bucket_key)
             scores, attention_scores, model_states = self._decode_step(model_states)
 
             # (2) compute length-normalized accumulated scores in place
-            if t == 0:  # only one hypothesis at t==0
-                scores = scores[:1]
-            else:
+            if t > 0 or prefix_lengths.any():
+                lengths_nd[:] = np.expand_dims(lengths, axis=1)
+                scores_accumulated_nd[:] = np.expand_dims(scores_accumulated, axis=1)
+                finished_nd[:] = finished
                 # renormalize scores by length+1 ...
-                scores = (scores + scores_accumulated * lengths) / (lengths + 1)
+                scores = (scores + scores_accumulated_nd * lengths_nd) / (lengths_nd + 1)
                 # ... but not for finished hyps.
                 # their predicted distribution is set to their accumulated scores at C.PAD_ID.
-                self.pad_dist[:, C.PAD_ID] = scores_accumulated
+                # (C.PAD_ID is also the first id of a restricted target vocabulary)
+                pad_dist[:, C.PAD_ID] = scores_accumulated_nd
                 # this is equivalent to doing this in numpy:
-                #   self.pad_dist[finished, :] = np.inf
-                #   self.pad_dist[finished, C.PAD_ID] = scores_accumulated[finished]
-                scores = mx.nd.where(finished, self.pad_dist, scores)
-
-            # (3) get beam_size winning hypotheses
-            # TODO(fhieber): once mx.nd.topk is sped-up no numpy conversion necessary anymore.
-            (best_hyp_indices[:], best_word_indices_np), scores_accumulated_np = utils.smallest_k(scores.asnumpy(),
-                                                                                                  self.beam_size)
-            scores_accumulated[:] = np.expand_dims(scores_accumulated_np, axis=1)
-            best_word_indices[:] = best_word_indices_np
-
-            # (4) get hypotheses and their properties for beam_size winning hypotheses (ascending)
-            mx.nd.take(sequences, best_hyp_indices, out=sequences)
-            mx.nd.take(lengths, best_hyp_indices, out=lengths)
-            mx.nd.take(finished, best_hyp_indices, out=finished)
-            mx.nd.take(attention_scores, best_hyp_indices, out=attention_scores)
-            mx.nd.take(attentions, best_hyp_indices, out=attentions)
-
-            # (5) update best hypotheses, their attention lists and lengths (only for non-finished hyps)
-            sequences[:, t] = mx.nd.expand_dims(best_word_indices, axis=1)
-            attentions[:, t, :] = mx.nd.expand_dims(attention_scores, axis=1)
-            lengths += mx.nd.cast(1 - mx.nd.expand_dims(finished, axis=1), dtype='float32')
-
-            # (6) determine which hypotheses in the beam are now finished
-            finished = ((best_word_indices == C.PAD_ID) + (best_word_indices == self.vocab_target[C.EOS_SYMBOL]))
-            if mx.nd.sum(finished).asscalar() == self.beam_size:  # all finished
+                #   pad_dist[finished, :] = np.inf
+                #   pad_dist[finished, C.PAD_ID] = scores_accumulated[finished]
+                scores = mx.nd.where(finished_nd, pad_dist, scores)
+
+            # (2b) no end-of-sentence symbol for hypotheses shorter than the minimum output length
+            if min_output_lengths is not None:
+                self._penalize_eos(scores, np.repeat(min_steps[active], beam_size) > t + 1, eos_position)
+
+            # (3) get beam_size winning hypotheses for each sentence.
+            # Only the k-best indices and scores are copied to the host.
+            if self.top_k_engine == C.TOP_K_MXNET:
+                best_hyp_indices, best_word_indices, best_scores = self._top_k_mx(scores, t, beam_size)
+                if target_ids is not None:
+                    # map positions in the restricted vocabulary back to target ids
+                    best_word_indices = mx.nd.take(target_ids, best_word_indices)
+                best_hyp_indices_np = best_hyp_indices.asnumpy().astype('int32')
+                best_word_indices_np = best_word_indices.asnumpy().astype('int32')
+                scores_accumulated = best_scores.asnumpy()
+            else:
+                best_hyp_indices_np, best_word_indices_np, scores_accumulated = self._top_k(scores.asnumpy(), t,
+                                                                                            beam_size)
+                if target_ids is not None:
+                    best_word_indices_np = target_ids_np[best_word_indices_np].astype('int32')
+                best_hyp_indices_nd[:] = best_hyp_indices_np
+                best_word_indices_nd[:] = best_word_indices_np
+                best_hyp_indices, best_word_indices = best_hyp_indices_nd, best_word_indices_nd
+
+            # (4) store backpointers, words and attention scores of this step.
+            # attention_scores is an output buffer of the decoder and gets overwritten in the next step.
+            best_hyp_indices_history.append(best_hyp_indices_np if kept_rows is None
+                                            else kept_rows[best_hyp_indices_np])
+            best_word_indices_history.append(best_word_indices_np)
+            if self.store_attention:
+                attention_scores_history.append(mx.nd.take(attention_scores, best_hyp_indices))
+            kept_rows = None
+
+            # (5) update lengths of the winning hypotheses (only for non-finished hyps).
+            lengths = lengths[best_hyp_indices_np] + ~finished[best_hyp_indices_np]
+
+            # (6) determine which hypotheses in the beam are now finished, and prune open hypotheses
+            finished = (best_word_indices_np == C.PAD_ID) | (best_word_indices_np == eos_id)
+            if self.beam_prune_absolute is not None or self.beam_prune_relative is not None:
+                pruned = self._prune(scores_accumulated, finished, beam_size)
+                scores_accumulated[pruned] = np.inf
+                finished |= pruned
+
+            # (7) store the best hypotheses of sentences that are done
+            done, best_finished = self._get_finished_sentences(scores_accumulated, lengths, finished,
+                                                               np.repeat(max_output_lengths[active], beam_size),
+                                                               beam_size)
+            if greedy:
+                # the single open hypothesis of a sentence can no longer beat its best finished hypothesis of the beam
+                bound = np.where(finished, np.inf, scores_accumulated * lengths / max_output_lengths[active])
+                done |= fallback_scores[active] <= bound
+            # sentences at their maximum output length: the first hypothesis of each sentence is its best
+            at_max_length = (max_steps[active] <= t + 1) & ~done
+            best_finished[at_max_length] = 0
+            done |= at_max_length
+            for i in np.flatnonzero(done & ~sentence_done):
+                row = i * beam_size + best_finished[i]
+                if results[active[i]] is None or scores_accumulated[row] < fallback_scores[active[i]]:
+                    results[active[i]] = (t, row, int(lengths[row]) - int(prefix_lengths[active[i]]),
+                                          float(scores_accumulated[row]))
+            if stream is not None:
+                for i in np.flatnonzero(~sentence_done):
+                    if done[i]:
+                        # the result of a sentence that is done
+                        result = results[active[i]]
+                        assert result is not None
+                        self._stream_stable_words(stream, active[i], np.array([result[1]]), best_hyp_indices_history,
+                                                  best_word_indices_history, streamed_steps, last_step=result[0])
+                    elif np.isinf(fallback_scores[active[i]]):
+                        # all hypotheses of the sentence that are not pruned. The words of a greedy hypothesis are
+                        # not stable while a finished hypothesis of the beam may still be the result.
+                        rows = np.arange(i * beam_size, (i + 1) * beam_size)
+                        self._stream_stable_words(stream, active[i], rows[np.isfinite(scores_accumulated[rows])],
+                                                  best_hyp_indices_history, best_word_indices_history,
+                                                  streamed_steps)
+            sentence_done |= done
+            if sentence_done.all():
                 break
 
-            # (7) update models' state with winning hypotheses (ascending)
+            # (7b) degrade the search of open sentences that would miss the deadline
+            if deadline is not None:
+                now = time.time()
+                step_time = (now - search_start) / (t + 1)
+                if now + step_time > deadline:
+                    best_rows = scores_accumulated.reshape((-1, beam_size)).argmin(axis=1)
+                    for i in np.flatnonzero(~sentence_done):
+                        row = i * beam_size + best_rows[i]
+                        if results[active[i]] is None or scores_accumulated[row] < fallback_scores[active[i]]:
+                            results[active[i]] = (t, row, int(lengths[row]) - int(prefix_lengths[active[i]]),
+                                                  float(scores_accumulated[row]))
+                            degradations[active[i]] = C.DEGRADATION_TRUNCATED
+                        if stream is not None:
+                            result = results[active[i]]
+                            assert result is not None
+                            self._stream_stable_words(stream, active[i], np.array([result[1]]),
+                                                      best_hyp_indices_history, best_word_indices_history,
+                                                      streamed_steps, last_step=result[0])
+                    break
+                remaining_steps = max_steps[active[~sentence_done]].max() - t - 1
+                if not greedy and beam_size > 1 and now + step_time * remaining_steps > deadline:
+                    greedy = True
+                    for i in np.flatnonzero(~sentence_done):
+                        degradations[active[i]] = C.DEGRADATION_GREEDY
+
+            # (8) update models' state with winning hypotheses (ascending)
             for ms in model_states:
                 ms.sort_state(best_hyp_indices, best_word_indices)
 
-        return sequences, attentions, scores_accumulated, lengths
+            # (9) remove rows of sentences that are done. Once the search is greedy, only the best open hypothesis
+            # of each open sentence is decoded further, and the best finished hypothesis of its beam is kept on the
+            # host as its result so far.
+            if greedy and beam_size > 1:
+                keep = np.flatnonzero(~sentence_done)
+                open_scores = np.where(finished, np.inf, scores_accumulated).reshape((-1, beam_size))[keep]
+                finished_scores = np.where(finished, scores_accumulated, np.inf).reshape((-1, beam_size))[keep]
+                for j, position in enumerate(finished_scores.argmin(axis=1)):
+                    i = keep[j]
+                    row = i * beam_size + position
+                    if np.isfinite(finished_scores[j, position]):
+                        results[active[i]] = (t, row, int(lengths[row]) - int(prefix_lengths[active[i]]),
+                                              float(scores_accumulated[row]))
+                        fallback_scores[active[i]] = scores_accumulated[row]
+                kept_rows = keep * beam_size + open_scores.argmin(axis=1)
+                beam_size = 1
+            elif self.beam_compact and sentence_done.any():
+                keep = np.flatnonzero(~sentence_done)
+                kept_rows = (keep[:, None] * beam_size + np.arange(beam_size)).reshape((-1,))
+            if kept_rows is not None:
+                active, sentence_done = active[keep], sentence_done[keep]
+                lengths, finished = lengths[kept_rows], finished[kept_rows]
+                scores_accumulated = scores_accumulated[kept_rows]
+                kept_rows_nd = mx.nd.array(kept_rows, ctx=self.context)
+                for ms in model_states:
+                    ms.compact(kept_rows_nd)
+                pad_dist, lengths_nd, scores_accumulated_nd, finished_nd, best_hyp_indices_nd, best_word_indices_nd = \
+                    [array[0:len(kept_rows)] for array in [pad_dist] + self.step_buffers]
+
+        return best_hyp_indices_history, best_word_indices_history, attention_scores_history, results, degradations
+
+    def _stream_stable_words(self,
+                             stream: Callable[[int, List[int]], None],
+                             sentence: int,
+                             rows: np.ndarray,
+                             best_hyp_indices_history: List[np.ndarray],
+                             best_word_indices_history: List[np.ndarray],
+                             streamed_steps: np.ndarray,
+                             last_step: Optional[int] = None):
+        """
+        Passes the words of a sentence that became stable since its last streamed step to stream, without stop ids.
+
+        :param stream: Callback for stable word ids.
+        :param sentence: Index of the sentence in the batch.
+        :param rows: Rows of the last step that hold the remaining hypotheses of the sentence.
+        :param best_hyp_indices_history: Backpointers of each step into the rows of the previous step.
+        :param best_word_indices_history: Word ids of each step.
+        :param streamed_steps: For each sentence: number of steps whose words have been streamed. Updated in place.
+        :param last_step: Optional step of the rows, if earlier than the last step of the history.
+        """
+        if last_step is not None:
+            best_hyp_indices_history = best_hyp_indices_history[:last_step + 1]
+            best_word_indices_history = best_word_indices_history[:last_step + 1]
+        num_steps, word_ids = self._get_stable_words(best_hyp_indices_history, best_word_indices_history, rows,
+                                                     int(streamed_steps[sentence]))
+        streamed_steps[sentence] = num_steps
+        word_ids = [word_id for word_id in word_ids if word_id not in self.stop_ids]
+        if word_ids:
+            stream(int(sentence), word_ids)
+
+    @staticmethod
+    def _get_stable_words(best_hyp_indices_history: List[np.ndarray],
+                          best_word_indices_history: List[np.ndarray],
+                          rows: np.ndarray,
+                          first_step: int) -> Tuple[int, List[int]]:
+        """
+        Returns the words that the hypotheses of the given rows of the last step share from first_step on. The
+        hypotheses share all words up to the last step at which their backpointers lead to a single row. As every
+        later hypothesis extends one of them, these words are final.
+
+        :param best_hyp_indices_history: Backpointers of each step into the rows of the previous step.
+        :param best_word_indices_history: Word ids of each step.
+        :param rows: Rows of the last step.
+        :param first_step: First step to return words of.
+        :return: Number of steps the hypotheses share (at least first_step), and their word ids from first_step on.
+        """
+        t = len(best_hyp_indices_history) - 1
+        rows = np.unique(rows)
+        while t >= first_step and len(rows) > 1:
+            rows = np.unique(best_hyp_indices_history[t][rows])
+            t -= 1
+        if t < first_step or len(rows) == 0:
+            return first_step, []
+        row = rows[0]
+        word_ids = []  # type: List[int]
+        for step in range(t, first_step - 1, -1):
+            word_ids.append(int(best_word_indices_history[step][row]))
+            row = best_hyp_indices_history[step][row]
+        return t + 1, word_ids[::-1]
+
+    def _greedy_search(self,
+                       source: mx.nd.NDArray,
+                       source_length: mx.nd.NDArray,
+                       bucket_key: int,
+                       max_output_lengths: np.ndarray,
+                       min_output_lengths: Optional[np.ndarray] = None,
+                       target_ids: Optional[mx.nd.NDArray] = None,
+                       num_sentences: int = 1,
+                       deadline: Optional[float] = None,
+                       stream: Optional[Callable[[int, List[int]], None]] = None) \
+            -> List[Tuple[List[int], Optional[np.ndarray], float, str]]:
+        """
+        Translates a batch of sentences by greedy search, the special case of beam search with a beam size of 1,
+        or by sampling. Each row holds a single hypothesis that is extended by one word at every step, chosen on the
+        device by _select_words(), and the decoder states are passed on without reordering, padding distributions
+        for finished hypotheses or length normalization at every step. Only the chosen word ids and scores are copied
+        to the host. Rows of finished hypotheses keep being decoded unless self.beam_compact is True; their outputs
+        are ignored. If sampling, the beam_size rows of a sentence hold independent samples.
+
+        Given a deadline, the search stops once the next step would miss it, and the hypothesis of each open row
+        is its result.
+
+        Given a stream callback, the word of each open row is streamed after every step. Without sampling, each row
+        holds the single hypothesis of its sentence, so its words are final.
+
+        :param source: Source ids. Shape: (batch_size, bucket_key).
+        :param source_length: Source lengths. Shape: (batch_size,).
+        :param bucket_key: Bucket key.
+        :param max_output_lengths: Maximum output length of each sentence. Shape: (batch_size,).
+        :param min_output_lengths: Optional minimum output length of each sentence. Shape: (batch_size,).
+        :param target_ids: Optional restricted target vocabulary. Decoder outputs are over these ids.
+                           Shape: (num_target_ids,).
+        :param num_sentences: Number of actual sentences in the batch. Remaining rows are not searched.
+        :param deadline: Optional time (as returned by time.time()) the search should be done by.
+        :param stream: Optional callback for stable word ids, see translate_nd(). Not supported if sampling.
+        :return: For each row of the actual sentences: sequence of translated ids, attention matrix (None if
+                 attention is not stored), length-normalized negative log probability, and search degradation.
+        """
+        batch_beam_size = self.batch_size * self.beam_size
+        num_hyps = num_sentences * self.beam_size
+        max_output_lengths = np.repeat(max_output_lengths, self.beam_size)
+        if min_output_lengths is not None:
+            min_output_lengths = np.repeat(min_output_lengths, self.beam_size)
+        max_steps = int(max_output_lengths[:num_hyps].max())
+        # per-hypothesis bookkeeping on the host
+        word_ids = np.zeros((batch_beam_size, max_steps), dtype='int32')
+        lengths = np.zeros((batch_beam_size,), dtype='int32')
+        neg_logprobs = np.zeros((batch_beam_size,), dtype='float32')
+        # hypothesis index of each row
+        active = np.arange(batch_beam_size)
+        # rows of padding sentences of the batch are not searched
+        hyp_done = active >= num_hyps
+        degradations = [C.DEGRADATION_NONE] * num_hyps
+        # for each step: hypothesis indices of the rows and their attention scores
+        attention_scores_history = []  # type: List[Tuple[np.ndarray, mx.nd.NDArray]]
+
+        eos_id = self.vocab_target[C.EOS_SYMBOL]
+        eos_position = eos_id if target_ids is None else int(np.searchsorted(target_ids.asnumpy(), eos_id))
+
+        model_states = self._encode(source, source_length, bucket_key)
+        if self.beam_compact and num_sentences < self.batch_size:
+            active, hyp_done = active[:num_hyps], hyp_done[:num_hyps]
+            keep_nd = mx.nd.array(active, ctx=self.context)
+            for ms in model_states:
+                ms.compact(keep_nd)
+
+        search_start = time.time()
+        for t in range(max_steps):
+            # scores: (num_rows, target_vocab_size)
+            scores, attention_scores, model_states = self._decode_step(model_states)
+            if min_output_lengths is not None:
+                self._penalize_eos(scores, min_output_lengths[active] > t + 1, eos_position)
+
+            best_word_indices = self._select_words(scores)
+            best_scores = mx.nd.pick(scores, best_word_indices, axis=1).asnumpy()
+            if target_ids is not None:
+                # map positions in the restricted vocabulary back to target ids
+                best_word_indices = mx.nd.take(target_ids, best_word_indices)
+            best_word_indices_np = best_word_indices.asnumpy().astype('int32')
+
+            open_rows = np.flatnonzero(~hyp_done)
+            word_ids[active[open_rows], t] = best_word_indices_np[open_rows]
+            neg_logprobs[active[open_rows]] += best_scores[open_rows]
+            lengths[active[open_rows]] += 1
+            if self.store_attention:
+                # attention_scores is an output buffer of the decoder and gets overwritten in the next step
+                attention_scores_history.append((active, attention_scores.copy()))
+            if stream is not None:
+                for row in open_rows:
+                    word_id = int(best_word_indices_np[row])
+                    if word_id not in self.stop_ids:
+                        stream(int(active[row]), [word_id])
+
+            hyp_done |= (best_word_indices_np == eos_id) | (best_word_indices_np == C.PAD_ID) | \
+                        (max_output_lengths[active] <= t + 1)
+            if hyp_done.all():
+                break
+
+            if deadline is not None:
+                now = time.time()
+                if now + (now - search_start) / (t + 1) > deadline:
+                    for i in np.flatnonzero(~hyp_done):
+                        degradations[active[i]] = C.DEGRADATION_TRUNCATED
+                    break
+
+            for ms in model_states:
+                ms.advance(best_word_indices)
+
+            # remove rows of hypotheses that are done
+            if self.beam_compact and hyp_done.any():
+                keep = np.flatnonzero(~hyp_done)
+                active, hyp_done = active[keep], hyp_done[keep]
+                keep_nd = mx.nd.array(keep, ctx=self.context)
+                for ms in model_states:
+                    ms.compact(keep_nd)
+
+        attention_matrices = None
+        if self.store_attention:
+            attention_matrices = np.zeros((batch_beam_size, max_steps, attention_scores_history[0][1].shape[1]),
+                                          dtype='float32')
+            for t, (rows, step_attention_scores) in enumerate(attention_scores_history):
+                attention_matrices[rows, t] = step_attention_scores.asnumpy()
+
+        return [(word_ids[i, :lengths[i]].tolist(),
+                 attention_matrices[i, :lengths[i]] if attention_matrices is not None else None,
+                 float(neg_logprobs[i] / lengths[i]),
+                 degradations[i]) for i in range(num_hyps)]
+
+    def _select_words(self, scores: mx.nd.NDArray) -> mx.nd.NDArray:
+        """
+        Returns the position of the next word of each row in the decoder output: the best word, or, if the
+        Translator samples, a word sampled from the predicted distribution (restricted to the self.sample best words
+        if self.sample > 0). Samples are drawn on the device with the Gumbel-max trick: the best word after
+        perturbing log probabilities with Gumbel noise is distributed according to the probabilities.
+
+        :param scores: Negative log probabilities. Shape: (num_rows, target_vocab_size).
+        :return: Word positions. Shape: (num_rows,).
+        """
+        if self.sample is None:
+            return mx.nd.argmin(scores, axis=1)
+        if 0 < self.sample < scores.shape[1]:
+            values, indices = mx.nd.topk(scores, axis=1, k=self.sample, ret_typ='both', is_ascend=True)
+            return mx.nd.pick(indices, mx.nd.argmin(values - self._gumbel_noise(values.shape), axis=1), axis=1)
+        return mx.nd.argmin(scores - self._gumbel_noise(scores.shape), axis=1)
+
+    def _gumbel_noise(self, shape: Tuple[int, int]) -> mx.nd.NDArray:
+        """
+        Returns standard Gumbel noise of the given shape on the Translator's context.
+        """
+        return -mx.nd.log(-mx.nd.log(mx.nd.random_uniform(low=0, high=1, shape=shape, ctx=self.context)))
 
     @staticmethod
-    def _get_best_from_beam(sequences: mx.nd.NDArray,
-                            attention_lists: mx.nd.NDArray,
-                            accumulated_scores: mx.nd.NDArray,
-                            lengths: mx.nd.NDArray) -> Tuple[np.ndarray, np.ndarray, float]:
-        """
-        Return the best (aka top) entry from the n-best list.
-
-        :param sequences: Array of word ids. Shape: (beam_size, bucket_key).
-        :param attention_lists: Array of attentions over source words. Shape: (length, bucket_key).
-        :param accumulated_scores: Array of length-normalized negative log-probs.
-        :return: Top sequence, top attention matrix, top accumulated score (length-normalized negative log-probs).
-        """
-        # sequences & accumulated scores are in latest 'k-best order', thus 0th element is best
-        best = 0
-        length = int(lengths[best].asscalar())
-        sequence = sequences[best][:length].asnumpy().tolist()
-        # attention_matrix: (target_seq_len, source_seq_len)
-        attention_matrix = np.stack(attention_lists[best].asnumpy()[:length, :], axis=0)
-        score = accumulated_scores[best].asscalar()
-        return sequence, attention_matrix, score
+    def _get_best_from_beam(best_hyp_indices_history: List[np.ndarray],
+                            best_word_indices_history: List[np.ndarray],
+                            attention_scores_history: List[mx.nd.NDArray],
+                            results: List[Tuple[int, int, int, float]],
+                            degradations: List[str]) -> List[Tuple[List[int], Optional[np.ndarray], float, str]]:
+        """
+        Return the best (aka top) entry from the n-best list of each sentence.
+        Its word ids and attention rows are reconstructed by following the backpointers from the step its search
+        ended at.
+
+        :param best_hyp_indices_history: Backpointers of each step into the rows of the previous step.
+        :param best_word_indices_history: Word ids of each step.
+        :param attention_scores_history: Attention scores of each step. Shape: (num_rows, bucket_key) each.
+                                         If empty, no attention matrices are returned.
+        :param results: For each sentence: step and row of its best hypothesis, its length and accumulated score.
+        :param degradations: For each sentence: search degradation applied.
+        :return: For each sentence: top sequence, top attention matrix, top accumulated score
+                 (length-normalized negative log-probs), and search degradation.
+        """
+        store_attention = len(attention_scores_history) > 0
+        if store_attention:
+            attention_scores = [a.asnumpy() for a in attention_scores_history]
+
+        best = []
+        for (last_step, row, length, score), degradation in zip(results, degradations):
+            sequence = np.zeros((last_step + 1,), dtype='int32')
+            if store_attention:
+                attention_matrix = np.zeros((last_step + 1, attention_scores[0].shape[1]), dtype='float32')
+            for t in range(last_step, -1, -1):
+                sequence[t] = best_word_indices_history[t][row]
+                if store_attention:
+                    attention_matrix[t] = attention_scores[t][row]
+                row = best_hyp_indices_history[t][row]
+            # attention_matrix: (target_seq_len, source_seq_len)
+            best.append((sequence[:length].tolist(), attention_matrix[:length] if store_attention else None, score,
+                         degradation))
+        return best
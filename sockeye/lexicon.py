@@ -12,7 +12,7 @@
 # permissions and limitations under the License.
 
 import logging
-from typing import Dict
+from typing import Dict, Optional
 
 import mxnet as mx
 import numpy as np
@@ -158,3 +158,65 @@ class LexiconInitializer(mx.initializer.Initializer):
         logger.info("Initializing '%s' with lexicon.", sym_name)
         assert len(arr.shape) == 2, "Only 2d weight matrices supported."
         self.lexicon.copyto(arr)
+
+
+class TopKLexicon:
+    """
+    Lexicon component that stores the k most likely target words for each source word. Used during
+    inference to restrict the target vocabulary to a sentence-specific shortlist (vocabulary selection).
+    The shortlist of a sentence consists of the top-k translations of its source words, special symbols,
+    and the most frequent target words.
+
+    :param vocab_source: Source vocabulary.
+    :param vocab_target: Target vocabulary.
+    """
+
+    def __init__(self, vocab_source: Dict[str, int], vocab_target: Dict[str, int]) -> None:
+        self.vocab_source = vocab_source
+        self.vocab_target = vocab_target
+        # Shape: (vocab_source_size, k), padded with C.PAD_ID
+        self.lex = None  # type: Optional[np.ndarray]
+        # Target ids that are part of every shortlist
+        self.always_allow = np.array([self.vocab_target[symbol] for symbol in C.VOCAB_SYMBOLS], dtype='int32')
+
+    def create(self, path: str, k: int = 20, num_most_frequent: int = 0):
+        """
+        Creates the top-k lexicon from a translation table of format: src, trg, logprob
+        (see read_lexicon). Source and target words unknown to the vocabularies are discarded.
+
+        :param path: Path to lexicon file.
+        :param k: Number of target entries to keep per source word.
+        :param num_most_frequent: Number of most frequent target words to add to every shortlist.
+        """
+        check_condition(k > 0, "k must be >0")
+        entries = dict()  # type: Dict[int, Dict[int, float]]
+        n = 0
+        with smart_open(path) as fin:
+            for line in fin:
+                src, trg, logprob = line.rstrip('\n').split("\t")
+                src_id = self.vocab_source.get(src)
+                trg_id = self.vocab_target.get(trg)
+                if src_id is None or trg_id is None:
+                    continue
+                entries.setdefault(src_id, dict())[trg_id] = float(logprob)
+                n += 1
+        self.lex = np.full((len(self.vocab_source), k), C.PAD_ID, dtype='int32')
+        for src_id, trg_entries in entries.items():
+            top_k = sorted(trg_entries, key=trg_entries.__getitem__, reverse=True)[:k]
+            self.lex[src_id, :len(top_k)] = top_k
+        # target ids are sorted by frequency (after the special symbols)
+        num_most_frequent = min(num_most_frequent, len(self.vocab_target))
+        self.always_allow = np.union1d(self.always_allow, np.arange(num_most_frequent, dtype='int32'))
+        logger.info("Created top-%d lexicon from '%s' with %d entries for %d source words "
+                    "(%d target words always allowed)", k, path, n, len(entries), len(self.always_allow))
+
+    def get_trg_ids(self, src_ids: np.ndarray) -> np.ndarray:
+        """
+        Returns the sorted, unique target ids that are allowed for the given source ids.
+        C.PAD_ID is always the first id.
+
+        :param src_ids: Source ids of any shape.
+        :return: Target ids. Shape: (num_allowed_ids,).
+        """
+        assert self.lex is not None, "Lexicon has not been created"
+        return np.union1d(self.always_allow, self.lex[src_ids.astype('int32').ravel()].ravel()).astype('int32')
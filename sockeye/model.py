@@ -14,6 +14,7 @@
 import copy
 import logging
 import os
+from typing import Optional
 
 from sockeye import __version__
 from sockeye.config import Config
@@ -45,7 +46,14 @@ class ModelConfig(Config):
     :param config_loss: Loss configuration.
     :param lexical_bias: Use lexical biases.
     :param learn_lexical_bias: Learn lexical biases during training.
+    :param length_ratio_mean: Mean of the target/source length ratio of the training data.
+    :param length_ratio_std: Standard deviation of the target/source length ratio of the training data.
     """
+    default_values = {
+        "length_ratio_mean": C.TARGET_MAX_LENGTH_FACTOR,
+        "length_ratio_std": 0.0,
+    }
+
     def __init__(self,
                  config_data: data_io.DataConfig,
                  max_seq_len: int,
@@ -56,7 +64,9 @@ class ModelConfig(Config):
                  config_attention: attention.AttentionConfig,
                  config_loss: loss.LossConfig,
                  lexical_bias: bool = False,
-                 learn_lexical_bias: bool = False):
+                 learn_lexical_bias: bool = False,
+                 length_ratio_mean: float = C.TARGET_MAX_LENGTH_FACTOR,
+                 length_ratio_std: float = 0.0):
         super().__init__()
         self.config_data = config_data
         self.max_seq_len = max_seq_len
@@ -68,6 +78,15 @@ class ModelConfig(Config):
         self.config_loss = config_loss
         self.lexical_bias = lexical_bias
         self.learn_lexical_bias = learn_lexical_bias
+        self.length_ratio_mean = length_ratio_mean
+        self.length_ratio_std = length_ratio_std
+
+    def __setstate__(self, state):
+        """
+        Fills in default values for parameters missing in configurations of older models.
+        """
+        self.__dict__.update(self.default_values)
+        self.__dict__.update(state)
 
 
 class SockeyeModel:
@@ -83,7 +102,7 @@ class SockeyeModel:
         self.config = copy.deepcopy(config)
         self.config.freeze()
         logger.info("%s", self.config)
-        self.encoder = None
+        self.encoder = None  # type: Optional[encoder.Encoder]
         self.attention = None
         self.decoder = None
         self.rnn_cells = []
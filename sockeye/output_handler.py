@@ -12,8 +12,9 @@
 # permissions and limitations under the License.
 
 import sys
-from typing import Optional
+from typing import Dict, List, Optional
 
+import sockeye.constants as C
 import sockeye.data_io
 import sockeye.inference
 from sockeye.utils import plot_attention, print_attention_text, get_alignments
@@ -21,20 +22,24 @@ from sockeye.utils import plot_attention, print_attention_text, get_alignments
 
 def get_output_handler(output_type: str,
                        output_fname: Optional[str],
-                       sure_align_threshold: float) -> 'OutputHandler':
+                       sure_align_threshold: float,
+                       flush_every: int = 1) -> 'OutputHandler':
     """
 
     :param output_type: Type of output handler.
     :param output_fname: Output filename. If none sys.stdout is used.
     :param sure_align_threshold: Threshold to consider an alignment link as 'sure'.
+    :param flush_every: Number of translations after which stream handlers flush, 0 to only flush on flush().
     :raises: ValueError for unknown output_type.
     :return: Output handler.
     """
     output_stream = sys.stdout if output_fname is None else sockeye.data_io.smart_open(output_fname, mode='w')
     if output_type == "translation":
-        return StringOutputHandler(output_stream)
+        return StringOutputHandler(output_stream, flush_every)
+    elif output_type == "translation_stream":
+        return TokenStreamingOutputHandler(output_stream)
     elif output_type == "translation_with_alignments":
-        return StringWithAlignmentsOutputHandler(output_stream, sure_align_threshold)
+        return StringWithAlignmentsOutputHandler(output_stream, sure_align_threshold, flush_every)
     elif output_type == "align_plot":
         return AlignPlotHandler(plot_prefix="align" if output_fname is None else output_fname)
     elif output_type == "align_text":
@@ -56,24 +61,112 @@ class OutputHandler:
         """
         raise NotImplementedError()
 
+    def flush(self):
+        """
+        Flushes output that the handler buffered, if any.
+        """
+        pass
+
+    def reports_attention(self) -> bool:
+        """
+        Whether this handler uses the attention matrix of translator outputs. If not, the Translator
+        does not need to keep attention scores during search.
+
+        :return: True if the handler requires TranslatorOutput.attention_matrix.
+        """
+        return True
+
 
 class StringOutputHandler(OutputHandler):
     """
     Output handler to write translation to a stream
 
     :param stream: Stream to write translations to (e.g. sys.stdout).
+    :param flush_every: Number of translations after which the stream is flushed, 0 to only flush on flush().
     """
 
-    def __init__(self, stream):
+    def __init__(self, stream, flush_every: int = 1) -> None:
         self.stream = stream
+        self.flush_every = flush_every
+        self.num_unflushed = 0
 
     def handle(self, t_input: sockeye.inference.TranslatorInput, t_output: sockeye.inference.TranslatorOutput):
         """
         :param t_input: Translator input.
         :param t_output: Translator output.
         """
-        self.stream.write("%s\n" % t_output.translation)
+        self.write("%s\n" % t_output.translation)
+
+    def write(self, output: str):
+        """
+        Writes output for a single translation and flushes the stream according to flush_every.
+
+        :param output: Output string.
+        """
+        self.stream.write(output)
+        self.num_unflushed += 1
+        if self.flush_every > 0 and self.num_unflushed >= self.flush_every:
+            self.flush()
+
+    def flush(self):
         self.stream.flush()
+        self.num_unflushed = 0
+
+    def reports_attention(self) -> bool:
+        return False
+
+
+class TokenStreamingOutputHandler(StringOutputHandler):
+    """
+    Output handler to write translations to a stream while they are being translated. The stable tokens of a
+    translation are written and flushed as soon as they are passed to stream_tokens() (see
+    Translator.translate_batch()), the rest of the translation and the line break once it is handled.
+    Translations must be handled in the order of their input ids, starting from 1. Tokens of later inputs are held
+    back until all preceding translations are handled.
+
+    :param stream: Stream to write translations to (e.g. sys.stdout).
+    """
+
+    def __init__(self, stream) -> None:
+        super().__init__(stream, flush_every=1)
+        self.current_id = 1
+        # number of tokens of the current translation written so far
+        self.num_written = 0
+        # tokens of later inputs
+        self.held_back = {}  # type: Dict[int, List[str]]
+
+    def stream_tokens(self, t_input: sockeye.inference.TranslatorInput, tokens: List[str]):
+        """
+        Writes the next stable tokens of the translation of an input, or holds them back if the input is not the
+        current one.
+
+        :param t_input: Translator input.
+        :param tokens: Stable tokens.
+        """
+        if t_input.id != self.current_id:
+            self.held_back.setdefault(t_input.id, []).extend(tokens)
+            return
+        self._write_tokens(tokens)
+        self.stream.flush()
+
+    def handle(self, t_input: sockeye.inference.TranslatorInput, t_output: sockeye.inference.TranslatorOutput):
+        """
+        :param t_input: Translator input.
+        :param t_output: Translator output.
+        """
+        tokens = t_output.translation.split(C.TOKEN_SEPARATOR) if t_output.translation else []
+        self._write_tokens(tokens[self.num_written:])
+        self.write("\n")
+        self.current_id, self.num_written = t_input.id + 1, 0
+        held_back = self.held_back.pop(self.current_id, [])
+        if held_back:
+            self._write_tokens(held_back)
+            self.stream.flush()
+
+    def _write_tokens(self, tokens: List[str]):
+        if tokens:
+            self.stream.write(("" if self.num_written == 0 else C.TOKEN_SEPARATOR) + C.TOKEN_SEPARATOR.join(tokens))
+            self.num_written += len(tokens)
 
 
 class StringWithAlignmentsOutputHandler(StringOutputHandler):
@@ -86,10 +179,11 @@ class StringWithAlignmentsOutputHandler(StringOutputHandler):
 
     :param stream: Stream to write translations and alignments to.
     :param threshold: Threshold for including alignment links.
+    :param flush_every: Number of translations after which the stream is flushed, 0 to only flush on flush().
     """
 
-    def __init__(self, stream, threshold: float) -> None:
-        super().__init__(stream)
+    def __init__(self, stream, threshold: float, flush_every: int = 1) -> None:
+        super().__init__(stream, flush_every)
         self.threshold = threshold
 
     def handle(self, t_input: sockeye.inference.TranslatorInput, t_output: sockeye.inference.TranslatorOutput):
@@ -97,10 +191,13 @@ class StringWithAlignmentsOutputHandler(StringOutputHandler):
         :param t_input: Translator input.
         :param t_output: Translator output.
         """
+        assert t_output.attention_matrix is not None, "Translator did not store the attention matrix"
         alignments = " ".join(
             ["%d-%d" % (s, t) for s, t in get_alignments(t_output.attention_matrix, threshold=self.threshold)])
-        self.stream.write("%s\t%s\n" % (t_output.translation, alignments))
-        self.stream.flush()
+        self.write("%s\t%s\n" % (t_output.translation, alignments))
+
+    def reports_attention(self) -> bool:
+        return True
 
 
 class AlignPlotHandler(OutputHandler):
@@ -118,6 +215,7 @@ class AlignPlotHandler(OutputHandler):
         :param t_input: Translator input.
         :param t_output: Translator output.
         """
+        assert t_output.attention_matrix is not None, "Translator did not store the attention matrix"
         plot_attention(t_output.attention_matrix,
                        t_input.tokens,
                        t_output.tokens,
@@ -139,6 +237,7 @@ class AlignTextHandler(OutputHandler):
         :param t_input: Translator input.
         :param t_output: Translator output.
         """
+        assert t_output.attention_matrix is not None, "Translator did not store the attention matrix"
         print_attention_text(t_output.attention_matrix,
                              t_input.tokens,
                              t_output.tokens,
@@ -0,0 +1,95 @@
+# Copyright 2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You may not
+# use this file except in compliance with the License. A copy of the License
+# is located at
+#
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is distributed on
+# an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+"""
+Scoring CLI.
+"""
+import argparse
+import os
+import sys
+import time
+from contextlib import ExitStack
+
+import numpy as np
+
+import sockeye.arguments as arguments
+import sockeye.constants as C
+import sockeye.data_io
+import sockeye.model
+import sockeye.scoring
+import sockeye.translate
+import sockeye.vocab
+from sockeye.log import setup_main_logger, log_sockeye_version
+from sockeye.utils import check_condition
+
+logger = setup_main_logger(__name__, file_logging=False)
+
+
+def main():
+    params = argparse.ArgumentParser(description='Score CLI')
+    arguments.add_scoring_args(params)
+    arguments.add_device_args(params)
+    args = params.parse_args()
+
+    if args.output is not None:
+        global logger
+        logger = setup_main_logger(__name__, file_logging=True, path="%s.%s" % (args.output, C.LOG_NAME))
+
+    log_sockeye_version(logger)
+    logger.info("Command: %s", " ".join(sys.argv))
+    logger.info("Arguments: %s", args)
+
+    config = sockeye.model.SockeyeModel.load_config(os.path.join(args.model, C.CONFIG_NAME))
+    max_seq_len = config.max_seq_len if args.max_seq_len is None else args.max_seq_len
+    check_condition(max_seq_len <= config.max_seq_len,
+                    "Maximum sequence length %d exceeds the maximum sequence length of the model (%d)"
+                    % (max_seq_len, config.max_seq_len))
+
+    vocab_source = sockeye.vocab.vocab_from_json_or_pickle(os.path.join(args.model, C.VOCAB_SRC_NAME))
+    vocab_target = sockeye.vocab.vocab_from_json_or_pickle(os.path.join(args.model, C.VOCAB_TRG_NAME))
+    data_iter, num_sentences = sockeye.scoring.get_scoring_data_iter(args.source, args.target,
+                                                                     vocab_source, vocab_target,
+                                                                     args.batch_size, max_seq_len,
+                                                                     args.bucket_width, config.length_ratio_mean)
+
+    with ExitStack() as exit_stack:
+        context = sockeye.translate._setup_context(args, exit_stack)  # pylint: disable=protected-access
+        out = sys.stdout if args.output is None else exit_stack.enter_context(
+            sockeye.data_io.smart_open(args.output, 'w'))
+
+        tic = time.time()
+        if args.output_type == 'alignment':
+            aligning_model = sockeye.scoring.AligningModel(args.model, context, data_iter, args.checkpoint)
+            alignments = aligning_model.align(data_iter, num_sentences, args.sure_align_threshold)
+            num_unscored = alignments.count(None)
+            for alignment in alignments:
+                print(" ".join("%d-%d" % link for link in alignment or []), file=out)
+        else:
+            scoring_model = sockeye.scoring.ScoringModel(args.model, context, data_iter, args.checkpoint)
+            scores = scoring_model.score(data_iter, num_sentences, args.length_normalize)
+            num_unscored = int(np.isnan(scores).sum())
+            for score in scores:
+                print("%.6f" % score, file=out)
+        out.flush()
+        total_time = time.time() - tic
+
+    if num_unscored > 0:
+        logger.warning("%d sentence pairs are empty or exceed the maximum sequence length of %d and were not %s.",
+                       num_unscored, max_seq_len, "aligned" if args.output_type == 'alignment' else "scored")
+    if num_sentences > 0:
+        logger.info("Processed %d sentence pairs in %.4fs (%.2f sentences/sec)",
+                    num_sentences, total_time, num_sentences / total_time)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,228 @@
+# Copyright 2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You may not
+# use this file except in compliance with the License. A copy of the License
+# is located at
+#
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is distributed on
+# an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+"""
+Code for scoring and aligning sentence pairs by forced decoding
+"""
+import logging
+import os
+from typing import Dict, List, Optional, Tuple
+
+import mxnet as mx
+import numpy as np
+
+from . import constants as C
+from . import data_io
+from . import model
+from . import training
+from . import utils
+
+logger = logging.getLogger(__name__)
+
+
+class ScoringModel(training.TrainingModel):
+    """
+    ScoringModel computes the negative log probabilities of given target sentences (forced decoding) with the
+    bucketed training graph of a model. Only forward passes are run; no gradients are allocated.
+
+    :param model_folder: Folder to load model from.
+    :param context: MXNet context to bind the module to.
+    :param data_iter: Iterator over the sentence pairs to score. It determines buckets and batch size.
+    :param checkpoint: Checkpoint to load. If None, finds best parameters in model_folder.
+    """
+
+    def __init__(self,
+                 model_folder: str,
+                 context: mx.context.Context,
+                 data_iter: data_io.ParallelBucketSentenceIter,
+                 checkpoint: Optional[int] = None) -> None:
+        super().__init__(model.SockeyeModel.load_config(os.path.join(model_folder, C.CONFIG_NAME)),
+                         [context], data_iter, fused=False, bucketing=True, lr_scheduler=None)
+        self.model_version = utils.load_version(os.path.join(model_folder, C.VERSION_NAME))
+        logger.info("Model version: %s", self.model_version)
+        utils.check_version(self.model_version)
+
+        self.module.bind(data_shapes=data_iter.provide_data, label_shapes=data_iter.provide_label,
+                         for_training=False, grad_req="null")
+        self.load_params_from_file(os.path.join(model_folder,
+                                                C.PARAMS_NAME % checkpoint if checkpoint else C.PARAMS_BEST_NAME))
+        self.module.init_params(arg_params=self.params, allow_missing=False)
+
+    def score(self,
+              data_iter: data_io.ParallelBucketSentenceIter,
+              num_sentences: int,
+              length_normalize: bool = False) -> np.ndarray:
+        """
+        Returns the negative log probability of the target sentence of each sentence pair of data_iter: the sum
+        of the negative log probabilities of its words and the end-of-sentence symbol, given the source sentence and
+        the preceding target words. Log probabilities are picked from the softmax output on the device, so only
+        one score per sentence is copied to the host.
+
+        :param data_iter: Iterator over the sentence pairs, without shuffling. Fill-up rows must have index -1.
+        :param num_sentences: Number of sentence pairs the iterator was created from.
+        :param length_normalize: Whether to divide the score of each sentence by its number of words, including the
+                                 end-of-sentence symbol.
+        :return: Scores in the order of the input sentence pairs. NaN for pairs that are not in any batch, i.e.
+                 that do not fit into any bucket or have an empty line. Shape: (num_sentences,).
+        """
+        scores = np.full((num_sentences,), np.nan, dtype='float32')
+        data_iter.reset()
+        for batch in data_iter:
+            self.module.forward(batch, is_train=False)
+            # softmax output is the last output of all losses. Shape: (batch_size * target_seq_len, target_vocab_size)
+            probs = self.module.get_outputs()[-1]
+            labels = batch.label[0].as_in_context(probs.context)
+            flat_labels = labels.reshape((-1,))
+            mask = flat_labels != C.PAD_ID
+            # padding positions get probability 1, i.e. a score of 0
+            word_probs = mx.nd.where(mask, mx.nd.pick(probs, flat_labels, axis=1), mx.nd.ones_like(mask))
+            neg_logprobs = mx.nd.sum(-mx.nd.log(word_probs).reshape(labels.shape), axis=1)
+            if length_normalize:
+                neg_logprobs = neg_logprobs / mx.nd.sum(mask.reshape(labels.shape), axis=1)
+            rows = batch.index >= 0
+            scores[batch.index[rows]] = neg_logprobs.asnumpy()[rows]
+        return scores
+
+
+class AligningModel(model.SockeyeModel):
+    """
+    AligningModel computes the attention probabilities of given target sentences (forced decoding) with the
+    bucketed decoder of a model, and extracts word alignments from them. The output layer is not computed.
+
+    :param model_folder: Folder to load model from.
+    :param context: MXNet context to bind the module to.
+    :param data_iter: Iterator over the sentence pairs to align. It determines buckets and batch size.
+    :param checkpoint: Checkpoint to load. If None, finds best parameters in model_folder.
+    """
+
+    def __init__(self,
+                 model_folder: str,
+                 context: mx.context.Context,
+                 data_iter: data_io.ParallelBucketSentenceIter,
+                 checkpoint: Optional[int] = None) -> None:
+        super().__init__(model.SockeyeModel.load_config(os.path.join(model_folder, C.CONFIG_NAME)))
+        self.model_version = utils.load_version(os.path.join(model_folder, C.VERSION_NAME))
+        logger.info("Model version: %s", self.model_version)
+        utils.check_version(self.model_version)
+
+        self.context = context
+        self._build_model_components(self.config.max_seq_len, fused_encoder=False)
+        self.module = self._build_module(data_iter)
+        self.module.bind(data_shapes=data_iter.provide_data, for_training=False, grad_req="null")
+        self.load_params_from_file(os.path.join(model_folder,
+                                                C.PARAMS_NAME % checkpoint if checkpoint else C.PARAMS_BEST_NAME))
+        self.module.init_params(arg_params=self.params, allow_missing=False)
+
+    def _build_module(self, data_iter: data_io.ParallelBucketSentenceIter) -> mx.mod.BucketingModule:
+        """
+        Creates the bucketing module that outputs the attention probabilities of the decoder.
+        """
+        source = mx.sym.Variable(C.SOURCE_NAME)
+        source_length = mx.sym.Variable(C.SOURCE_LENGTH_NAME)
+        target = mx.sym.Variable(C.TARGET_NAME)
+        data_names = [x[0] for x in data_iter.provide_data]
+
+        def sym_gen(seq_lens):
+            """
+            Returns the attention probabilities symbol given source & target input lengths.
+            Also returns data and label names for the BucketingModule.
+            """
+            source_seq_len, target_seq_len = seq_lens
+
+            (source_encoded,
+             source_encoded_length,
+             source_encoded_seq_len) = self.encoder.encode(source, source_length, seq_len=source_seq_len)
+
+            attention_probs = self.decoder.decode_attention(source_encoded, source_encoded_seq_len,
+                                                            source_encoded_length, target, target_seq_len)
+
+            return mx.sym.Group([attention_probs]), data_names, []
+
+        return mx.mod.BucketingModule(sym_gen=sym_gen,
+                                      logger=logger,
+                                      default_bucket_key=data_iter.default_bucket_key,
+                                      context=self.context)
+
+    def align(self,
+              data_iter: data_io.ParallelBucketSentenceIter,
+              num_sentences: int,
+              threshold: float) -> List[Optional[List[Tuple[int, int]]]]:
+        """
+        Returns the word alignments of each sentence pair of data_iter. Target position t is aligned to the source
+        positions that receive an attention probability above the threshold when the decoder predicts the t-th
+        target word. The end-of-sentence symbol is not aligned.
+
+        :param data_iter: Iterator over the sentence pairs, without shuffling. Fill-up rows must have index -1.
+        :param num_sentences: Number of sentence pairs the iterator was created from.
+        :param threshold: Threshold for including alignment links.
+        :return: List of (source index, target index) links, in the order of the input sentence pairs. None for
+                 pairs that are not in any batch.
+        """
+        alignments = [None] * num_sentences  # type: List[Optional[List[Tuple[int, int]]]]
+        data_iter.reset()
+        for batch in data_iter:
+            # labels are not part of the graph
+            self.module.forward(mx.io.DataBatch(batch.data, None,
+                                                bucket_key=batch.bucket_key,
+                                                provide_data=batch.provide_data), is_train=False)
+            # attention_probs: (batch_size, target_seq_len, source_seq_len)
+            attention_probs = self.module.get_outputs()[0].asnumpy()
+            source_lengths = batch.data[1].asnumpy().astype('int64')
+            # labels hold the target words and the end-of-sentence symbol
+            target_lengths = (batch.label[0].asnumpy() != C.PAD_ID).sum(axis=1) - 1
+            batch_alignments = utils.get_alignments_batch(attention_probs, source_lengths, target_lengths, threshold)
+            for sentence_index, alignment in zip(batch.index.tolist(), batch_alignments):
+                if sentence_index >= 0:
+                    alignments[sentence_index] = alignment
+        return alignments
+
+
+def get_scoring_data_iter(source: str,
+                          target: str,
+                          vocab_source: Dict[str, int],
+                          vocab_target: Dict[str, int],
+                          batch_size: int,
+                          max_seq_len: int,
+                          bucket_width: int,
+                          length_ratio: float) -> Tuple[data_io.ParallelBucketSentenceIter, int]:
+    """
+    Returns an iterator over all sentence pairs of a parallel corpus in length buckets. Batches keep the input order
+    within each bucket, and incomplete batches are padded instead of discarded. Pairs with an empty line are not
+    part of any batch, like pairs that fit no bucket.
+
+    :param source: Path to source data.
+    :param target: Path to target data.
+    :param vocab_source: Source vocabulary.
+    :param vocab_target: Target vocabulary.
+    :param batch_size: Batch size.
+    :param max_seq_len: Maximum source and target sequence length.
+    :param bucket_width: Size of buckets.
+    :param length_ratio: Target/source length ratio to scale buckets by.
+    :return: Data iterator, number of sentence pairs (including those not in any batch).
+    """
+    source_sentences, target_sentences = data_io.read_parallel_corpus(source, target, vocab_source, vocab_target,
+                                                                      allow_empty=True)
+    # the iterator discards pairs with an empty source sentence; target sentences start with BOS
+    source_sentences = [source_sentence if len(target_sentence) > 1 else []
+                        for source_sentence, target_sentence in zip(source_sentences, target_sentences)]
+    buckets = data_io.define_parallel_buckets(max_seq_len, max_seq_len, bucket_width, length_ratio)
+    data_iter = data_io.ParallelBucketSentenceIter(source_sentences,
+                                                   target_sentences,
+                                                   buckets,
+                                                   batch_size,
+                                                   vocab_target[C.EOS_SYMBOL],
+                                                   C.PAD_ID,
+                                                   vocab_target[C.UNK_SYMBOL],
+                                                   fill_up='pad',
+                                                   shuffle=False)
+    return data_iter, len(source_sentences)
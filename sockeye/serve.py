@@ -0,0 +1,414 @@
+# Copyright 2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You may not
+# use this file except in compliance with the License. A copy of the License
+# is located at
+#
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is distributed on
+# an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+"""
+Translation server CLI. Serves translations over HTTP/JSON and coalesces concurrent requests into micro-batches.
+
+Requests:
+
+    POST /translate  {"text": "a sentence"}  ->  {"translation": "...", "score": 1.23}
+    POST /translate  {"texts": ["a sentence", ...]}  ->  {"translations": [{"translation": ..., "score": ...}, ...]}
+
+    An optional "time_budget_ms" limits the time from receiving a request to its translations. Translations whose
+    search degraded to meet it report the degradation, e.g. {"translation": ..., "score": ..., "degradation": "greedy"}.
+
+    POST /translate  {"text": "a sentence", "stream": true}  ->  {"tokens": [...]} ... {"translation": ..., ...}
+
+    Streams the tokens of the translation as soon as they are stable, before the search ends: the response is
+    chunked and holds one JSON object per line, the last of which is the translation.
+    GET /stats  ->  queue depth, batch size histogram, latency percentiles
+"""
+import argparse
+import asyncio
+import collections
+import functools
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+import sockeye.arguments as arguments
+import sockeye.constants as C
+import sockeye.inference
+import sockeye.translate
+import sockeye.translation_cache
+from sockeye.log import setup_main_logger, log_sockeye_version
+from sockeye.utils import check_condition
+
+logger = setup_main_logger(__name__, file_logging=False)
+
+_HTTP_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+                 500: "Internal Server Error"}
+
+
+class ServerStats:
+    """
+    Statistics of a TranslationServer: number of translated sentences, batch size histogram, and latency percentiles
+    (time from receiving a sentence to its translation) over the most recent sentences.
+
+    :param window: Number of most recent sentences to compute latency percentiles over.
+    """
+
+    def __init__(self, window: int = 1000):
+        self.num_sentences = 0
+        self.num_batches = 0
+        self.batch_sizes = collections.Counter()  # type: collections.Counter
+        self.latencies = collections.deque(maxlen=window)  # type: collections.deque
+
+    def add_batch(self, latencies: List[float]):
+        """
+        Records a translated batch.
+
+        :param latencies: Latency of each sentence of the batch in seconds.
+        """
+        self.num_sentences += len(latencies)
+        self.num_batches += 1
+        self.batch_sizes[len(latencies)] += 1
+        self.latencies.extend(latencies)
+
+    def as_dict(self, queue_depth: int) -> Dict:
+        """
+        Returns the statistics as a JSON-serializable dictionary.
+
+        :param queue_depth: Current number of sentences waiting for translation.
+        :return: Dictionary of statistics. Latencies are in milliseconds.
+        """
+        latencies = np.array(self.latencies) * 1000.0
+        percentiles = {"p%d" % p: float(np.percentile(latencies, p)) if latencies.size else None
+                       for p in (50, 90, 95, 99)}
+        return {"queue_depth": queue_depth,
+                "sentences": self.num_sentences,
+                "batches": self.num_batches,
+                "mean_batch_size": self.num_sentences / self.num_batches if self.num_batches else None,
+                "batch_size_histogram": {str(size): count for size, count in sorted(self.batch_sizes.items())},
+                "latency_ms": percentiles}
+
+
+class TranslationServer:
+    """
+    Owns a Translator and translates sentences submitted concurrently with translate() in micro-batches:
+    a batch is started once max_batch_size sentences are waiting, or max_delay seconds after its first sentence
+    arrived, whichever comes first. Batches are translated in a background thread, so that new sentences are
+    queued while the previous batch is being translated.
+    A sentence that is identical to a sentence waiting for or in translation shares its result, unless its tokens
+    are streamed or either sentence has a time budget, whose result might be degraded. Sampled translations are
+    never shared. With a CachedTranslator, cached translations are returned without queueing.
+    Batches are translated with the earliest deadline of their sentences.
+
+    :param translator: Translator or CachedTranslator. Batches hold at most its batch size sentences.
+    :param max_delay: Maximum time in seconds a sentence waits for further sentences before its batch is started.
+    :param stats_window: Number of most recent sentences to compute latency percentiles over.
+    """
+
+    def __init__(self,
+                 translator: Union[sockeye.inference.Translator, sockeye.translation_cache.CachedTranslator],
+                 max_delay: float = 0.005,
+                 stats_window: int = 1000):
+        self.translator = translator
+        self.max_batch_size = translator.batch_size
+        self.max_delay = max_delay
+        self.stats = ServerStats(stats_window)
+        # sentences waiting for translation: (TranslatorInput, arrival time, deadline, future, token callback)
+        self.pending = collections.deque()  # type: collections.deque
+        self.pending_event = asyncio.Event()
+        # source tokens -> future of sentences waiting for or in translation
+        self.in_flight = {}  # type: Dict[Tuple[str, ...], asyncio.Future]
+        self.num_coalesced = 0
+        # samples of identical sentences differ
+        sampling = (translator.translator if isinstance(translator, sockeye.translation_cache.CachedTranslator)
+                    else translator).sample is not None
+        self.coalesce = not sampling
+        self.next_id = 0
+        # a single thread translates, MXNet calls are not made from several threads
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    async def translate(self,
+                        text: str,
+                        time_budget: Optional[float] = None,
+                        on_tokens: Optional[Callable[[List[str]], None]] = None) \
+            -> sockeye.inference.TranslatorOutput:
+        """
+        Queues a sentence for translation and returns its translation once its batch is done.
+
+        :param text: Input sentence.
+        :param time_budget: Optional time in seconds from now the translation should be done in.
+        :param on_tokens: Optional callback for the stable tokens of the translation, called in order on the event
+                          loop while the batch is being translated, see Translator.translate_batch().
+        :return: Translation.
+        """
+        arrival = time.time()
+        deadline = arrival + time_budget if time_budget is not None else None
+        self.next_id += 1
+        trans_input = self.translator.make_input(self.next_id, text)
+        if isinstance(self.translator, sockeye.translation_cache.CachedTranslator):
+            cached_output = self.translator.lookup(trans_input)
+            if cached_output is not None:
+                if on_tokens is not None and cached_output.translation:
+                    on_tokens(cached_output.translation.split(C.TOKEN_SEPARATOR))
+                return cached_output
+        key = tuple(trans_input.tokens)
+        # tokens streamed before a sentence arrives cannot be passed to its callback, and a result searched for
+        # another deadline might be degraded or late
+        coalesce = self.coalesce and on_tokens is None and deadline is None
+        future = self.in_flight.get(key) if coalesce else None
+        if future is None:
+            future = asyncio.get_event_loop().create_future()
+            if coalesce:
+                self.in_flight[key] = future
+                future.add_done_callback(lambda _: self.in_flight.pop(key, None))
+            self.pending.append((trans_input, arrival, deadline, future, on_tokens))
+            self.pending_event.set()
+        else:
+            self.num_coalesced += 1
+        trans_output = await asyncio.shield(future)
+        return trans_output._replace(id=trans_input.id)
+
+    async def run(self):
+        """
+        Forms and translates batches of pending sentences, forever.
+        """
+        loop = asyncio.get_event_loop()
+        while True:
+            await self.pending_event.wait()
+            deadline = loop.time() + self.max_delay
+            while len(self.pending) < self.max_batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                self.pending_event.clear()
+                try:
+                    await asyncio.wait_for(self.pending_event.wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+            batch = [self.pending.popleft() for _ in range(min(len(self.pending), self.max_batch_size))]
+            if self.pending:
+                self.pending_event.set()
+            else:
+                self.pending_event.clear()
+
+            trans_inputs = [trans_input for trans_input, _, _, _, _ in batch]
+            deadlines = [deadline for _, _, deadline, _, _ in batch if deadline is not None]
+            listeners = {trans_input.id: on_tokens
+                         for trans_input, _, _, _, on_tokens in batch if on_tokens is not None}
+            stream = functools.partial(self._stream_tokens, loop, listeners) if listeners else None
+            try:
+                trans_outputs = await loop.run_in_executor(self.executor, self.translator.translate_batch,
+                                                           trans_inputs, min(deadlines) if deadlines else None,
+                                                           stream)
+            except Exception as e:  # pylint: disable=broad-except
+                logger.exception("Translation failed")
+                for _, _, _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            done = time.time()
+            self.stats.add_batch([done - arrival for _, arrival, _, _, _ in batch])
+            for (_, _, _, future, _), trans_output in zip(batch, trans_outputs):
+                if not future.done():
+                    future.set_result(trans_output)
+
+    @staticmethod
+    def _stream_tokens(loop: asyncio.AbstractEventLoop,
+                       listeners: Dict[int, Callable[[List[str]], None]],
+                       trans_input: sockeye.inference.TranslatorInput,
+                       tokens: List[str]):
+        """
+        Passes stable tokens of a sentence from the translating thread to its callback on the event loop.
+        """
+        listener = listeners.get(trans_input.id)
+        if listener is not None:
+            loop.call_soon_threadsafe(listener, tokens)
+
+    async def stream(self, text: str, time_budget: Optional[float], events: asyncio.Queue):
+        """
+        Translates a sentence and puts its stable tokens, and then its translation or the error, as JSON-serializable
+        events into events, followed by None.
+
+        :param text: Input sentence.
+        :param time_budget: Optional time in seconds from now the translation should be done in.
+        :param events: Queue of events.
+        """
+        try:
+            trans_output = await self.translate(text, time_budget,
+                                                on_tokens=lambda tokens: events.put_nowait({"tokens": tokens}))
+            events.put_nowait(self._get_result(trans_output))
+        except Exception as e:  # pylint: disable=broad-except
+            events.put_nowait({"error": str(e)})
+        events.put_nowait(None)
+
+    @staticmethod
+    def _get_result(trans_output: sockeye.inference.TranslatorOutput) -> Dict:
+        result = {"translation": trans_output.translation, "score": float(trans_output.score)}
+        if trans_output.degradation != C.DEGRADATION_NONE:
+            result["degradation"] = trans_output.degradation
+        return result
+
+    def get_stats(self) -> Dict:
+        """
+        Returns server statistics, see ServerStats.as_dict().
+        """
+        stats = self.stats.as_dict(queue_depth=len(self.pending))
+        stats["coalesced"] = self.num_coalesced
+        if isinstance(self.translator, sockeye.translation_cache.CachedTranslator) and \
+                self.translator.cache is not None:
+            stats["cache_hits"] = self.translator.cache.hits
+            stats["cache_misses"] = self.translator.cache.misses
+        return stats
+
+    async def handle_request(self, method: str, path: str, body: bytes) -> Tuple[int, Union[Dict, asyncio.Queue]]:
+        """
+        Handles a single HTTP request.
+
+        :param method: HTTP method.
+        :param path: Request path.
+        :param body: Request body.
+        :return: HTTP status and JSON response, or, for streamed translations, the queue of its events, see stream().
+        """
+        if path == "/stats":
+            return 200, self.get_stats()
+        if path != "/translate":
+            return 404, {"error": "Unknown path: %s" % path}
+        if method != "POST":
+            return 405, {"error": "Use POST to translate"}
+        try:
+            request = json.loads(body.decode("utf-8"))
+            texts = request["texts"] if "texts" in request else [request["text"]]
+            if not all(isinstance(text, str) for text in texts):
+                raise ValueError("Texts must be strings")
+            time_budget = request.get("time_budget_ms")
+            if time_budget is not None:
+                time_budget = float(time_budget) / 1000.0
+            streamed = bool(request.get("stream", False))
+            if streamed and "texts" in request:
+                raise ValueError("Only a single text can be streamed")
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            return 400, {"error": "Invalid request: %s" % e}
+        if streamed:
+            events = asyncio.Queue()  # type: asyncio.Queue
+            asyncio.ensure_future(self.stream(texts[0], time_budget, events))
+            return 200, events
+        trans_outputs = await asyncio.gather(*(self.translate(text, time_budget) for text in texts))
+        results = [self._get_result(trans_output) for trans_output in trans_outputs]
+        return 200, {"translations": results} if "texts" in request else results[0]
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        Serves HTTP/1.1 requests of a connection until the client closes it.
+        """
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = (await reader.readline()).decode("latin-1").strip()
+                    if not line:
+                        break
+                    name, _, value = line.partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                try:
+                    status, response = await self.handle_request(method, path, body)
+                except Exception as e:  # pylint: disable=broad-except
+                    status, response = 500, {"error": str(e)}
+                keep_alive = headers.get("connection", "").lower() != "close"
+                if isinstance(response, asyncio.Queue):
+                    await self.write_events(writer, response, keep_alive)
+                    if not keep_alive:
+                        break
+                    continue
+                payload = json.dumps(response).encode("utf-8")
+                writer.write(("HTTP/1.1 %d %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\n"
+                              "Connection: %s\r\n\r\n" % (status, _HTTP_REASONS[status], len(payload),
+                                                          "keep-alive" if keep_alive else "close")).encode("latin-1"))
+                writer.write(payload)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ValueError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def write_events(writer: asyncio.StreamWriter, events: asyncio.Queue, keep_alive: bool):
+        """
+        Writes events as a chunked HTTP response with one JSON object per line, each in its own chunk, as soon as
+        they are put into the queue, until None.
+        """
+        writer.write(("HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\nTransfer-Encoding: chunked\r\n"
+                      "Connection: %s\r\n\r\n" % ("keep-alive" if keep_alive else "close")).encode("latin-1"))
+        while True:
+            event = await events.get()
+            if event is None:
+                break
+            payload = (json.dumps(event) + "\n").encode("utf-8")
+            writer.write(("%x\r\n" % len(payload)).encode("latin-1") + payload + b"\r\n")
+            await writer.drain()
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+
+def main():
+    params = argparse.ArgumentParser(description='Translation server CLI')
+    arguments.add_translator_args(params)
+    arguments.add_device_args(params)
+    arguments.add_serve_args(params)
+    args = params.parse_args()
+
+    log_sockeye_version(logger)
+    logger.info("Command: %s", " ".join(sys.argv))
+    logger.info("Arguments: %s", args)
+
+    check_condition(args.sample is None or (args.cache_size == 0 and args.cache_path is None),
+                    "Sampled translations cannot be cached")
+
+    with ExitStack() as exit_stack:
+        context = sockeye.translate._setup_context(args, exit_stack)  # pylint: disable=protected-access
+        translator = sockeye.translate.create_translator(args, context, store_attention=False)
+        server_translator = translator \
+            # type: Union[sockeye.inference.Translator, sockeye.translation_cache.CachedTranslator]
+        # samples of identical sentences differ, so results are neither cached nor collapsed
+        cached_translator = sockeye.translate.create_cached_translator(args, translator) \
+            if args.sample is None else None
+        if cached_translator is not None:
+            if cached_translator.cache is not None:
+                exit_stack.callback(cached_translator.cache.close)
+            server_translator = cached_translator
+
+        loop = asyncio.get_event_loop()
+        server = TranslationServer(server_translator, max_delay=args.max_batch_delay / 1000.0,
+                                   stats_window=args.stats_window)
+        batching = loop.create_task(server.run())
+        http_server = loop.run_until_complete(asyncio.start_server(server.handle_connection, args.host, args.port))
+        logger.info("Serving on %s:%d (max batch size %d, max batch delay %.1fms)",
+                    args.host, args.port, server.max_batch_size, args.max_batch_delay)
+        try:
+            loop.run_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            http_server.close()
+            batching.cancel()
+            loop.run_until_complete(asyncio.gather(batching, return_exceptions=True))
+            logger.info("Stats: %s", json.dumps(server.get_stats()))
+
+
+if __name__ == '__main__':
+    main()
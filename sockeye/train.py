@@ -187,18 +187,19 @@ def main():
         # create data iterators
         max_seq_len_source = args.max_seq_len if args.max_seq_len_source is None else args.max_seq_len_source
         max_seq_len_target = args.max_seq_len if args.max_seq_len_target is None else args.max_seq_len_target
-        train_iter, eval_iter = data_io.get_training_data_iters(source=config_data.source,
-                                                                target=config_data.target,
-                                                                validation_source=config_data.validation_source,
-                                                                validation_target=config_data.validation_target,
-                                                                vocab_source=vocab_source,
-                                                                vocab_target=vocab_target,
-                                                                batch_size=args.batch_size,
-                                                                fill_up=args.fill_up,
-                                                                max_seq_len_source=max_seq_len_source,
-                                                                max_seq_len_target=max_seq_len_target,
-                                                                bucketing=not args.no_bucketing,
-                                                                bucket_width=args.bucket_width)
+        train_iter, eval_iter, length_ratio_mean, length_ratio_std = data_io.get_training_data_iters(
+            source=config_data.source,
+            target=config_data.target,
+            validation_source=config_data.validation_source,
+            validation_target=config_data.validation_target,
+            vocab_source=vocab_source,
+            vocab_target=vocab_target,
+            batch_size=args.batch_size,
+            fill_up=args.fill_up,
+            max_seq_len_source=max_seq_len_source,
+            max_seq_len_target=max_seq_len_target,
+            bucketing=not args.no_bucketing,
+            bucket_width=args.bucket_width)
 
         # learning rate scheduling
         learning_rate_half_life = none_if_negative(args.learning_rate_half_life)
@@ -273,7 +274,9 @@ def main():
                                          config_attention=config_attention,
                                          config_loss=config_loss,
                                          lexical_bias=args.lexical_bias,
-                                         learn_lexical_bias=args.learn_lexical_bias)
+                                         learn_lexical_bias=args.learn_lexical_bias,
+                                         length_ratio_mean=length_ratio_mean,
+                                         length_ratio_std=length_ratio_std)
         model_config.freeze()
 
         # create training model
@@ -15,10 +15,16 @@
 Translation CLI.
 """
 import argparse
+import multiprocessing
+import os
+import queue
 import sys
+import threading
 import time
+import traceback
 from contextlib import ExitStack
-from typing import Optional, Iterable, Tuple
+from itertools import islice
+from typing import Dict, Optional, Iterable, Iterator, List, Tuple, Union
 
 import mxnet as mx
 
@@ -27,9 +33,11 @@ import sockeye.arguments as arguments
 import sockeye.constants as C
 import sockeye.data_io
 import sockeye.inference
+import sockeye.lexicon
 import sockeye.output_handler
+import sockeye.translation_cache
 from sockeye.log import setup_main_logger, log_sockeye_version
-from sockeye.utils import acquire_gpus, get_num_gpus
+from sockeye.utils import acquire_gpus, expand_requested_device_ids, get_num_gpus
 from sockeye.utils import check_condition
 
 logger = setup_main_logger(__name__, file_logging=False)
@@ -54,37 +62,145 @@ def main():
 
     output_handler = sockeye.output_handler.get_output_handler(args.output_type,
                                                                args.output,
-                                                               args.sure_align_threshold)
+                                                               args.sure_align_threshold,
+                                                               args.flush_every)
+
+    check_condition(args.workers == 1 or args.cache_path is None,
+                    "A persistent translation cache cannot be shared by several workers")
+    check_condition(args.sample is None or (args.cache_size == 0 and args.cache_path is None),
+                    "Sampled translations cannot be cached")
+    if args.output_type == "translation_stream":
+        check_condition(args.workers == 1, "Translations cannot be streamed by several workers")
+        check_condition(args.sample is None, "Sampled translations cannot be streamed")
+
+    if args.workers > 1 and args.use_cpu:
+        # CPU workers are forked after the models are loaded, which the threads of the default engine do not survive.
+        # This must be set before MXNet runs its first operation.
+        os.environ["MXNET_ENGINE_TYPE"] = "NaiveEngine"
 
     with ExitStack() as exit_stack:
-        context = _setup_context(args, exit_stack)
+        contexts = _setup_contexts(args, exit_stack)
+        if args.workers > 1:
+            read_and_translate_parallel(args, contexts, output_handler)
+        else:
+            translator = create_translator(args, contexts[0], output_handler.reports_attention())
+            if args.sample is not None:
+                # samples of identical inputs differ, so inputs are neither cached nor collapsed
+                read_and_translate(translator, output_handler, args.input, args.batch_size, args.sort_window,
+                                   all_samples=True)
+            else:
+                cached_translator = create_cached_translator(args, translator)
+                if cached_translator is None:
+                    read_and_translate(translator, output_handler, args.input, args.batch_size, args.sort_window)
+                else:
+                    if cached_translator.cache is not None:
+                        exit_stack.callback(cached_translator.cache.close)
+                    read_and_translate(cached_translator, output_handler, args.input, args.batch_size,
+                                       args.sort_window)
+                    logger.info("%s", cached_translator)
+            _log_executor_caches(translator)
+
+
+def create_translator(args: argparse.Namespace,
+                      context: mx.context.Context,
+                      store_attention: bool,
+                      warmup: bool = True) -> sockeye.inference.Translator:
+    """
+    Loads the models given by the command line arguments and returns a Translator for them.
+
+    :param args: Parsed command line arguments.
+    :param context: MXNet context to bind models to.
+    :param store_attention: Whether the Translator keeps attention scores.
+    :param warmup: Whether to warm up the Translator if requested by the command line arguments.
+    :return: Translator, warmed up if requested.
+    """
+    if args.seed is not None:
+        mx.random.seed(args.seed)
+    models, vocab_source, vocab_target = sockeye.inference.load_models(
+        context,
+        args.max_input_len,
+        # the samples of a sentence take the place of its hypotheses in the beam
+        args.num_samples if args.sample is not None else args.beam_size,
+        args.models,
+        args.checkpoints,
+        args.softmax_temperature,
+        args.batch_size,
+        restrict_vocab=args.restrict_lexicon is not None,
+        max_executors=args.max_bucket_executors,
+        max_executor_memory=args.max_executor_memory)
+    restrict_lexicon = None
+    if args.restrict_lexicon is not None:
+        restrict_lexicon = sockeye.lexicon.TopKLexicon(vocab_source, vocab_target)
+        restrict_lexicon.create(args.restrict_lexicon, args.restrict_lexicon_topk, args.restrict_lexicon_frequent)
+    translator = sockeye.inference.Translator(context,
+                                              args.ensemble_mode,
+                                              models,
+                                              vocab_source,
+                                              vocab_target,
+                                              top_k_engine=args.top_k_engine,
+                                              restrict_lexicon=restrict_lexicon,
+                                              store_attention=store_attention,
+                                              beam_prune_absolute=args.beam_prune_absolute,
+                                              beam_prune_relative=args.beam_prune_relative,
+                                              beam_compact=args.beam_compact,
+                                              max_output_length_num_stds=args.max_output_length_num_stds,
+                                              min_output_length_num_stds=args.min_output_length_num_stds,
+                                              bucket_width=args.bucket_width,
+                                              ensemble_fused=args.ensemble_fused,
+                                              time_budget=args.time_budget / 1000.0
+                                              if args.time_budget is not None else None,
+                                              sample=args.sample)
+    if warmup and args.warmup:
+        translator.warmup()
+    return translator
+
+
+def create_cached_translator(args: argparse.Namespace,
+                             translator: sockeye.inference.Translator) \
+        -> Optional[sockeye.translation_cache.CachedTranslator]:
+    """
+    Returns a CachedTranslator for translator that collapses duplicate inputs of each batch and, if requested by the
+    command line arguments, caches results in memory (--cache-size) and on disk (--cache-path). Without a cache,
+    duplicates can only be collapsed within a batch, so with a batch size of 1 there is nothing to save.
+
+    :param args: Parsed command line arguments.
+    :param translator: Translator.
+    :return: Cached translator, or None if it would translate every input anyway.
+    """
+    if args.cache_size == 0 and args.cache_path is None:
+        return sockeye.translation_cache.CachedTranslator(translator) if translator.batch_size > 1 else None
+    cache = sockeye.translation_cache.TranslationCache(args.cache_size, args.cache_path)
+    return sockeye.translation_cache.CachedTranslator(translator, cache)
 
-        translator = sockeye.inference.Translator(context,
-                                                  args.ensemble_mode,
-                                                  *sockeye.inference.load_models(context,
-                                                                                 args.max_input_len,
-                                                                                 args.beam_size,
-                                                                                 args.models,
-                                                                                 args.checkpoints,
-                                                                                 args.softmax_temperature))
-        read_and_translate(translator, output_handler, args.input)
 
+def _log_executor_caches(translator: sockeye.inference.Translator):
+    for model in translator.models:
+        logger.info("Encoder executors: %s", model.encoder_cache)
+        logger.info("Decoder executors: %s", model.decoder_cache)
+    if translator.ensemble is not None:
+        logger.info("Fused ensemble decoder executors: %s", translator.ensemble.decoder_cache)
 
-def read_and_translate(translator: sockeye.inference.Translator, output_handler: sockeye.output_handler.OutputHandler,
-                       source: Optional[str] = None) -> None:
+
+def read_and_translate(translator: Union[sockeye.inference.Translator, sockeye.translation_cache.CachedTranslator],
+                       output_handler: sockeye.output_handler.OutputHandler,
+                       source: Optional[str] = None, chunk_size: int = 1, sort_window: int = 0,
+                       all_samples: bool = False) -> None:
     """
     Reads from either a file or stdin and translates each line, calling the output_handler with the result.
 
     :param output_handler: Handler that will write output to a stream.
     :param translator: Translator that will translate each line of input.
     :param source: Path to file which will be translated line-by-line if included, if none use stdin.
+    :param chunk_size: Number of lines passed to the translator at once.
+    :param sort_window: Number of lines sorted by length before they are chunked, 0 to keep the input order.
+    :param all_samples: Whether to handle all samples of each line, see translate_lines().
     """
 
     source_data = sys.stdin if source is None else sockeye.data_io.smart_open(source)
 
     logger.info("Translating...")
 
-    i, total_time = translate_lines(output_handler, source_data, translator)
+    i, total_time = translate_lines(output_handler, source_data, translator, chunk_size, sort_window, all_samples)
 
     if i != 0:
         logger.info("Processed %d lines. Total time: %.4f sec/sent: %.4f sent/sec: %.4f", i, total_time,
@@ -94,29 +210,294 @@ def read_and_translate(translator: sockeye.inference.Translator, output_handler:
 
 
 def translate_lines(output_handler: sockeye.output_handler.OutputHandler, source_data: Iterable[str],
-                    translator: sockeye.inference.Translator) -> Tuple[int, float]:
+                    translator: Union[sockeye.inference.Translator, sockeye.translation_cache.CachedTranslator],
+                    chunk_size: int = 1, sort_window: int = 0, all_samples: bool = False) -> Tuple[int, float]:
     """
     Translates each line from source_data, calling output handler for each result.
+    Lines are read and translated in chunks of chunk_size, see get_chunks(). Results are passed to the output handler
+    in input order.
+    Reading and tokenizing input, translating, and handling output run as a pipeline in three threads connected by
+    bounded queues, such that the calling thread only translates. The output handler is flushed whenever it has
+    handled all results translated so far.
+    With a TokenStreamingOutputHandler, the stable tokens of each translation are passed to it in order with the
+    results, while the translation is running.
 
     :param output_handler: A handler that will be called once with the output of each translation.
     :param source_data: A enumerable list of source sentences that will be translated.
     :param translator: The translator that will be used for each line of input.
+    :param chunk_size: Number of lines passed to the translator at once.
+    :param sort_window: Number of lines sorted by length before they are chunked, 0 to keep the input order.
+    :param all_samples: Whether to handle all translations of each line returned by Translator.sample_batch(),
+                        in order, instead of a single translation.
     :return: The number of lines translated, and the total time taken.
     """
+    # a couple of chunks in flight per stage, so that the translating thread does not wait
+    input_queue = queue.Queue(maxsize=2)  # type: queue.Queue
+    output_queue = queue.Queue(maxsize=2)  # type: queue.Queue
+    errors = []  # type: List[Exception]
+    streaming = isinstance(output_handler, sockeye.output_handler.TokenStreamingOutputHandler)
+    # set once the translating thread takes no more input, so that the reading thread does not block forever
+    stop_reading = threading.Event()
+
+    def put_input(chunk: Optional[List[Tuple[int, sockeye.inference.TranslatorInput]]]) -> bool:
+        while not stop_reading.is_set():
+            try:
+                input_queue.put(chunk, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def read():
+        try:
+            for chunk in get_chunks(source_data, chunk_size, sort_window):
+                if not put_input([(sentence_id, translator.make_input(sentence_id, line))
+                                  for sentence_id, line in chunk]):
+                    return
+        except Exception as e:  # pylint: disable=broad-except
+            errors.append(e)
+        put_input(None)
+
+    def stream(trans_input: sockeye.inference.TranslatorInput, tokens: List[str]):
+        # stable tokens are passed to the output handler by the writing thread, in order with the results
+        output_queue.put((trans_input, tokens))
+
+    num_handled = 0
+
+    def write():
+        nonlocal num_handled
+        # results of lines translated ahead of preceding lines of their sort window
+        pending = {}  # type: Dict[int, Tuple[sockeye.inference.TranslatorInput, List]]
+        while True:
+            results = output_queue.get()
+            if results is None:
+                break
+            if errors:
+                # keep consuming results, so that the translating thread does not block
+                continue
+            try:
+                if isinstance(results, tuple):
+                    output_handler.stream_tokens(*results)  # type: ignore
+                    continue
+                for sentence_id, trans_input, trans_outputs in results:
+                    pending[sentence_id] = (trans_input, trans_outputs)
+                while num_handled + 1 in pending:
+                    num_handled += 1
+                    trans_input, trans_outputs = pending.pop(num_handled)
+                    for trans_output in trans_outputs:
+                        logger.debug("OUT: %s", trans_output)
+                        output_handler.handle(trans_input, trans_output)
+                if output_queue.empty():
+                    output_handler.flush()
+            except Exception as e:  # pylint: disable=broad-except
+                errors.append(e)
+
+    reader = threading.Thread(target=read, daemon=True)
+    writer = threading.Thread(target=write, daemon=True)
+    reader.start()
+    writer.start()
 
-    i = 0
     total_time = 0.0
-    for i, line in enumerate(source_data, 1):
-        trans_input = translator.make_input(i, line)
-        logger.debug(" IN: %s", trans_input)
-        tic = time.time()
-        trans_output = translator.translate(trans_input)
-        trans_wall_time = time.time() - tic
-        total_time += trans_wall_time
-        logger.debug("OUT: %s", trans_output)
-        logger.debug("OUT: time=%.2f", trans_wall_time)
-        output_handler.handle(trans_input, trans_output)
-    return i, total_time
+    try:
+        while not errors:
+            chunk = input_queue.get()
+            if chunk is None:
+                break
+            trans_inputs = [trans_input for _, trans_input in chunk]
+            for trans_input in trans_inputs:
+                logger.debug(" IN: %s", trans_input)
+            tic = time.time()
+            if all_samples:
+                trans_outputs = translator.sample_batch(trans_inputs)
+            else:
+                trans_outputs = [[trans_output] for trans_output in
+                                 translator.translate_batch(trans_inputs, stream=stream if streaming else None)]
+            trans_wall_time = time.time() - tic
+            total_time += trans_wall_time
+            logger.debug("OUT: time=%.2f (%d sentences)", trans_wall_time, len(trans_inputs))
+            output_queue.put([(sentence_id, trans_input, trans_output)
+                              for (sentence_id, trans_input), trans_output in zip(chunk, trans_outputs)])
+    finally:
+        stop_reading.set()
+        output_queue.put(None)
+        writer.join()
+    if errors:
+        raise errors[0]
+    output_handler.flush()
+    return num_handled, total_time
+
+
+def get_chunks(source_data: Iterable[str], chunk_size: int, sort_window: int = 0) -> Iterator[List[Tuple[int, str]]]:
+    """
+    Yields chunks of at most chunk_size (sentence id, line) pairs from source_data, numbering lines from 1.
+    If sort_window is positive, windows of max(sort_window, chunk_size) lines are read and sorted by their number of
+    tokens before they are chunked, such that each chunk holds sentences of similar length. Only a single window of
+    lines is held in memory.
+
+    :param source_data: Source sentences.
+    :param chunk_size: Maximum number of lines per chunk.
+    :param sort_window: Number of lines sorted by length, 0 to keep the input order.
+    :return: Iterator over chunks.
+    """
+    lines = enumerate(source_data, 1)
+    window_size = max(sort_window, chunk_size)
+    while True:
+        window = list(islice(lines, window_size))
+        if not window:
+            break
+        if sort_window > 0:
+            window.sort(key=lambda line: sum(1 for _ in sockeye.data_io.get_tokens(line[1])))
+        for start in range(0, len(window), chunk_size):
+            yield window[start:start + chunk_size]
+
+
+def read_and_translate_parallel(args: argparse.Namespace,
+                                contexts: List[mx.context.Context],
+                                output_handler: sockeye.output_handler.OutputHandler) -> None:
+    """
+    Reads from either a file or stdin and translates in args.workers worker processes, each holding its own
+    Translator on one of the given contexts (assigned round-robin). Chunks of args.batch_size lines (see get_chunks())
+    are passed to the workers through a bounded queue, and results are passed to the output_handler in input order.
+    On the CPU, the models are loaded once in this process, and the workers are forked from it, such that they share
+    the parameters copy-on-write. This requires the synchronous MXNet engine (see main()). On GPUs, each worker
+    loads the models onto its own device, and workers are forked from a fresh server process instead.
+
+    :param args: Parsed command line arguments.
+    :param contexts: MXNet contexts to distribute the workers over.
+    :param output_handler: Handler that will write output to a stream.
+    """
+    store_attention = output_handler.reports_attention()
+    translator = None  # type: Optional[sockeye.inference.Translator]
+    if args.use_cpu:
+        # the workers only read the bound parameters, so their memory pages are not copied
+        translator = create_translator(args, contexts[0], store_attention, warmup=False)
+        mp_context = multiprocessing.get_context('fork')
+    else:
+        mp_context = multiprocessing.get_context('forkserver')  # type: ignore
+        # workers share the imported modules with the server process
+        mp_context.set_forkserver_preload(['sockeye.translate'])
+    # a few chunks per worker in flight, so that workers do not wait for input
+    input_queue = mp_context.Queue(maxsize=2 * args.workers)
+    output_queue = mp_context.Queue()
+    workers = [mp_context.Process(target=_translate_worker,
+                                  args=(args, contexts[i % len(contexts)], store_attention, input_queue,
+                                        output_queue, translator),
+                                  daemon=True)
+               for i in range(args.workers)]
+    for worker in workers:
+        worker.start()
+
+    source_data = sys.stdin if args.input is None else sockeye.data_io.smart_open(args.input)
+
+    def feed():
+        for chunk_id, chunk in enumerate(get_chunks(source_data, args.batch_size, args.sort_window)):
+            input_queue.put((chunk_id, chunk))
+        for _ in workers:
+            input_queue.put(None)
+
+    feeder = threading.Thread(target=feed, daemon=True)
+    feeder.start()
+
+    logger.info("Translating with %d workers...", args.workers)
+    tic = time.time()
+    pending = {}  # type: Dict[int, Tuple[sockeye.inference.TranslatorInput, List[sockeye.inference.TranslatorOutput]]]
+    num_finished_workers, i = 0, 0
+    while num_finished_workers < len(workers):
+        try:
+            message = output_queue.get(timeout=C.WORKER_POLL_INTERVAL)
+        except queue.Empty:
+            # workers report their own errors, so a non-zero exit code means a worker was killed or crashed
+            for worker in workers:
+                if worker.exitcode not in (None, 0):
+                    raise RuntimeError("Translation worker %s exited unexpectedly with exit code %d"
+                                       % (worker.name, worker.exitcode))
+            continue
+        if message is None:
+            num_finished_workers += 1
+            continue
+        chunk_id, results = message
+        if isinstance(results, str):
+            raise RuntimeError("Translation worker failed:\n%s" % results)
+        for trans_input, trans_outputs in results:
+            pending[trans_input.id] = (trans_input, trans_outputs)
+        # re-order results by their position in the input
+        while i + 1 in pending:
+            i += 1
+            trans_input, trans_outputs = pending.pop(i)
+            for trans_output in trans_outputs:
+                logger.debug("OUT: %s", trans_output)
+                output_handler.handle(trans_input, trans_output)
+        if output_queue.empty():
+            output_handler.flush()
+    output_handler.flush()
+    feeder.join()
+    for worker in workers:
+        worker.join()
+    total_time = time.time() - tic
+
+    if i != 0:
+        logger.info("Processed %d lines. Total time: %.4f sec/sent: %.4f sent/sec: %.4f", i, total_time,
+                    total_time / i, i / total_time)
+    else:
+        logger.info("Processed 0 lines.")
+
+
+def _translate_worker(args: argparse.Namespace,
+                      context: mx.context.Context,
+                      store_attention: bool,
+                      input_queue: multiprocessing.Queue,
+                      output_queue: multiprocessing.Queue,
+                      translator: Optional[sockeye.inference.Translator] = None) -> None:
+    """
+    Translates chunks of (sentence id, line) from input_queue until it receives None, and puts (chunk id, list of
+    (TranslatorInput, list of TranslatorOutputs)) on output_queue, followed by None when done. Each input has a single
+    output, or all of its samples if args.sample is set. If translation fails, (chunk id, formatted exception) is put
+    on the queue instead. The worker loads its own translator on context, unless it inherited one from its parent.
+    """
+    chunk_id = -1
+    try:
+        if translator is None:
+            translator = create_translator(args, context, store_attention)
+        elif args.warmup:
+            translator.warmup()
+        cached_translator = create_cached_translator(args, translator) if args.sample is None else None
+        while True:
+            message = input_queue.get()
+            if message is None:
+                break
+            chunk_id, chunk = message
+            trans_inputs = [translator.make_input(sentence_id, line) for sentence_id, line in chunk]
+            if cached_translator is None:
+                trans_outputs = translator.sample_batch(trans_inputs)
+            else:
+                trans_outputs = [[trans_output] for trans_output in cached_translator.translate_batch(trans_inputs)]
+            output_queue.put((chunk_id, list(zip(trans_inputs, trans_outputs))))
+        if cached_translator is not None:
+            logger.info("%s", cached_translator)
+        _log_executor_caches(translator)
+    except Exception:  # pylint: disable=broad-except
+        output_queue.put((chunk_id, traceback.format_exc()))
+    output_queue.put(None)
+
+
+def _setup_contexts(args: argparse.Namespace, exit_stack: ExitStack) -> List[mx.context.Context]:
+    """
+    Returns the contexts to translate on: the CPU, or the requested GPUs. Only a single GPU can be used,
+    unless translating with several workers (--workers).
+    """
+    if args.use_cpu or args.workers == 1:
+        return [_setup_context(args, exit_stack)]
+    num_gpus = get_num_gpus()
+    check_condition(num_gpus >= 1,
+                    "No GPUs found, consider running on the CPU with --use-cpu "
+                    "(note: check depends on nvidia-smi and this could also mean that the nvidia-smi "
+                    "binary isn't on the path).")
+    if args.disable_device_locking:
+        gpu_ids = expand_requested_device_ids(args.device_ids)
+    else:
+        gpu_ids = exit_stack.enter_context(acquire_gpus(args.device_ids, lock_dir=args.lock_dir))
+    logger.info("Device(s): GPU %s", gpu_ids)
+    return [mx.gpu(gpu_id) for gpu_id in gpu_ids]
 
 
 def _setup_context(args, exit_stack):
@@ -128,7 +509,7 @@ def _setup_context(args, exit_stack):
                         "No GPUs found, consider running on the CPU with --use-cpu "
                         "(note: check depends on nvidia-smi and this could also mean that the nvidia-smi "
                         "binary isn't on the path).")
-        check_condition(len(args.device_ids) == 1, "cannot run on multiple devices for now")
+        check_condition(len(args.device_ids) == 1, "cannot run on multiple devices without --workers")
         gpu_id = args.device_ids[0]
         if args.disable_device_locking:
             # without locking and a negative device id we just take the first device
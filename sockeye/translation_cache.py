@@ -0,0 +1,240 @@
+# Copyright 2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You may not
+# use this file except in compliance with the License. A copy of the License
+# is located at
+#
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is distributed on
+# an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+"""
+Caching of translation results.
+"""
+import functools
+import hashlib
+import shelve
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+from . import constants as C
+from . import data_io
+from . import inference
+
+
+def get_fingerprint(translator: inference.Translator) -> str:
+    """
+    Returns a hash of the parameter files of the translator's models and of all settings that affect translation
+    results, such that cached results are only reused by equivalent translators.
+
+    :param translator: Translator.
+    :return: Hex digest.
+    """
+    fingerprint = hashlib.sha1()
+    for model in translator.models:
+        with open(model.params_fname, "rb") as params:
+            for block in iter(lambda: params.read(1 << 20), b""):
+                fingerprint.update(block)
+        fingerprint.update(repr((model.softmax_temperature, model.max_input_len)).encode("utf-8"))
+    settings = (translator.beam_size, translator.ensemble_mode, translator.buckets, translator.store_attention,
+                translator.restrict_lexicon is not None, translator.beam_prune_absolute, translator.beam_prune_relative,
+                translator.max_output_length_num_stds, translator.min_output_length_num_stds, translator.sample)
+    fingerprint.update(repr(settings).encode("utf-8"))
+    if translator.restrict_lexicon is not None:
+        assert translator.restrict_lexicon.lex is not None, "Lexicon has not been created"
+        # results depend on the lexicon entries, top-k and most frequent words of the restricted vocabulary
+        fingerprint.update(translator.restrict_lexicon.lex.tobytes())
+        fingerprint.update(translator.restrict_lexicon.always_allow.tobytes())
+    return fingerprint.hexdigest()
+
+
+class TranslationCache:
+    """
+    Least recently used cache of translation results, optionally backed by a persistent on-disk store.
+    Keys are strings; see CachedTranslator.get_key().
+
+    :param max_size: Maximum number of results held in memory.
+    :param path: Optional path of a persistent store (shelve database), which keeps all results.
+    """
+
+    def __init__(self, max_size: int, path: Optional[str] = None) -> None:
+        self.max_size = max_size
+        self.results = OrderedDict()  # type: OrderedDict
+        self.store = shelve.open(path) if path is not None else None  # type: Optional[shelve.Shelf]
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str, count_miss: bool = True) -> Optional[inference.TranslatorOutput]:
+        """
+        Returns the cached result for key, or None.
+
+        :param key: Cache key.
+        :param count_miss: Whether to count a miss, e.g. False if the key will be looked up again before translating.
+        :return: Cached result or None.
+        """
+        result = self.results.get(key)
+        if result is not None:
+            self.results.move_to_end(key)
+        elif self.store is not None and key in self.store:
+            result = self.store[key]
+            self._add(key, result)
+        if result is not None:
+            self.hits += 1
+        elif count_miss:
+            self.misses += 1
+        return result
+
+    def put(self, key: str, result: inference.TranslatorOutput):
+        """
+        Caches result for key.
+        """
+        self._add(key, result)
+        if self.store is not None:
+            self.store[key] = result
+
+    def _add(self, key: str, result: inference.TranslatorOutput):
+        if self.max_size == 0:
+            return
+        self.results[key] = result
+        self.results.move_to_end(key)
+        while len(self.results) > self.max_size:
+            self.results.popitem(last=False)
+
+    def close(self):
+        """
+        Closes the persistent store, if any.
+        """
+        if self.store is not None:
+            self.store.close()
+            self.store = None
+
+    def __repr__(self):
+        return "TranslationCache(size=%d, hits=%d, misses=%d)" % (len(self.results), self.hits, self.misses)
+
+
+class CachedTranslator:
+    """
+    Translates like a Translator, but translates identical inputs of a batch only once and takes results from
+    a TranslationCache where possible. Inputs are identical if their source token ids are.
+
+    :param translator: Translator.
+    :param cache: Optional result cache. If None, only duplicates within a batch are collapsed.
+    """
+
+    def __init__(self, translator: inference.Translator, cache: Optional[TranslationCache] = None) -> None:
+        self.translator = translator
+        self.batch_size = translator.batch_size
+        self.cache = cache
+        self.fingerprint = get_fingerprint(translator) if cache is not None else ""
+        self.num_collapsed = 0
+
+    def make_input(self, sentence_id: int, sentence: str) -> inference.TranslatorInput:
+        """
+        Returns TranslatorInput from input_string, see Translator.make_input().
+        """
+        return self.translator.make_input(sentence_id, sentence)
+
+    def get_key(self, trans_input: inference.TranslatorInput) -> str:
+        """
+        Returns the cache key of an input: the translator fingerprint and the source token ids.
+
+        :param trans_input: Input.
+        :return: Cache key.
+        """
+        ids = data_io.tokens2ids(trans_input.tokens, self.translator.vocab_source)
+        return "%s %s" % (self.fingerprint, " ".join(map(str, ids)))
+
+    def lookup(self, trans_input: inference.TranslatorInput) -> Optional[inference.TranslatorOutput]:
+        """
+        Returns the cached translation of trans_input, or None.
+        """
+        if self.cache is None:
+            return None
+        result = self.cache.get(self.get_key(trans_input), count_miss=False)
+        return result._replace(id=trans_input.id) if result is not None else None
+
+    def translate(self,
+                  trans_input: inference.TranslatorInput,
+                  deadline: Optional[float] = None) -> inference.TranslatorOutput:
+        """
+        Translates a TranslatorInput and returns a TranslatorOutput.
+        """
+        return self.translate_batch([trans_input], deadline)[0]
+
+    def translate_batch(self,
+                        trans_inputs: List[inference.TranslatorInput],
+                        deadline: Optional[float] = None,
+                        stream: Optional[Callable[[inference.TranslatorInput, List[str]], None]] = None) \
+            -> List[inference.TranslatorOutput]:
+        """
+        Translates a list of TranslatorInputs and returns a list of TranslatorOutputs in the same order.
+        Only inputs that are neither cached nor duplicates of an earlier input of the list are translated.
+        Translations whose search degraded to meet a deadline are not cached.
+        Given a stream callback, the tokens of cached translations are passed to it before translating, and the
+        stable tokens of a translated input are passed on for each of its duplicates.
+
+        :param trans_inputs: List of TranslatorInputs as returned by make_input().
+        :param deadline: Optional time (as returned by time.time()) all translations should be done by.
+        :param stream: Optional callback for the stable tokens of each translation, see Translator.translate_batch().
+        :return: List of translation results.
+        """
+        keys = [self.get_key(trans_input) for trans_input in trans_inputs]
+        results = {}  # type: Dict[str, inference.TranslatorOutput]
+        to_translate = OrderedDict()  # type: OrderedDict
+        duplicates = {}  # type: Dict[str, List[inference.TranslatorInput]]
+        for key, trans_input in zip(keys, trans_inputs):
+            duplicates.setdefault(key, []).append(trans_input)
+            if key in results or key in to_translate:
+                self.num_collapsed += 1
+                continue
+            result = self.cache.get(key) if self.cache is not None else None
+            if result is not None:
+                results[key] = result
+            else:
+                to_translate[key] = trans_input
+        if stream is not None:
+            for key, result in results.items():
+                if result.translation:
+                    for trans_input in duplicates[key]:
+                        stream(trans_input, result.translation.split(C.TOKEN_SEPARATOR))
+        if to_translate:
+            translator_stream = None  # type: Optional[Callable[[inference.TranslatorInput, List[str]], None]]
+            if stream is not None:
+                translator_stream = functools.partial(self._stream_duplicates, stream, duplicates)
+            trans_outputs = self.translator.translate_batch(list(to_translate.values()), deadline,
+                                                            stream=translator_stream)
+            for key, result in zip(to_translate.keys(), trans_outputs):
+                results[key] = result
+                if self.cache is not None and result.degradation == C.DEGRADATION_NONE:
+                    self.cache.put(key, result)
+        return [results[key]._replace(id=trans_input.id) for key, trans_input in zip(keys, trans_inputs)]
+
+    def sample_batch(self,
+                     trans_inputs: List[inference.TranslatorInput],
+                     deadline: Optional[float] = None) -> List[List[inference.TranslatorOutput]]:
+        """
+        Returns all translations of each input, see Translator.sample_batch(). Samples of identical inputs differ,
+        so inputs are neither collapsed nor cached.
+
+        :param trans_inputs: List of TranslatorInputs as returned by make_input().
+        :param deadline: Optional time (as returned by time.time()) all translations should be done by.
+        :return: For each input, list of translation results.
+        """
+        return self.translator.sample_batch(trans_inputs, deadline)
+
+    def _stream_duplicates(self,
+                           stream: Callable[[inference.TranslatorInput, List[str]], None],
+                           duplicates: Dict[str, List[inference.TranslatorInput]],
+                           trans_input: inference.TranslatorInput,
+                           tokens: List[str]):
+        """
+        Passes stable tokens of a translated input to stream for each input of the batch that is identical to it.
+        """
+        for duplicate in duplicates[self.get_key(trans_input)]:
+            stream(duplicate, tokens)
+
+    def __repr__(self):
+        return "CachedTranslator(collapsed=%d, cache=%s)" % (self.num_collapsed, self.cache)
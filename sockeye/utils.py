@@ -203,21 +203,35 @@ def smallest_k(matrix: np.ndarray, k: int,
 
 
 def smallest_k_mx(matrix: mx.nd.NDArray, k: int,
-                  only_first_row: bool = False) -> Tuple[Tuple[np.ndarray, np.ndarray], np.ndarray]:
+                  only_first_row: bool = False) -> Tuple[Tuple[mx.nd.NDArray, mx.nd.NDArray], mx.nd.NDArray]:
     """
-    Find the smallest elements in a NDarray.
+    Find the smallest elements in a NDarray. All computation stays on the context of matrix.
 
     :param matrix: Any matrix.
     :param k: The number of smallest elements to return.
     :param only_first_row: If True the search is constrained to the first row of the matrix.
-    :return: The row indices, column indices and values of the k smallest items in matrix.
+    :return: The row indices, column indices and values of the k smallest items in matrix (as NDArrays, ascending).
     """
     if only_first_row:
-        matrix = mx.nd.reshape(matrix[0], shape=(1, -1))
+        matrix = mx.nd.slice_axis(matrix, axis=0, begin=0, end=1)
 
     values, indices = mx.nd.topk(matrix, axis=None, k=k, ret_typ='both', is_ascend=True)
 
-    return np.unravel_index(indices.astype(np.int32).asnumpy(), matrix.shape), values
+    return unravel_index_mx(indices, matrix.shape[1]), values
+
+
+def unravel_index_mx(indices: mx.nd.NDArray, num_cols: int) -> Tuple[mx.nd.NDArray, mx.nd.NDArray]:
+    """
+    Converts (float) indices into a flattened matrix with num_cols columns into row and column indices.
+    Results are exact as long as the indices are representable in float32 (< 2^24).
+
+    :param indices: Flat indices.
+    :param num_cols: Number of columns of the matrix.
+    :return: Row indices, column indices (int32).
+    """
+    rows = mx.nd.floor(indices / num_cols)
+    cols = indices - rows * num_cols
+    return rows, mx.nd.cast(cols, dtype='int32')
 
 
 def plot_attention(attention_matrix: np.ndarray, source_tokens: List[str], target_tokens: List[str], filename: str):
@@ -293,10 +307,36 @@ def get_alignments(attention_matrix: np.ndarray, threshold: float = .9) -> Itera
     :param threshold: The threshold for including an alignment link in the result.
     :return: Generator yielding strings of the form 0-0, 0-1, 2-1, 2-2, 3-4...
     """
-    for src_idx in range(attention_matrix.shape[1]):
-        for trg_idx in range(attention_matrix.shape[0]):
-            if attention_matrix[trg_idx, src_idx] > threshold:
-                yield (src_idx, trg_idx)
+    # transpose to yield links ordered by source index first
+    src_indices, trg_indices = np.nonzero(np.asarray(attention_matrix).T > threshold)
+    for src_idx, trg_idx in zip(src_indices.tolist(), trg_indices.tolist()):
+        yield (src_idx, trg_idx)
+
+
+def get_alignments_batch(attention_matrices: np.ndarray,
+                         source_lengths: np.ndarray,
+                         target_lengths: np.ndarray,
+                         threshold: float = .9) -> List[List[Tuple[int, int]]]:
+    """
+    Returns hard alignments for a batch of attention matrices (batch_size, target_length, source_length), as
+    get_alignments does for each matrix. Positions beyond the source and target lengths of a matrix are ignored.
+    Links of the whole batch are found with a single call to np.nonzero.
+
+    :param attention_matrices: The attention matrices.
+    :param source_lengths: Source length of each matrix. Shape: (batch_size,).
+    :param target_lengths: Target length of each matrix. Shape: (batch_size,).
+    :param threshold: The threshold for including an alignment link in the result.
+    :return: List of (source index, target index) links ordered by source index first, for each matrix.
+    """
+    batch_size, target_length, source_length = attention_matrices.shape
+    mask = attention_matrices > threshold
+    mask &= np.arange(target_length)[None, :, None] < np.asarray(target_lengths)[:, None, None]
+    mask &= np.arange(source_length)[None, None, :] < np.asarray(source_lengths)[:, None, None]
+    # transpose to find links ordered by source index first
+    batch_indices, src_indices, trg_indices = np.nonzero(mask.transpose(0, 2, 1))
+    splits = np.cumsum(np.bincount(batch_indices, minlength=batch_size))[:-1]
+    return [list(zip(src.tolist(), trg.tolist()))
+            for src, trg in zip(np.split(src_indices, splits), np.split(trg_indices, splits))]
 
 
 def average_arrays(arrays: List[mx.nd.NDArray]) -> mx.nd.NDArray:
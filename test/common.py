@@ -23,6 +23,8 @@ import numpy as np
 
 import sockeye.bleu
 import sockeye.constants as C
+import sockeye.encode
+import sockeye.score
 import sockeye.train
 import sockeye.translate
 import sockeye.utils
@@ -103,6 +105,10 @@ _TRAIN_PARAMS_COMMON = "--use-cpu --max-seq-len {max_len} --source {train_source
 
 _TRANSLATE_PARAMS_COMMON = "--use-cpu --models {model} --input {input} --output {output}"
 
+_SCORE_PARAMS_COMMON = "--use-cpu --model {model} --source {source} --target {target} --output {output}"
+
+_ENCODE_PARAMS_COMMON = "--use-cpu --model {model} --input {input} --output {output}"
+
 
 def run_train_translate(train_params: str,
                         translate_params: str,
@@ -116,7 +122,7 @@ def run_train_translate(train_params: str,
     Train a model and translate a dev set.  Report perplexity and BLEU.
 
     :param train_params: Command line args for model training.
-    :param translate_params: Command line args for translation.
+    :param translate_params: Command line args for translation. {model} is replaced by the path of the trained model.
     :param perplexity_thresh: Maximum perplexity for success
     :param bleu_thresh: Minimum BLEU score for success
     :return: (perplexity, bleu)
@@ -142,10 +148,60 @@ def run_train_translate(train_params: str,
                                    _TRANSLATE_PARAMS_COMMON.format(model=model_path,
                                                                    input=dev_source_path,
                                                                    output=out_path),
-                                   translate_params)
+                                   translate_params.format(model=model_path))
         with patch.object(sys, "argv", params.split()):
             sockeye.translate.main()
 
+        # Translate corpus with streamed output
+        if "--sample" not in translate_params and "--workers" not in translate_params:
+            stream_out_path = os.path.join(work_dir, "out.stream.txt")
+            params = "{} {} {} --output-type translation_stream".format(
+                sockeye.translate.__file__,
+                _TRANSLATE_PARAMS_COMMON.format(model=model_path, input=dev_source_path, output=stream_out_path),
+                translate_params.format(model=model_path))
+            with patch.object(sys, "argv", params.split()):
+                sockeye.translate.main()
+            # streamed tokens add up to the translations
+            with open(out_path) as out, open(stream_out_path) as stream_out:
+                assert stream_out.readlines() == out.readlines()
+
+        # Score and align corpus, followed by an empty sentence pair
+        score_source_path = os.path.join(work_dir, "score.src")
+        score_target_path = os.path.join(work_dir, "score.tgt")
+        for path, score_path in [(dev_source_path, score_source_path), (dev_target_path, score_target_path)]:
+            with open(path) as data, open(score_path, "w") as score_data:
+                score_data.write(data.read() + "\n")
+        for output_type in ["score", "alignment"]:
+            score_out_path = os.path.join(work_dir, "%s.txt" % output_type)
+            params = "{} {} --output-type {}".format(sockeye.score.__file__,
+                                                     _SCORE_PARAMS_COMMON.format(model=model_path,
+                                                                                 source=score_source_path,
+                                                                                 target=score_target_path,
+                                                                                 output=score_out_path),
+                                                     output_type)
+            with patch.object(sys, "argv", params.split()):
+                sockeye.score.main()
+            with open(score_out_path) as scores, open(score_target_path) as references:
+                score_lines = scores.readlines()
+                assert len(score_lines) == len(references.readlines())
+            # the empty sentence pair is not scored
+            assert score_lines[-1] == ("nan\n" if output_type == "score" else "\n")
+
+        # Encode corpus
+        embeddings_path = os.path.join(work_dir, "embeddings.npy")
+        params = "{} {}".format(sockeye.encode.__file__,
+                                _ENCODE_PARAMS_COMMON.format(model=model_path,
+                                                             input=dev_source_path,
+                                                             output=embeddings_path))
+        with patch.object(sys, "argv", params.split()):
+            sockeye.encode.main()
+        embeddings = np.load(embeddings_path, mmap_mode='r')
+        ids = np.load("%s.%s" % (embeddings_path, C.ENCODING_IDS_SUFFIX))
+        with open(dev_source_path) as source:
+            assert embeddings.shape[0] == len(source.readlines())
+        assert sorted(ids.tolist()) == list(range(embeddings.shape[0]))
+        assert np.isfinite(embeddings).all()
+
         # Measure perplexity
         checkpoints = sockeye.utils.read_metrics_points(path=os.path.join(model_path, C.METRICS_NAME),
                                                         model_path=model_path,
@@ -133,25 +133,90 @@ def test_training_arg(test_params, expected_params):
 
 @pytest.mark.parametrize("test_params, expected_params", [
     ('--models m1 m2 m3', dict(input=None, output=None, models=['m1', 'm2', 'm3'],
-                               checkpoints=None, beam_size=5, ensemble_mode='linear',
-                               max_input_len=None, softmax_temperature=None, output_type='translation',
-                               sure_align_threshold=0.9)),
+                               checkpoints=None, beam_size=5, batch_size=1, sample=None, num_samples=1, seed=None,
+                               top_k_engine='numpy',
+                               restrict_lexicon=None, restrict_lexicon_topk=50, restrict_lexicon_frequent=500,
+                               beam_prune_absolute=None, beam_prune_relative=None, beam_compact=False,
+                               max_output_length_num_stds=2, min_output_length_num_stds=None,
+                               bucket_width=10, warmup=False, time_budget=None, sort_window=0, workers=1,
+                               cache_size=0, cache_path=None,
+                               max_bucket_executors=None, max_executor_memory=None,
+                               ensemble_mode='linear', ensemble_fused=False, max_input_len=None,
+                               softmax_temperature=None,
+                               output_type='translation', sure_align_threshold=0.9, flush_every=0)),
     ('--input test_input --output test_output --models m1 m2 m3 --checkpoints 1 2 3 --beam-size 10 '
-     '--ensemble-mode log_linear --max-input-len 10 --softmax-temperature 1.0 '
-     '--output-type translation_with_alignments --sure-align-threshold 1.0',
+     '--batch-size 4 --sample 10 --num-samples 3 --seed 1 --top-k-engine mxnet --restrict-lexicon lex '
+     '--restrict-lexicon-topk 10 '
+     '--restrict-lexicon-frequent 0 --beam-prune-absolute 2.5 --beam-prune-relative 0.1 --beam-compact '
+     '--max-output-length-num-stds 1.5 --min-output-length-num-stds 1 --bucket-width 5 --warmup '
+     '--time-budget 50 --sort-window 100 --workers 4 --cache-size 100 --cache-path cache --max-bucket-executors 4 '
+     '--max-executor-memory 512 '
+     '--ensemble-mode log_linear --ensemble-fused --max-input-len 10 --softmax-temperature 1.0 '
+     '--output-type translation_with_alignments --sure-align-threshold 1.0 --flush-every 10',
      dict(input='test_input', output='test_output', models=['m1', 'm2', 'm3'],
-          checkpoints=[1, 2, 3], beam_size=10, ensemble_mode='log_linear',
-          max_input_len=10, softmax_temperature=1.0,
-          output_type='translation_with_alignments', sure_align_threshold=1.0)),
+          checkpoints=[1, 2, 3], beam_size=10, batch_size=4, sample=10, num_samples=3, seed=1, top_k_engine='mxnet',
+          restrict_lexicon='lex', restrict_lexicon_topk=10, restrict_lexicon_frequent=0,
+          beam_prune_absolute=2.5, beam_prune_relative=0.1, beam_compact=True,
+          max_output_length_num_stds=1.5, min_output_length_num_stds=1.0, bucket_width=5, warmup=True,
+          time_budget=50.0, sort_window=100, workers=4, cache_size=100, cache_path='cache',
+          max_bucket_executors=4, max_executor_memory=512,
+          ensemble_mode='log_linear', ensemble_fused=True, max_input_len=10, softmax_temperature=1.0,
+          output_type='translation_with_alignments', sure_align_threshold=1.0, flush_every=10)),
     ('-i test_input -o test_output -m m1 m2 m3 -c 1 2 3 -b 10 -n 10',
      dict(input='test_input', output='test_output', models=['m1', 'm2', 'm3'],
-          checkpoints=[1, 2, 3], beam_size=10, ensemble_mode='linear',
-          max_input_len=10, softmax_temperature=None, output_type='translation', sure_align_threshold=0.9))
+          checkpoints=[1, 2, 3], beam_size=10, batch_size=1, sample=None, num_samples=1, seed=None,
+          top_k_engine='numpy',
+          restrict_lexicon=None, restrict_lexicon_topk=50, restrict_lexicon_frequent=500,
+          beam_prune_absolute=None, beam_prune_relative=None, beam_compact=False,
+          max_output_length_num_stds=2, min_output_length_num_stds=None, bucket_width=10, warmup=False,
+          time_budget=None, sort_window=0, workers=1, cache_size=0, cache_path=None, max_bucket_executors=None, max_executor_memory=None,
+          ensemble_mode='linear', ensemble_fused=False, max_input_len=10, softmax_temperature=None,
+          output_type='translation', sure_align_threshold=0.9, flush_every=0))
 ])
 def test_inference_args(test_params, expected_params):
     _test_args(test_params, expected_params, arguments.add_inference_args)
 
 
+@pytest.mark.parametrize("test_params, expected_params", [
+    # no options of the translation CLI, such as input and output
+    ('--models m',
+     dict(models=['m'], checkpoints=None, beam_size=5, batch_size=1, sample=None, num_samples=1, seed=None,
+          top_k_engine='numpy', restrict_lexicon=None, restrict_lexicon_topk=50, restrict_lexicon_frequent=500,
+          beam_prune_absolute=None, beam_prune_relative=None, beam_compact=False,
+          max_output_length_num_stds=2, min_output_length_num_stds=None, bucket_width=10, warmup=False,
+          time_budget=None, cache_size=0, cache_path=None, max_bucket_executors=None, max_executor_memory=None,
+          ensemble_mode='linear', ensemble_fused=False, max_input_len=None, softmax_temperature=None))
+])
+def test_translator_args(test_params, expected_params):
+    _test_args(test_params, expected_params, arguments.add_translator_args)
+
+
+@pytest.mark.parametrize("test_params, expected_params", [
+    ('--model m --source s --target t',
+     dict(model='m', checkpoint=None, source='s', target='t', output=None, batch_size=64, bucket_width=10,
+          max_seq_len=None, length_normalize=False, output_type='score', sure_align_threshold=0.9)),
+    ('-m m -c 3 -s s -t t -o o -b 16 --bucket-width 5 --max-seq-len 50 --length-normalize '
+     '--output-type alignment --sure-align-threshold 0.5',
+     dict(model='m', checkpoint=3, source='s', target='t', output='o', batch_size=16, bucket_width=5,
+          max_seq_len=50, length_normalize=True, output_type='alignment', sure_align_threshold=0.5))
+])
+def test_scoring_args(test_params, expected_params):
+    _test_args(test_params, expected_params, arguments.add_scoring_args)
+
+
+@pytest.mark.parametrize("test_params, expected_params", [
+    ('--model m --input i --output o',
+     dict(model='m', checkpoint=None, input='i', output='o', batch_size=256, bucket_width=10, max_seq_len=None,
+          sort_window=100000, pooling='mean', output_dtype='float32')),
+    ('-m m -c 3 -i i -o o -b 16 --bucket-width 5 --max-seq-len 50 --sort-window 0 --pooling last '
+     '--output-dtype float16',
+     dict(model='m', checkpoint=3, input='i', output='o', batch_size=16, bucket_width=5, max_seq_len=50,
+          sort_window=0, pooling='last', output_dtype='float16'))
+])
+def test_encoding_args(test_params, expected_params):
+    _test_args(test_params, expected_params, arguments.add_encoding_args)
+
+
 def _test_args(test_params, expected_params, args_func):
     test_parser = argparse.ArgumentParser()
     args_func(test_parser)
@@ -41,6 +41,7 @@ def test_attention(attention_type,
                                                          layer_normalization=False,
                                                          config_coverage=None)
     attention = sockeye.attention.get_attention(config_attention, max_seq_len=source_seq_len)
+    assert not attention.has_dynamic_source
 
     attention_state = attention.get_initial_state(source_length, source_seq_len)
     attention_func = attention.on(source, source_length, source_seq_len)
@@ -67,6 +68,54 @@ def test_attention(attention_type,
     assert np.isclose(attention_prob_result, np.asarray([[0.5, 0.5, 0.]])).all()
 
 
+@pytest.mark.parametrize("attention_type", [C.ATT_BILINEAR, C.ATT_DOT, C.ATT_MLP])
+def test_attention_precomputed_source_projection(attention_type,
+                                                 batch_size=2,
+                                                 encoder_num_hidden=4,
+                                                 decoder_num_hidden=4):
+    source = mx.sym.Variable("source")
+    source_length = mx.sym.Variable("source_length")
+    source_projected = mx.sym.Variable("source_projected")
+    source_seq_len = 3
+
+    config_attention = sockeye.attention.AttentionConfig(type=attention_type,
+                                                         num_hidden=3,
+                                                         input_previous_word=False,
+                                                         rnn_num_hidden=encoder_num_hidden,
+                                                         layer_normalization=False,
+                                                         config_coverage=None)
+    attention = sockeye.attention.get_attention(config_attention, max_seq_len=source_seq_len)
+    assert attention.source_projection_num_hidden is not None
+
+    attention_input = attention.make_input(0, mx.sym.Variable("word_vec_prev"), mx.sym.Variable("decoder_state"))
+    attention_state = attention.get_initial_state(source_length, source_seq_len)
+    state = attention.on(source, source_length, source_seq_len)(attention_input, attention_state)
+    state_precomputed = attention.on(source, source_length, source_seq_len,
+                                     source_projected=source_projected)(attention_input, attention_state)
+    projection = attention.project_source(source, source_seq_len)
+
+    shapes = dict(source=(batch_size, source_seq_len, encoder_num_hidden),
+                  source_length=(batch_size,),
+                  decoder_state=(batch_size, decoder_num_hidden))
+    executor = mx.sym.Group([state.context, state.probs, projection]).simple_bind(ctx=mx.cpu(), **shapes)
+    for name, arr in executor.arg_dict.items():
+        arr[:] = gaussian_vector(shape=arr.shape)
+    executor.arg_dict["source_length"][:] = np.asarray([2, 3])
+    context_result, probs_result, projection_result = [out.asnumpy() for out in executor.forward()]
+    assert projection_result.shape == (batch_size, source_seq_len, attention.source_projection_num_hidden)
+
+    executor_precomputed = mx.sym.Group([state_precomputed.context, state_precomputed.probs]).simple_bind(
+        ctx=mx.cpu(), source_projected=projection_result.shape, **shapes)
+    for name, arr in executor_precomputed.arg_dict.items():
+        if name in executor.arg_dict:
+            arr[:] = executor.arg_dict[name]
+    executor_precomputed.arg_dict["source_projected"][:] = projection_result
+    context_precomputed_result, probs_precomputed_result = [out.asnumpy() for out in executor_precomputed.forward()]
+
+    assert np.allclose(context_result, context_precomputed_result)
+    assert np.allclose(probs_result, probs_precomputed_result)
+
+
 coverage_cases = [("gru", 10), ("tanh", 4), ("count", 1), ("sigmoid", 1), ("relu", 30)]
 
 
@@ -92,6 +141,7 @@ def test_coverage_attention(attention_coverage_type,
                                                          layer_normalization=False,
                                                          config_coverage=config_coverage)
     attention = sockeye.attention.get_attention(config_attention, max_seq_len=source_seq_len)
+    assert attention.has_dynamic_source
 
     attention_state = attention.get_initial_state(source_length, source_seq_len)
     attention_func = attention.on(source, source_length, source_seq_len)
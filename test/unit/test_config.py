@@ -17,6 +17,8 @@ import os
 import pytest
 
 from sockeye import config
+from sockeye import constants as C
+from sockeye import model
 
 
 class ConfigTest(config.Config):
@@ -126,3 +128,14 @@ def test_copy():
     assert c1 != mod_copy_c1
 
 
+def test_model_config_defaults():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        fname = os.path.join(tmp_dir, "config")
+        # configuration of a model trained before length ratio statistics were stored
+        with open(fname, "w") as f:
+            f.write("!ModelConfig\nmax_seq_len: 10\n")
+        c = config.Config.load(fname)
+        assert isinstance(c, model.ModelConfig)
+        assert c.max_seq_len == 10
+        assert c.length_ratio_mean == C.TARGET_MAX_LENGTH_FACTOR
+        assert c.length_ratio_std == 0.0
@@ -64,6 +64,17 @@ def test_get_bucket(buckets, length, expected_bucket):
     assert bucket == expected_bucket
 
 
+length_statistics_tests = [([[1, 2], [1, 2, 3, 4]], [[1, 2], [1, 2]], 0.75, 0.25),
+                           ([[1]], [[1, 2, 3]], 3.0, 0.0)]
+
+
+@pytest.mark.parametrize("source_sentences, target_sentences, expected_mean, expected_std", length_statistics_tests)
+def test_length_statistics(source_sentences, target_sentences, expected_mean, expected_std):
+    mean, std = sockeye.data_io.length_statistics(source_sentences, target_sentences)
+    assert mean == pytest.approx(expected_mean)
+    assert std == pytest.approx(expected_std)
+
+
 get_tokens_tests = [("this is a line  \n", ["this", "is", "a", "line"]),
                     (" a  \tb \r \n", ["a", "b"])]
 
@@ -107,3 +118,28 @@ def test_get_parallel_bucket(buckets, source_length, target_length, expected_buc
     bucket_index, bucket = sockeye.data_io.get_parallel_bucket(buckets, source_length, target_length)
     assert bucket_index == expected_bucket_index
     assert bucket == expected_bucket
+
+
+def test_parallel_bucket_sentence_iter_pad():
+    source_sentences = [[1, 2], [3], [4, 5, 6, 7, 8], [9, 10, 11, 12, 13, 14, 15, 16, 17]]
+    target_sentences = [[1], [2, 3], [4, 5, 6], [7]]
+    data_iter = sockeye.data_io.ParallelBucketSentenceIter(source_sentences, target_sentences,
+                                                           buckets=[(4, 4), (8, 8)], batch_size=2,
+                                                           eos_id=10, pad_id=C.PAD_ID, unk_id=11,
+                                                           fill_up='pad', shuffle=False)
+    batches = list(data_iter)
+    assert [batch.index.tolist() for batch in batches] == [[0, 1], [2, -1]]
+    assert [batch.pad for batch in batches] == [0, 1]
+    # the last source sentence does not fit into any bucket
+    assert sorted(i for batch in batches for i in batch.index if i >= 0) == [0, 1, 2]
+
+
+def test_parallel_bucket_sentence_iter_empty_source():
+    source_sentences = [[1, 2], [], [3]]
+    target_sentences = [[1], [2, 3], [4, 5]]
+    data_iter = sockeye.data_io.ParallelBucketSentenceIter(source_sentences, target_sentences,
+                                                           buckets=[(4, 4)], batch_size=2,
+                                                           eos_id=10, pad_id=C.PAD_ID, unk_id=11,
+                                                           fill_up='pad', shuffle=False)
+    # the pair with an empty source sentence is discarded
+    assert sorted(i for batch in data_iter for i in batch.index if i >= 0) == [0, 2]
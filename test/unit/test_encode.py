@@ -0,0 +1,61 @@
+# Copyright 2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You may not
+# use this file except in compliance with the License. A copy of the License
+# is located at
+#
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is distributed on
+# an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+import unittest.mock
+
+import mxnet as mx
+import numpy as np
+import pytest
+
+import sockeye.constants as C
+import sockeye.encode
+import sockeye.encoding
+
+
+@pytest.mark.parametrize("sort_window, expected_ids", [(0, [0, 1, 2, 3, 4]),
+                                                       (5, [3, 1, 4, 0, 2])])
+def test_encode_lines(sort_window, expected_ids):
+    lines = ["a b c d", "a b", "a b c d e", "", "a b c"]
+    vocab = {C.UNK_SYMBOL: 1, "a": 2, "b": 3}
+    encoding_model = unittest.mock.Mock(spec=sockeye.encoding.EncodingModel)
+    encoding_model.batch_size = 2
+    encoding_model.max_seq_len = 4
+    # embedding of a sentence: its length and its first word id
+    encoding_model.encode_batch.side_effect = lambda sentences: np.asarray(
+        [[len(sentence), sentence[0] if sentence else 0] for sentence in sentences], dtype='float32')
+    embeddings = np.zeros((len(lines), 2), dtype='float16')
+    ids = np.zeros((len(lines),), dtype='int64')
+
+    num_encoded, num_truncated = sockeye.encode.encode_lines(encoding_model, vocab, lines, embeddings, ids,
+                                                             sort_window)
+
+    assert num_encoded == 5
+    assert num_truncated == 1
+    assert encoding_model.encode_batch.call_count == 3
+    assert ids.tolist() == expected_ids
+    for row, line_id in enumerate(ids):
+        num_tokens = len(lines[line_id].split())
+        assert embeddings[row].tolist() == [num_tokens, 2 if num_tokens else 0]
+
+
+@pytest.mark.parametrize("pooling, expected_embeddings", [(C.POOLING_MEAN, [[2., 20.], [5., 50.]]),
+                                                          (C.POOLING_MAX, [[3., 30.], [5., 50.]]),
+                                                          (C.POOLING_LAST, [[3., 30.], [5., 50.]])])
+def test_pool(pooling, expected_embeddings):
+    # data: (seq_len=3, batch_size=2, num_hidden=2)
+    data = mx.nd.array([[[1., 10.], [5., 50.]],
+                        [[2., 20.], [-9., -9.]],
+                        [[3., 30.], [-9., -9.]]])
+    data_length = mx.nd.array([3, 1])
+    symbol = sockeye.encoding.pool(mx.sym.Variable("data"), mx.sym.Variable("data_length"), pooling)
+    embeddings = symbol.eval(ctx=mx.cpu(), data=data, data_length=data_length)[0]
+    assert np.allclose(embeddings.asnumpy(), np.asarray(expected_embeddings))
@@ -0,0 +1,149 @@
+# Copyright 2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You may not
+# use this file except in compliance with the License. A copy of the License
+# is located at
+#
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is distributed on
+# an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+import mxnet as mx
+import numpy as np
+import pytest
+
+import sockeye.inference
+
+
+def _get_bucketing_module(default_bucket_key: int) -> mx.mod.BucketingModule:
+    def sym_gen(bucket_key):
+        data = mx.sym.Variable('data')
+        return mx.sym.sum(data * 2, axis=1), ['data'], None
+
+    module = mx.mod.BucketingModule(sym_gen=sym_gen, default_bucket_key=default_bucket_key, context=mx.cpu())
+    module.bind(data_shapes=[mx.io.DataDesc(name='data', shape=(1, default_bucket_key))],
+                for_training=False, grad_req='null')
+    module.init_params()
+    return module
+
+
+def _data_shapes(bucket_key: int):
+    return [mx.io.DataDesc(name='data', shape=(1, bucket_key))]
+
+
+def test_bucket_executor_cache_lru():
+    module = _get_bucketing_module(10)
+    cache = sockeye.inference.BucketExecutorCache(module, max_size=3)
+    assert list(cache.memory) == [10]
+
+    for bucket_key in [2, 4, 2, 6, 8]:
+        cache.switch_bucket(bucket_key, _data_shapes(bucket_key))
+
+    # 4 and then 2 are evicted as least recently used buckets, the default bucket is kept
+    assert list(cache.memory) == [10, 6, 8]
+    assert set(module._buckets) == set(cache.memory)
+    assert (cache.hits, cache.misses, cache.evictions) == (1, 4, 2)
+
+    # evicted buckets are bound again on demand and still compute correct results
+    cache.switch_bucket(4, _data_shapes(4))
+    module.forward(mx.io.DataBatch(data=[mx.nd.ones((1, 4))], bucket_key=4, provide_data=_data_shapes(4)),
+                   is_train=False)
+    assert module.get_outputs()[0].asscalar() == 8
+    assert cache.misses == 5
+
+
+def test_bucket_executor_cache_unlimited():
+    module = _get_bucketing_module(10)
+    cache = sockeye.inference.BucketExecutorCache(module)
+    for bucket_key in [2, 4, 6, 2]:
+        cache.switch_bucket(bucket_key, _data_shapes(bucket_key))
+    assert set(cache.memory) == {2, 4, 6, 10}
+    assert (cache.hits, cache.misses, cache.evictions) == (1, 3, 0)
+
+
+def test_model_state_advance():
+    hidden_input, state_input, word_input = mx.nd.zeros((2, 3)), mx.nd.zeros((2, 4)), mx.nd.zeros((2,))
+    state = sockeye.inference.ModelState(bucket_key=5,
+                                         prev_target_word_id=word_input,
+                                         source_encoded=mx.nd.zeros((2, 5, 3)),
+                                         source_dynamic=None,
+                                         source_length=mx.nd.array([5, 4]),
+                                         decoder_hidden=mx.nd.ones((2, 3)),
+                                         decoder_states=[mx.nd.ones((2, 4)) * 2])
+    state.inputs = (word_input, None, hidden_input, [state_input])
+
+    state.advance(mx.nd.array([7, 9]))
+
+    # next inputs are written into the bound input arrays without reordering rows
+    assert state.prev_target_word_id is word_input
+    assert state.decoder_hidden is hidden_input
+    assert state.decoder_states[0] is state_input
+    assert word_input.asnumpy().tolist() == [7, 9]
+    assert (hidden_input.asnumpy() == 1).all()
+    assert (state_input.asnumpy() == 2).all()
+
+
+def test_model_state_select_rows():
+    word_input = mx.nd.array([3, 4])
+    state = sockeye.inference.ModelState(bucket_key=5,
+                                         prev_target_word_id=word_input,
+                                         source_encoded=mx.nd.array([[[1]], [[2]]]),
+                                         source_dynamic=None,
+                                         source_length=mx.nd.array([5, 4]),
+                                         decoder_hidden=mx.nd.array([[1, 1], [2, 2]]),
+                                         decoder_states=[mx.nd.array([[1], [2]])])
+    state.inputs = (word_input, None, state.decoder_hidden, state.decoder_states)
+
+    selected = state.select_rows(mx.nd.array([1, 1, 1]))
+
+    assert selected.inputs is None and selected.executor is None
+    assert selected.prev_target_word_id.asnumpy().tolist() == [4, 4, 4]
+    assert selected.source_length.asnumpy().tolist() == [4, 4, 4]
+    assert selected.decoder_hidden.asnumpy().tolist() == [[2, 2]] * 3
+    assert selected.decoder_states[0].asnumpy().tolist() == [[2]] * 3
+    # the original state is not modified
+    assert state.inputs is not None
+    assert state.prev_target_word_id is word_input
+    assert state.decoder_hidden.shape == (2, 2)
+
+
+def test_prefix_cache():
+    cache = sockeye.inference.PrefixCache(max_size=3)
+    source = ("a", "b")
+    assert cache.lookup(source, ("x",)) == (0, None)
+
+    states = [sockeye.inference.PrefixState(model_states=[], neg_logprob=float(i), attention_matrix=None)
+              for i in range(4)]
+    cache.put(source, (), states[0])
+    cache.put(source, ("x",), states[1])
+    cache.put(source, ("x", "y"), states[2])
+
+    # the longest cached prefix is found
+    assert cache.lookup(source, ("x", "y", "z")) == (2, states[2])
+    assert cache.lookup(source, ("x", "z")) == (1, states[1])
+    assert cache.lookup(source, ("z",)) == (0, states[0])
+    assert cache.lookup(("a",), ("x",)) == (0, None)
+
+    # the least recently used state is evicted
+    cache.put(source, ("y",), states[3])
+    assert len(cache) == 3
+    assert cache.lookup(source, ("x", "y")) == (1, states[1])
+
+
+@pytest.mark.parametrize("num_steps, rows, first_step, expected", [
+    # both rows of step 1 extend the first row of step 0
+    (2, [0, 1], 0, (1, [5])),
+    (2, [0, 1], 1, (1, [])),
+    (3, [0, 1], 1, (1, [])),
+    (3, [1, 1], 0, (3, [5, 7, 3])),
+    (3, [0], 1, (3, [8, 9])),
+])
+def test_get_stable_words(num_steps, rows, first_step, expected):
+    best_hyp_indices_history = [np.array([0, 0]), np.array([0, 0]), np.array([1, 0])]
+    best_word_indices_history = [np.array([5, 6]), np.array([7, 8]), np.array([9, 3])]
+    assert sockeye.inference.Translator._get_stable_words(best_hyp_indices_history[:num_steps],
+                                                          best_word_indices_history[:num_steps],
+                                                          np.array(rows), first_step) == expected
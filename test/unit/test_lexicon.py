@@ -0,0 +1,46 @@
+# Copyright 2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You may not
+# use this file except in compliance with the License. A copy of the License
+# is located at
+#
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is distributed on
+# an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+import numpy as np
+
+import sockeye.constants as C
+import sockeye.lexicon
+
+
+def test_topk_lexicon(tmpdir):
+    vocab_source = {symbol: i for i, symbol in enumerate(C.VOCAB_SYMBOLS + ["a", "b", "c"])}
+    vocab_target = {symbol: i for i, symbol in enumerate(C.VOCAB_SYMBOLS + ["x", "y", "z", "w"])}
+    lexicon_path = tmpdir.join("lexicon")
+    lexicon_path.write("a\tx\t-0.1\n"
+                       "a\ty\t-3.0\n"
+                       "a\tz\t-2.0\n"
+                       "b\tw\t-0.5\n"
+                       "b\tunknown\t-0.1\n"
+                       "unknown\tx\t-0.1\n")
+
+    lexicon = sockeye.lexicon.TopKLexicon(vocab_source, vocab_target)
+    lexicon.create(str(lexicon_path), k=2)
+    # a -> x, z (y is pruned); b -> w; c -> nothing
+    assert lexicon.lex.shape == (len(vocab_source), 2)
+    assert lexicon.lex[vocab_source["a"]].tolist() == [vocab_target["x"], vocab_target["z"]]
+    assert lexicon.lex[vocab_source["b"]].tolist() == [vocab_target["w"], C.PAD_ID]
+
+    special_ids = [vocab_target[symbol] for symbol in C.VOCAB_SYMBOLS]
+    src_ids = np.array([[vocab_source["a"], vocab_source["c"], C.PAD_ID]])
+    assert lexicon.get_trg_ids(src_ids).tolist() == sorted(special_ids + [vocab_target["x"], vocab_target["z"]])
+    src_ids = np.array([[vocab_source["c"]]])
+    assert lexicon.get_trg_ids(src_ids).tolist() == sorted(special_ids)
+
+    # the most frequent target words are always allowed
+    lexicon.create(str(lexicon_path), k=2, num_most_frequent=len(C.VOCAB_SYMBOLS) + 1)
+    assert lexicon.get_trg_ids(src_ids).tolist() == sorted(special_ids + [vocab_target["x"]])
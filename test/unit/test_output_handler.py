@@ -13,6 +13,7 @@
 
 import pytest
 import io
+import unittest.mock
 import numpy as np
 from sockeye.inference import TranslatorInput, TranslatorOutput
 import sockeye.output_handler
@@ -51,3 +52,45 @@ stream_handler_tests = [(sockeye.output_handler.StringOutputHandler(io.StringIO(
 def test_stream_output_handler(handler, translation_input, translation_output, expected_string):
     handler.handle(translation_input, translation_output)
     assert handler.stream.getvalue() == expected_string
+
+
+@pytest.mark.parametrize("output_type, expected", [("translation", False),
+                                                   ("translation_stream", False),
+                                                   ("translation_with_alignments", True),
+                                                   ("align_plot", True),
+                                                   ("align_text", True)])
+def test_output_handler_reports_attention(output_type, expected):
+    handler = sockeye.output_handler.get_output_handler(output_type, None, 0.5)
+    assert handler.reports_attention() == expected
+
+
+@pytest.mark.parametrize("flush_every, expected_flushes", [(1, 3), (2, 1), (0, 0)])
+def test_stream_output_handler_flush_every(flush_every, expected_flushes):
+    stream = unittest.mock.Mock(spec=io.StringIO)
+    handler = sockeye.output_handler.StringOutputHandler(stream, flush_every=flush_every)
+    for i in range(3):
+        handler.handle(TranslatorInput(id=i, sentence="a", tokens=None),
+                       TranslatorOutput(id=i, translation="b", tokens=None, attention_matrix=None, score=0.))
+    assert stream.write.call_count == 3
+    assert stream.flush.call_count == expected_flushes
+    handler.flush()
+    assert stream.flush.call_count == expected_flushes + 1
+
+
+def test_token_streaming_output_handler():
+    stream = io.StringIO()
+    handler = sockeye.output_handler.TokenStreamingOutputHandler(stream)
+    inputs = [TranslatorInput(id=i, sentence="a", tokens=None) for i in range(1, 4)]
+    handler.stream_tokens(inputs[0], ["ein"])
+    # tokens of later inputs are held back
+    handler.stream_tokens(inputs[1], ["zwei"])
+    assert stream.getvalue() == "ein"
+    handler.stream_tokens(inputs[0], ["kleiner"])
+    assert stream.getvalue() == "ein kleiner"
+    handler.handle(inputs[0], TranslatorOutput(id=1, translation="ein kleiner Test", tokens=None,
+                                               attention_matrix=None, score=0.))
+    assert stream.getvalue() == "ein kleiner Test\nzwei"
+    handler.handle(inputs[1], TranslatorOutput(id=2, translation="zwei", tokens=None, attention_matrix=None,
+                                               score=0.))
+    handler.handle(inputs[2], TranslatorOutput(id=3, translation="", tokens=None, attention_matrix=None, score=0.))
+    assert stream.getvalue() == "ein kleiner Test\nzwei\n\n"
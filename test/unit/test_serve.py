@@ -0,0 +1,150 @@
+# Copyright 2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You may not
+# use this file except in compliance with the License. A copy of the License
+# is located at
+#
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is distributed on
+# an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+import asyncio
+import json
+import time
+import unittest.mock
+
+import pytest
+
+import sockeye.constants as C
+import sockeye.inference
+import sockeye.serve
+
+
+@pytest.fixture
+def server():
+    asyncio.set_event_loop(asyncio.new_event_loop())
+    translator = unittest.mock.Mock(spec=sockeye.inference.Translator)
+    translator.batch_size = 2
+    translator.sample = None
+    translator.make_input.side_effect = sockeye.inference.Translator.make_input
+
+    def translate_batch(trans_inputs, deadline=None, stream=None):
+        if stream is not None:
+            # each token of the translation is stable on its own
+            for trans_input in trans_inputs:
+                for token in trans_input.sentence.upper().split():
+                    stream(trans_input, [token])
+        return [sockeye.inference.TranslatorOutput(id=trans_input.id, translation=trans_input.sentence.upper(),
+                                                   tokens=trans_input.tokens, attention_matrix=None, score=1.0)
+                for trans_input in trans_inputs]
+
+    translator.translate_batch.side_effect = translate_batch
+    yield sockeye.serve.TranslationServer(translator, max_delay=0.01)
+    asyncio.get_event_loop().close()
+
+
+def _run(server, coroutine):
+    loop = asyncio.get_event_loop()
+    task = loop.create_task(server.run())
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        task.cancel()
+
+
+def test_micro_batching(server):
+    texts = ["a b", "c", "d e f", "g", "h"]
+    trans_outputs = _run(server, asyncio.gather(*(server.translate(text) for text in texts)))
+    assert [trans_output.translation for trans_output in trans_outputs] == [text.upper() for text in texts]
+    # concurrent sentences are translated in batches of at most batch size sentences
+    batch_sizes = [len(call[0][0]) for call in server.translator.translate_batch.call_args_list]
+    assert batch_sizes == [2, 2, 1]
+    stats = server.get_stats()
+    assert stats["queue_depth"] == 0
+    assert stats["sentences"] == 5
+    assert stats["batch_size_histogram"] == {"1": 1, "2": 2}
+    assert stats["latency_ms"]["p50"] is not None
+
+
+def test_coalesce_in_flight(server):
+    texts = ["a b", "c", "a  b", "a b"]
+    trans_outputs = _run(server, asyncio.gather(*(server.translate(text) for text in texts)))
+    assert [trans_output.translation for trans_output in trans_outputs] == ["A B", "C", "A B", "A B"]
+    assert len({trans_output.id for trans_output in trans_outputs}) == 4
+    # identical sentences are translated once
+    assert [len(call[0][0]) for call in server.translator.translate_batch.call_args_list] == [2]
+    assert server.get_stats()["coalesced"] == 2
+    assert not server.in_flight
+
+
+def test_time_budget(server):
+    server.translator.translate_batch.side_effect = lambda trans_inputs, deadline=None, stream=None: [
+        sockeye.inference.TranslatorOutput(id=trans_input.id, translation="", tokens=[], attention_matrix=None,
+                                           score=1.0, degradation=C.DEGRADATION_TRUNCATED)
+        for trans_input in trans_inputs]
+    tic = time.time()
+    status, response = _run(server, server.handle_request("POST", "/translate",
+                                                          b'{"texts": ["a", "b"], "time_budget_ms": 100}'))
+    assert status == 200
+    assert [result["degradation"] for result in response["translations"]] == [C.DEGRADATION_TRUNCATED] * 2
+    deadline = server.translator.translate_batch.call_args[0][1]
+    assert tic + 0.1 <= deadline <= time.time() + 0.1
+
+
+@pytest.mark.parametrize("method, path, body, expected_status, expected_response", [
+    ("POST", "/translate", b'{"text": "a b"}', 200, {"translation": "A B", "score": 1.0}),
+    ("POST", "/translate", b'{"texts": ["a", "b"]}', 200,
+     {"translations": [{"translation": "A", "score": 1.0}, {"translation": "B", "score": 1.0}]}),
+    ("POST", "/translate", b'{"txt": "a b"}', 400, None),
+    ("POST", "/translate", b'{"texts": ["a", "b"], "stream": true}', 400, None),
+    ("POST", "/translate", b'not json', 400, None),
+    ("GET", "/translate", b'', 405, None),
+    ("GET", "/unknown", b'', 404, None),
+])
+def test_handle_request(server, method, path, body, expected_status, expected_response):
+    status, response = _run(server, server.handle_request(method, path, body))
+    assert status == expected_status
+    if expected_response is not None:
+        assert response == expected_response
+    json.dumps(response)
+
+
+def test_stream(server):
+    async def stream(text):
+        status, events = await server.handle_request("POST", "/translate",
+                                                     json.dumps({"text": text, "stream": True}).encode("utf-8"))
+        assert status == 200
+        results = []
+        while True:
+            event = await events.get()
+            if event is None:
+                return results
+            results.append(event)
+
+    results = _run(server, asyncio.gather(stream("a b"), stream("a b"), stream("c")))
+    # streamed sentences are not coalesced
+    assert server.get_stats()["coalesced"] == 0
+    assert results[0] == results[1] == [{"tokens": ["A"]}, {"tokens": ["B"]}, {"translation": "A B", "score": 1.0}]
+    assert results[2] == [{"tokens": ["C"]}, {"translation": "C", "score": 1.0}]
+
+
+def test_no_coalescing_with_time_budget(server):
+    trans_outputs = _run(server, asyncio.gather(server.translate("a b"), server.translate("a b", time_budget=10.0),
+                                                server.translate("a b", time_budget=10.0)))
+    assert [trans_output.translation for trans_output in trans_outputs] == ["A B"] * 3
+    # results searched for a deadline are not shared
+    assert [len(call[0][0]) for call in server.translator.translate_batch.call_args_list] == [2, 1]
+    assert server.get_stats()["coalesced"] == 0
+
+
+def test_no_coalescing_when_sampling(server):
+    server.translator.sample = 3
+    server = sockeye.serve.TranslationServer(server.translator, max_delay=0.01)
+    trans_outputs = _run(server, asyncio.gather(server.translate("a b"), server.translate("a b")))
+    assert [trans_output.translation for trans_output in trans_outputs] == ["A B"] * 2
+    # each request gets its own sample
+    assert [len(call[0][0]) for call in server.translator.translate_batch.call_args_list] == [2]
+    assert server.get_stats()["coalesced"] == 0
@@ -10,7 +10,11 @@
 # an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
 # express or implied. See the License for the specific language governing
 # permissions and limitations under the License.
+import argparse
 import io
+import os
+import threading
+import time
 import unittest
 import unittest.mock
 
@@ -26,7 +30,10 @@ TEST_DATA = "Test file line 1\n" \
 
 @pytest.fixture
 def mock_translator():
-    return unittest.mock.Mock(spec=sockeye.inference.Translator)
+    translator = unittest.mock.Mock(spec=sockeye.inference.Translator)
+    translator.translate_batch.side_effect = lambda trans_inputs, stream=None: [unittest.mock.Mock()
+                                                                                for _ in trans_inputs]
+    return translator
 
 
 @pytest.fixture
@@ -50,8 +57,8 @@ def test_translate_by_file(mock_file, mock_translator, mock_output_handler):
     mock_translator.make_input.assert_any_call(1, "Test file line 1")
     mock_translator.make_input.assert_any_call(2, "Test file line 2")
 
-    # Ensure translate gets called twice.  Input here will be a dummy mocked result, so we'll ignore it.
-    assert mock_translator.translate.call_count == 2
+    # Ensure translate_batch gets called twice.  Input here will be a dummy mocked result, so we'll ignore it.
+    assert mock_translator.translate_batch.call_count == 2
 
 
 @unittest.mock.patch("sys.stdin", io.StringIO(TEST_DATA))
@@ -62,5 +69,125 @@ def test_translate_by_stdin(mock_translator, mock_output_handler):
     mock_translator.make_input.assert_any_call(1, "Test file line 1\n")
     mock_translator.make_input.assert_any_call(2, "Test file line 2\n")
 
-    # Ensure translate gets called twice.  Input here will be a dummy mocked result, so we'll ignore it.
-    assert mock_translator.translate.call_count == 2
+    # Ensure translate_batch gets called twice.  Input here will be a dummy mocked result, so we'll ignore it.
+    assert mock_translator.translate_batch.call_count == 2
+
+
+@unittest.mock.patch("sys.stdin", io.StringIO(TEST_DATA))
+def test_translate_by_stdin_chunked(mock_translator, mock_output_handler):
+    sockeye.translate.read_and_translate(translator=mock_translator, output_handler=mock_output_handler,
+                                         chunk_size=2)
+
+    # Both lines are passed to the translator in a single call
+    assert mock_translator.translate_batch.call_count == 1
+    assert mock_output_handler.handle.call_count == 2
+
+
+@pytest.mark.parametrize("sort_window, expected_chunks", [
+    (0, [[1, 2], [3, 4], [5]]),
+    (1, [[2, 1], [4, 3], [5]]),
+    (4, [[2, 4], [1, 3], [5]]),
+    (10, [[2, 4], [5, 1], [3]]),
+])
+def test_get_chunks(sort_window, expected_chunks):
+    source_data = ["a b c", "a", "a b c d", "b", "a b"]
+    chunks = sockeye.translate.get_chunks(source_data, chunk_size=2, sort_window=sort_window)
+    assert [[sentence_id for sentence_id, _ in chunk] for chunk in chunks] == expected_chunks
+
+
+def test_translate_lines_sorted(mock_translator, mock_output_handler):
+    mock_translator.make_input.side_effect = sockeye.inference.Translator.make_input
+    source_data = ["a b c", "a", "a b c d", "b", "a b"]
+    num_lines, _ = sockeye.translate.translate_lines(mock_output_handler, source_data, mock_translator,
+                                                     chunk_size=2, sort_window=10)
+    assert num_lines == 5
+    # results are handled in input order
+    assert [call[0][0].id for call in mock_output_handler.handle.call_args_list] == [1, 2, 3, 4, 5]
+
+
+def test_translate_lines_error(mock_translator, mock_output_handler):
+    mock_translator.translate_batch.side_effect = RuntimeError("failed")
+    with pytest.raises(RuntimeError):
+        sockeye.translate.translate_lines(mock_output_handler, ["a"] * 10, mock_translator)
+    mock_output_handler.handle.side_effect = ValueError("failed")
+    mock_translator.translate_batch.side_effect = lambda trans_inputs, stream=None: [unittest.mock.Mock()
+                                                                                     for _ in trans_inputs]
+    with pytest.raises(ValueError):
+        sockeye.translate.translate_lines(mock_output_handler, ["a"] * 10, mock_translator)
+
+
+def test_translate_lines_error_stops_reader(mock_translator, mock_output_handler):
+    mock_translator.translate_batch.side_effect = RuntimeError("failed")
+    num_threads = threading.active_count()
+    with pytest.raises(RuntimeError):
+        sockeye.translate.translate_lines(mock_output_handler, ["a"] * 100, mock_translator)
+    # the reading thread stops instead of blocking on the full input queue
+    for _ in range(50):
+        if threading.active_count() == num_threads:
+            break
+        time.sleep(0.1)
+    assert threading.active_count() == num_threads
+
+
+def test_translate_lines_all_samples(mock_translator, mock_output_handler):
+    mock_translator.make_input.side_effect = sockeye.inference.Translator.make_input
+    mock_translator.sample_batch.side_effect = lambda trans_inputs: [[unittest.mock.Mock(), unittest.mock.Mock()]
+                                                                     for _ in trans_inputs]
+    num_lines, _ = sockeye.translate.translate_lines(mock_output_handler, ["a", "b", "c"], mock_translator,
+                                                     chunk_size=2, all_samples=True)
+    assert num_lines == 3
+    assert mock_translator.translate_batch.call_count == 0
+    # all samples of each line are handled, in input order
+    assert [call[0][0].id for call in mock_output_handler.handle.call_args_list] == [1, 1, 2, 2, 3, 3]
+
+
+def test_translate_lines_stream(mock_translator):
+    mock_translator.make_input.side_effect = sockeye.inference.Translator.make_input
+
+    def translate_batch(trans_inputs, stream=None):
+        # streams the reversed input in two parts, later sentences of the batch first
+        for trans_input in reversed(trans_inputs):
+            stream(trans_input, trans_input.tokens[::-1][:1])
+        for trans_input in reversed(trans_inputs):
+            if len(trans_input.tokens) > 1:
+                stream(trans_input, trans_input.tokens[::-1][1:])
+        return [sockeye.inference.TranslatorOutput(id=trans_input.id, translation=" ".join(trans_input.tokens[::-1]),
+                                                   tokens=None, attention_matrix=None, score=0.)
+                for trans_input in trans_inputs]
+
+    mock_translator.translate_batch.side_effect = translate_batch
+    output = io.StringIO()
+    output_handler = sockeye.output_handler.TokenStreamingOutputHandler(output)
+    source_data = ["a b c", "a", "a b c d", "b", "a b"]
+    num_lines, _ = sockeye.translate.translate_lines(output_handler, source_data, mock_translator,
+                                                     chunk_size=2, sort_window=10)
+    assert num_lines == 5
+    assert output.getvalue() == "c b a\na\nd c b a\nb\nb a\n"
+
+
+def _exit_worker(*args):
+    os._exit(1)
+
+
+@unittest.mock.patch("sockeye.constants.WORKER_POLL_INTERVAL", 0.1)
+@unittest.mock.patch("sockeye.translate._translate_worker", _exit_worker)
+def test_read_and_translate_parallel_worker_exit(mock_translator, mock_output_handler, tmpdir):
+    source = tmpdir.join("source")
+    source.write(TEST_DATA)
+    args = argparse.Namespace(workers=2, use_cpu=True, input=str(source), batch_size=1, sort_window=0)
+    mock_output_handler.reports_attention.return_value = False
+    with unittest.mock.patch("sockeye.translate.create_translator", return_value=mock_translator) as create:
+        # workers that exit without finishing are detected instead of waited for
+        with pytest.raises(RuntimeError):
+            sockeye.translate.read_and_translate_parallel(args, [unittest.mock.Mock()], mock_output_handler)
+    # CPU workers inherit the models loaded once by the parent
+    assert create.call_count == 1
+
+
+@pytest.mark.parametrize("batch_size, cache_size, expect_wrapper", [(1, 0, False), (2, 0, True), (1, 10, True)])
+def test_create_cached_translator(mock_translator, batch_size, cache_size, expect_wrapper):
+    mock_translator.batch_size = batch_size
+    args = argparse.Namespace(cache_size=cache_size, cache_path=None)
+    # without a cache, duplicates can only be collapsed within batches of several sentences
+    cached_translator = sockeye.translate.create_cached_translator(args, mock_translator)
+    assert (cached_translator is not None) == expect_wrapper
@@ -0,0 +1,160 @@
+# Copyright 2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You may not
+# use this file except in compliance with the License. A copy of the License
+# is located at
+#
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is distributed on
+# an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+import os
+import unittest.mock
+from tempfile import TemporaryDirectory
+
+import numpy as np
+import pytest
+
+import sockeye.constants as C
+import sockeye.inference
+import sockeye.translation_cache
+
+
+def _mock_translator(params_fname: str, beam_size: int = 5):
+    translator = unittest.mock.Mock(spec=sockeye.inference.Translator)
+    translator.batch_size = 4
+    translator.beam_size = beam_size
+    translator.ensemble_mode = "linear"
+    translator.buckets = [10]
+    translator.store_attention = False
+    translator.restrict_lexicon = None
+    translator.beam_prune_absolute = translator.beam_prune_relative = None
+    translator.max_output_length_num_stds = translator.min_output_length_num_stds = 2
+    translator.sample = None
+    translator.vocab_source = {C.UNK_SYMBOL: 1, "a": 2, "b": 3}
+    translator.models = [unittest.mock.Mock(params_fname=params_fname, softmax_temperature=None, max_input_len=10)]
+    translator.make_input.side_effect = sockeye.inference.Translator.make_input
+
+    def translate_batch(trans_inputs, deadline=None, stream=None):
+        trans_outputs = [sockeye.inference.TranslatorOutput(id=trans_input.id,
+                                                            translation=trans_input.sentence.upper(),
+                                                            tokens=trans_input.tokens, attention_matrix=None,
+                                                            score=1.0)
+                         for trans_input in trans_inputs]
+        if stream is not None:
+            for trans_input, trans_output in zip(trans_inputs, trans_outputs):
+                stream(trans_input, trans_output.translation.split())
+        return trans_outputs
+
+    translator.translate_batch.side_effect = translate_batch
+    return translator
+
+
+@pytest.fixture
+def params_fname():
+    with TemporaryDirectory() as work_dir:
+        fname = os.path.join(work_dir, "params")
+        with open(fname, "wb") as params:
+            params.write(b"params")
+        yield fname
+
+
+def _translated(translator):
+    return [[trans_input.sentence for trans_input in call[0][0]]
+            for call in translator.translate_batch.call_args_list]
+
+
+def test_collapse_duplicates(params_fname):
+    translator = _mock_translator(params_fname)
+    cached_translator = sockeye.translation_cache.CachedTranslator(translator)
+    trans_inputs = [cached_translator.make_input(i, sentence) for i, sentence in enumerate(["a b", "a  b", "b", "a b"])]
+    trans_outputs = cached_translator.translate_batch(trans_inputs)
+    assert _translated(translator) == [["a b", "b"]]
+    assert [trans_output.id for trans_output in trans_outputs] == [0, 1, 2, 3]
+    assert [trans_output.translation for trans_output in trans_outputs] == ["A B", "A B", "B", "A B"]
+    assert cached_translator.num_collapsed == 2
+
+
+def test_lru_cache(params_fname):
+    translator = _mock_translator(params_fname)
+    cache = sockeye.translation_cache.TranslationCache(max_size=1)
+    cached_translator = sockeye.translation_cache.CachedTranslator(translator, cache)
+    for i, sentence in enumerate(["a", "a", "b", "a"]):
+        assert cached_translator.translate(cached_translator.make_input(i, sentence)).id == i
+    # "a" is evicted when "b" is cached
+    assert _translated(translator) == [["a"], ["b"], ["a"]]
+    assert (cache.hits, cache.misses) == (1, 3)
+    # unknown words share the id of the unknown symbol
+    assert cached_translator.lookup(cached_translator.make_input(5, "c")) is None
+    assert cached_translator.get_key(cached_translator.make_input(5, "c")) == \
+        cached_translator.get_key(cached_translator.make_input(6, "d"))
+
+
+def test_persistent_cache(params_fname):
+    with TemporaryDirectory() as work_dir:
+        path = os.path.join(work_dir, "cache")
+        for beam_size, expected_translated in [(5, [["a"]]), (5, []), (4, [["a"]])]:
+            translator = _mock_translator(params_fname, beam_size)
+            cache = sockeye.translation_cache.TranslationCache(max_size=0, path=path)
+            cached_translator = sockeye.translation_cache.CachedTranslator(translator, cache)
+            assert cached_translator.translate(cached_translator.make_input(1, "a")).translation == "A"
+            cache.close()
+            # results are reused by later runs with the same parameters and settings only
+            assert _translated(translator) == expected_translated
+
+
+def test_degraded_results_not_cached(params_fname):
+    translator = _mock_translator(params_fname)
+    translator.translate_batch.side_effect = lambda trans_inputs, deadline=None, stream=None: [
+        sockeye.inference.TranslatorOutput(id=trans_input.id, translation="", tokens=[], attention_matrix=None,
+                                           score=1.0, degradation=C.DEGRADATION_GREEDY)
+        for trans_input in trans_inputs]
+    cache = sockeye.translation_cache.TranslationCache(max_size=10)
+    cached_translator = sockeye.translation_cache.CachedTranslator(translator, cache)
+    assert cached_translator.translate(cached_translator.make_input(1, "a"), deadline=1.0).degradation == \
+        C.DEGRADATION_GREEDY
+    assert translator.translate_batch.call_args[0][1] == 1.0
+    assert cached_translator.lookup(cached_translator.make_input(2, "a")) is None
+
+
+def test_stream(params_fname):
+    translator = _mock_translator(params_fname)
+    cache = sockeye.translation_cache.TranslationCache(max_size=10)
+    cached_translator = sockeye.translation_cache.CachedTranslator(translator, cache)
+    cached_translator.translate(cached_translator.make_input(0, "a b"))
+    streamed = []
+    trans_inputs = [cached_translator.make_input(i, sentence) for i, sentence in enumerate(["b", "a b", "b"], 1)]
+    cached_translator.translate_batch(trans_inputs,
+                                      stream=lambda trans_input, tokens: streamed.append((trans_input.id, tokens)))
+    # cached translations are streamed first, and the tokens of a translated input are streamed for its duplicates
+    assert streamed == [(2, ["A", "B"]), (1, ["B"]), (3, ["B"])]
+    assert _translated(translator) == [["a b"], ["b"]]
+
+
+def test_fingerprint_restrict_lexicon(params_fname):
+    keys = []
+    for lex, always_allow in [([[3, 4]], [0, 1, 2]), ([[3, 5]], [0, 1, 2]), ([[3, 4]], [0, 1, 2, 3])]:
+        translator = _mock_translator(params_fname)
+        translator.restrict_lexicon = unittest.mock.Mock(lex=np.array(lex, dtype='int32'),
+                                                         always_allow=np.array(always_allow, dtype='int32'))
+        cached_translator = sockeye.translation_cache.CachedTranslator(
+            translator, sockeye.translation_cache.TranslationCache(max_size=1))
+        keys.append(cached_translator.get_key(cached_translator.make_input(1, "a")))
+    # translators with different lexicons do not share cached results
+    assert len(set(keys)) == 3
+
+
+def test_sample_batch_not_cached(params_fname):
+    translator = _mock_translator(params_fname)
+    translator.sample_batch.side_effect = lambda trans_inputs, deadline=None: [[unittest.mock.Mock()]
+                                                                               for _ in trans_inputs]
+    cache = sockeye.translation_cache.TranslationCache(max_size=10)
+    cached_translator = sockeye.translation_cache.CachedTranslator(translator, cache)
+    trans_inputs = [cached_translator.make_input(i, "a") for i in range(2)]
+    assert len(cached_translator.sample_batch(trans_inputs)) == 2
+    # identical inputs are passed on
+    assert len(translator.sample_batch.call_args[0][0]) == 2
+    assert (cache.hits, cache.misses) == (0, 0)
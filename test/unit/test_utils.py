@@ -12,6 +12,7 @@
 # permissions and limitations under the License.
 
 import sockeye.utils
+import mxnet as mx
 import numpy as np
 import pytest
 from sockeye.utils import check_condition, SockeyeError
@@ -29,6 +30,27 @@ def test_get_alignments():
         assert alignment == expected_alignment
 
 
+def test_get_alignments_batch():
+    attention_matrices = np.asarray([[[0.1, 0.4, 0.5],
+                                      [0.2, 0.8, 0.0],
+                                      [0.4, 0.4, 0.2]],
+                                     [[0.9, 0.1, 0.0],
+                                      [0.0, 0.0, 1.0],
+                                      [1.0, 0.0, 0.0]],
+                                     [[1.0, 0.0, 0.0],
+                                      [1.0, 0.0, 0.0],
+                                      [1.0, 0.0, 0.0]]])
+    source_lengths = np.asarray([3, 2, 3])
+    target_lengths = np.asarray([3, 3, 0])
+    alignments = sockeye.utils.get_alignments_batch(attention_matrices, source_lengths, target_lengths, threshold=0.1)
+    assert alignments == [[(0, 1), (0, 2), (1, 0), (1, 1), (1, 2), (2, 0), (2, 2)],
+                          [(0, 0), (0, 2)],
+                          []]
+    for matrix, source_length, target_length, alignment in zip(attention_matrices, source_lengths, target_lengths,
+                                                               alignments):
+        assert alignment == list(sockeye.utils.get_alignments(matrix[:target_length, :source_length], threshold=0.1))
+
+
 device_params = [([-4, 3, 5], 6, [0, 1, 2, 3, 4, 5]),
                  ([-2, 3, -2, 5], 6, [0, 1, 2, 3, 4, 5]),
                  ([-1], 1, [0]),
@@ -151,3 +173,13 @@ def test_check_condition_false():
     with pytest.raises(SockeyeError) as e:
         check_condition(1 == 2, "Wrong")
     assert "Wrong"  == str(e.value)
+
+
+@pytest.mark.parametrize("only_first_row", [False, True])
+def test_smallest_k_mx(only_first_row):
+    matrix = np.random.permutation(np.arange(40, dtype='float32')).reshape((5, 8))
+    (rows, cols), values = sockeye.utils.smallest_k(matrix, 4, only_first_row)
+    (rows_mx, cols_mx), values_mx = sockeye.utils.smallest_k_mx(mx.nd.array(matrix), 4, only_first_row)
+    assert np.array_equal(rows, rows_mx.asnumpy())
+    assert np.array_equal(cols, cols_mx.asnumpy())
+    assert np.array_equal(values, values_mx.asnumpy())